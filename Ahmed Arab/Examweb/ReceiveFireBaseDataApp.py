@@ -3,16 +3,70 @@ sync_answers_to_sql.py
 Runs locally on your network. Pulls /student_answers from Firebase, grades them,
 and inserts/updates the Student_Exam_Answer table in ITIExamintionSystem.
 Run periodically or as a daemon.
+By default only answers submitted since the last poll are downloaded (see answer_feed.py);
+ANSWER_PULL_MODE=stream subscribes to /student_answers and grades answers as they arrive,
+ANSWER_PULL_MODE=full downloads the whole /student_answers tree every poll.
+In bulk write mode the fetch, grade and SQL write stages run on their own threads
+with bounded queues between them (answer_pipeline.py); ANSWER_PIPELINE=off runs them
+one after the other.
+Sync lag, per-stage throughput, SQL write latency and errors are served on
+http://METRICS_HOST:METRICS_PORT/metrics (Prometheus) and /metrics.json (see sync_metrics.py).
+With ANSWER_SHARD="i/N" this process is one of N workers and only handles its hash
+partition of the answers; answer_shards.py starts and supervises the workers.
 """
 
 import pyodbc
 import requests
 import os
+import sys
 import time
+from pathlib import Path
 from dotenv import load_dotenv
 
+# The shared Firebase REST client lives in the firebase_client package at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from firebase_client import FirebaseClient
+from answer_feed import AnswerFeed, AnswerStream, SyncCheckpoint
+from answer_ledger import AnswerLedger
+from answer_pipeline import StagePipeline
+from answer_shards import parse_shard, shard_of, shard_path, split_items
+from answer_writer import grade_answers, write_graded_answers
+from grading import parse_normalizations
+from model_answer_cache import ModelAnswerCache
+from sync_metrics import SyncMetrics
+
 load_dotenv()
 FIREBASE_URL = os.getenv("FIREBASE_URL")
+ANSWER_PULL_MODE = os.getenv("ANSWER_PULL_MODE", "incremental")  # "incremental": new answers only, "stream": pushed by Firebase, "full": whole tree
+ANSWER_CHECKPOINT_FILE = os.getenv("ANSWER_CHECKPOINT_FILE",
+                                   str(Path(__file__).resolve().parent / "answer_sync_checkpoint.json"))
+ANSWER_PAGE_SIZE = int(os.getenv("ANSWER_PAGE_SIZE", "1000"))  # answers per incremental GET
+# Re-read window for portal clock skew. Portal hosts must keep their clocks in sync (NTP) well
+# within it: an answer keyed further back falls below the cursor and waits for the reconciliation pass.
+ANSWER_OVERLAP_SECONDS = float(os.getenv("ANSWER_OVERLAP_SECONDS", "5"))
+ANSWER_RECONCILE_SECONDS = float(os.getenv("ANSWER_RECONCILE_SECONDS", "600"))  # shallow key scan vs the ledger; 0: off
+ANSWER_RECONCILE_WINDOW_SECONDS = float(os.getenv("ANSWER_RECONCILE_WINDOW_SECONDS", "3600"))  # how far below the cursor it looks; 0: all
+ANSWER_LEDGER_FILE = os.getenv("ANSWER_LEDGER_FILE",
+                               str(Path(__file__).resolve().parent / "answer_ledger.sqlite3"))
+ANSWER_SHARD = parse_shard(os.getenv("ANSWER_SHARD"))  # "i/N": only the answers whose crc32(ANSWER_SHARD_KEY) % N == i
+ANSWER_SHARD_KEY = os.getenv("ANSWER_SHARD_KEY", "Exam_ID")  # "Exam_ID" or "Student_ID"
+if ANSWER_SHARD:
+    # Every shard keeps its own cursor and ledger
+    ANSWER_CHECKPOINT_FILE = shard_path(ANSWER_CHECKPOINT_FILE, ANSWER_SHARD)
+    ANSWER_LEDGER_FILE = shard_path(ANSWER_LEDGER_FILE, ANSWER_SHARD)
+ANSWER_LEDGER_EXPECTED_KEYS = int(os.getenv("ANSWER_LEDGER_EXPECTED_KEYS", "2000000"))  # sizes the in-memory Bloom filter
+ANSWER_WRITE_MODE = os.getenv("ANSWER_WRITE_MODE", "bulk")  # "bulk": staging table + MERGE per batch, "row": upsert per answer
+ANSWER_BATCH_SIZE = int(os.getenv("ANSWER_BATCH_SIZE", "1000"))  # answers per MERGE / commit in bulk mode
+GRADING_NORMALIZE = parse_normalizations(os.getenv("GRADING_NORMALIZE", "all"))  # bulk mode: "trim,spaces,casefold,synonyms", "all" or "none"
+GRADING_WEIGHTS_FILE = os.getenv("GRADING_WEIGHTS_FILE")  # bulk mode: optional CSV of Question_ID,Weight (default weight 1)
+MODEL_ANSWER_REFRESH_SECONDS = float(os.getenv("MODEL_ANSWER_REFRESH_SECONDS", "30"))  # Question_Bank change check; 0 loads once at startup
+MODEL_ANSWER_BUCKET_SIZE = int(os.getenv("MODEL_ANSWER_BUCKET_SIZE", "1000"))  # Question_IDs per checksum bucket
+ANSWER_PIPELINE = os.getenv("ANSWER_PIPELINE", "on")  # "on": fetch / grade / write on their own threads (bulk mode, incremental or stream pull)
+ANSWER_PIPELINE_DEPTH = int(os.getenv("ANSWER_PIPELINE_DEPTH", "4"))  # batches queued between two stages before the upstream one waits
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # "0.0.0.0" to let a Prometheus server on another host scrape it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))  # 0 disables the metrics endpoint
+METRICS_SNAPSHOT_FILE = os.getenv("METRICS_SNAPSHOT_FILE")  # optional: JSON snapshot rewritten periodically
+METRICS_SNAPSHOT_SECONDS = float(os.getenv("METRICS_SNAPSHOT_SECONDS", "15"))
 #FIREBASE_AUTH = os.getenv("FIREBASE_AUTH")
 SQL_CONN =(
     "DRIVER={ODBC Driver 17 for SQL Server};"
@@ -24,31 +78,24 @@ SQL_CONN =(
 )
 
 
-def fb_url(path):
-    auth =  ""
-    return f"{FIREBASE_URL.rstrip('/')}/{path}.json{auth}"
+_client = None
+METRICS = SyncMetrics()
+
+def get_client():
+    """One pooled Firebase client for the whole daemon (keep-alive, retries, timeouts)."""
+    global _client
+    if _client is None:
+        _client = FirebaseClient(FIREBASE_URL)
+    return _client
 
 def get_student_answers():
     """Fetches all student answers from Firebase."""
-    url = fb_url("student_answers")
-    r = requests.get(url)
-    r.raise_for_status()
-    data = r.json() or {}
+    data = get_client().get("student_answers") or {}
     # returns list of (key, record)
     return list(data.items())
 
-def load_model_answers(cursor):
-    """Loads all model answers from Question_Bank into a dictionary."""
-    print("Loading model answers from Question_Bank...")
-    sql_query = "SELECT Question_ID, Question_Model_Answer FROM Question_Bank"
-    cursor.execute(sql_query)
-    rows = cursor.fetchall()
-    # Create a map of { "Question_ID_String": "Model_Answer" }
-    model_answers_map = {str(row.Question_ID): row.Question_Model_Answer for row in rows}
-    print(f"Loaded {len(model_answers_map)} model answers.")
-    return model_answers_map
-
-def upsert_answer(cursor, exam_id, question_id, student_id, student_answer, model_answers_map):
+def upsert_answer(cursor, exam_id, question_id, student_id, student_answer, model_answers_map,
+                  table="Student_Exam_Answer"):
     """
     Checks, grades, and inserts/updates a student's answer in the SQL database.
     """
@@ -67,8 +114,8 @@ def upsert_answer(cursor, exam_id, question_id, student_id, student_answer, mode
     # --- End of NEW Logic ---
 
     # check if exists
-    sql_check = """
-        SELECT Student_Answer FROM Student_Exam_Answer
+    sql_check = f"""
+        SELECT Student_Answer FROM {table}
         WHERE Exam_ID = ? AND Question_ID = ? AND Student_ID = ?
     """
     cursor.execute(sql_check, exam_id, question_id, student_id)
@@ -77,8 +124,8 @@ def upsert_answer(cursor, exam_id, question_id, student_id, student_answer, mode
     if row:
         # update
         # --- MODIFIED: Added Student_Grade ---
-        sql_upd = """
-            UPDATE Student_Exam_Answer
+        sql_upd = f"""
+            UPDATE {table}
             SET Student_Answer = ?, Student_Grade = ?
             WHERE Exam_ID = ? AND Question_ID = ? AND Student_ID = ?
         """
@@ -86,60 +133,241 @@ def upsert_answer(cursor, exam_id, question_id, student_id, student_answer, mode
     else:
         # insert
         # --- MODIFIED: Added Student_Grade ---
-        sql_ins = """
-            INSERT INTO Student_Exam_Answer (Exam_ID, Question_ID, Student_ID, Student_Answer, Student_Grade)
+        sql_ins = f"""
+            INSERT INTO {table} (Exam_ID, Question_ID, Student_ID, Student_Answer, Student_Grade)
             VALUES (?, ?, ?, ?, ?)
         """
         cursor.execute(sql_ins, exam_id, question_id, student_id, student_answer, grade)
 
+def own_answers(items):
+    """
+    Sharded mode: (this worker's items, keys of the other shards' items). The foreign keys
+    only move the cursor; they are never added to this shard's ledger.
+    """
+    if not ANSWER_SHARD:
+        return items, []
+    return split_items(items, ANSWER_SHARD, ANSWER_SHARD_KEY)
+
+def owns_answer(record):
+    """True if this worker's shard handles the record (always, when sharding is off)."""
+    return not ANSWER_SHARD or shard_of(record, ANSWER_SHARD_KEY, ANSWER_SHARD[1]) == ANSWER_SHARD[0]
+
+def parse_answers(items, processed_keys=()):
+    """
+    Validates [(key, record), ...] and skips keys already processed.
+    Returns (rows, skipped_keys): rows are (key, exam_id, qid, sid, ans) of the valid
+    records, skipped_keys the invalid ones (they count as done).
+    """
+    rows = []
+    skipped_keys = []
+    for key, rec in items:
+        if key in processed_keys:
+            continue
+        
+        # record should have Exam_ID, Question_ID, Student_ID, Student_Answer
+        try:
+            exam_id = int(rec.get("Exam_ID"))
+            qid = int(rec.get("Question_ID"))
+            sid = int(rec.get("Student_ID"))
+            ans = rec.get("Student_Answer") # This can be "N/A" or the answer text
+            
+            if ans is None:
+                print(f"Invalid record (ans is None), skipping: {key}")
+                skipped_keys.append(key)
+                continue
+
+        except Exception as e:
+            print(f"Invalid record format, skipping: {key}, Record: {rec}, Error: {e}")
+            skipped_keys.append(key)
+            continue
+
+        rows.append((key, exam_id, qid, sid, ans))
+    return rows, skipped_keys
+
+def process_answers(cn, cur, items, model_answers, processed_keys=()):
+    """
+    Grades and upserts [(key, record), ...]: one row at a time (model_answers is the
+    {"Question_ID": "Model_Answer"} map of ModelAnswerCache in row mode), or in bulk mode with one vectorized grading pass, staging
+    load, MERGE and commit per ANSWER_BATCH_SIZE answers (model_answers is a ModelAnswerTable).
+    Returns (done_keys, new_answer_count); done_keys also lists the invalid records skipped.
+    """
+    rows, done_keys = parse_answers(items, processed_keys)  # done_keys: committed (or skipped) in this batch
+    METRICS.skipped(len(done_keys))
+    new_answer_count = 0
+    if ANSWER_WRITE_MODE == "bulk":
+        for start in range(0, len(rows), ANSWER_BATCH_SIZE):
+            batch = rows[start:start + ANSWER_BATCH_SIZE]
+            started = time.perf_counter()
+            graded = grade_answers([row[1:] for row in batch], model_answers)
+            METRICS.graded(len(batch), time.perf_counter() - started)
+            started = time.perf_counter()
+            write_graded_answers(cn, cur, graded)
+            METRICS.written(len(batch), time.perf_counter() - started)
+            done_keys.extend(row[0] for row in batch)
+            new_answer_count += len(batch)
+        return done_keys, new_answer_count
+
+    for key, exam_id, qid, sid, ans in rows:
+        started = time.perf_counter()
+        # --- MODIFIED: Pass the model_answers_map ---
+        upsert_answer(cur, exam_id, qid, sid, ans, model_answers)
+        cn.commit()
+        METRICS.written(1, time.perf_counter() - started)
+        # print(f"Processed {key} -> exam {exam_id}, q {qid}, student {sid}")
+        done_keys.append(key)
+        new_answer_count += 1
+    return done_keys, new_answer_count
+
+def run_pipeline(cn, cur, reader, model_answers, processed_keys):
+    """
+    Bulk mode with ANSWER_PIPELINE=on: fetch, grade and write on their own threads.
+    reader is the AnswerFeed or AnswerStream, model_answers the ModelAnswerCache;
+    the writer commits its keys in order.
+    """
+    def fetched(batches):
+        for items in batches:
+            METRICS.fetched(items)
+            yield items
+
+    def grade(items):
+        mine, foreign_keys = own_answers(items)
+        rows, skipped_keys = parse_answers(mine, processed_keys)
+        METRICS.skipped(len(skipped_keys))
+        graded = []
+        # The model answers in use stay pinned until the writer stores the batch, so a
+        # re-grade after a Question_Bank change runs only after it (model_answer_cache.py)
+        current, generation = model_answers.acquire()
+        try:
+            for start in range(0, len(rows), ANSWER_BATCH_SIZE):
+                batch = rows[start:start + ANSWER_BATCH_SIZE]
+                started = time.perf_counter()
+                graded.append(([row[0] for row in batch], grade_answers([row[1:] for row in batch], current)))
+                METRICS.graded(len(batch), time.perf_counter() - started)
+        except BaseException:
+            model_answers.release(generation)
+            raise
+        return [key for key, _ in items], skipped_keys, graded, foreign_keys, generation
+
+    def write(graded_items):
+        item_keys, done_keys, graded, foreign_keys, generation = graded_items
+        done_keys = list(done_keys)
+        new_answer_count = 0
+        for keys, batch in graded:
+            started = time.perf_counter()
+            write_graded_answers(cn, cur, batch)
+            METRICS.written(len(keys), time.perf_counter() - started)
+            new_answer_count += len(keys)
+        done_keys.extend(key for keys, _ in graded for key in keys)
+        model_answers.release(generation)
+        processed_keys.add_many(done_keys)
+        reader.commit(done_keys + foreign_keys)
+        METRICS.finished(item_keys, done_keys)
+        if new_answer_count > 0:
+            print(f"Successfully processed and graded {new_answer_count} new answers.")
+
+    def on_error(stage, error):
+        METRICS.error(stage, "database" if isinstance(error, pyodbc.Error) else "other")
+        if isinstance(error, pyodbc.Error):
+            print(f"Database error: {error}")
+            print("Rolling back...")
+            try:
+                cn.rollback()
+            except Exception as rb_e:
+                print(f"Rollback failed: {rb_e}")
+        else:
+            print(f"An unexpected error occurred in the {stage} stage: {error}")
+
+    pipeline = StagePipeline(fetched(reader.batches()), [("grade", grade), ("write", write)],
+                             depth=ANSWER_PIPELINE_DEPTH, on_error=on_error)
+    METRICS.pipeline = pipeline
+    reader.on_error = lambda error: METRICS.error("fetch", "firebase")  # batches() retries these itself
+    print(f"Pipelined sync: fetch / grade / write threads, up to {ANSWER_PIPELINE_DEPTH} batches between stages.")
+    pipeline.run()
+
 def main():
     if not FIREBASE_URL:
         raise SystemExit("Set FIREBASE_URL in .env")
     
     cn = pyodbc.connect(SQL_CONN, autocommit=False)
     cur = cn.cursor()
-    processed_keys = set()
+    # Keys already stored in SQL Server; kept on disk so a restart does not re-grade old answers
+    processed_keys = AnswerLedger(ANSWER_LEDGER_FILE, expected_keys=ANSWER_LEDGER_EXPECTED_KEYS)
+    print(f"Answer ledger: {len(processed_keys)} answers already processed.")
+    if ANSWER_SHARD:
+        print(f"Shard {ANSWER_SHARD[0]}/{ANSWER_SHARD[1]}: answers with crc32({ANSWER_SHARD_KEY}) % "
+              f"{ANSWER_SHARD[1]} == {ANSWER_SHARD[0]}")
+
+    feed = None
+    stream = None
+    if ANSWER_PULL_MODE in ("incremental", "stream"):
+        checkpoint = SyncCheckpoint(ANSWER_CHECKPOINT_FILE)
+        if checkpoint.last_key is None and len(processed_keys):
+            checkpoint.save(processed_keys.last_key())  # checkpoint file lost: resume from the ledger
+        if ANSWER_PULL_MODE == "stream":
+            stream = AnswerStream(get_client(), checkpoint, overlap_ms=int(ANSWER_OVERLAP_SECONDS * 1000),
+                                  ledger=processed_keys, reconcile_seconds=ANSWER_RECONCILE_SECONDS,
+                                  reconcile_window_ms=int(ANSWER_RECONCILE_WINDOW_SECONDS * 1000), owns=owns_answer)
+        else:
+            feed = AnswerFeed(get_client(), checkpoint, page_size=ANSWER_PAGE_SIZE,
+                              overlap_ms=int(ANSWER_OVERLAP_SECONDS * 1000),
+                              ledger=processed_keys, reconcile_seconds=ANSWER_RECONCILE_SECONDS,
+                              reconcile_window_ms=int(ANSWER_RECONCILE_WINDOW_SECONDS * 1000), owns=owns_answer)
+        print(f"{ANSWER_PULL_MODE.capitalize()} pull, resuming after key: {checkpoint.last_key or '(first answer)'}")
 
     # --- NEW: Load model answers once at the start ---
-    model_answers_map = load_model_answers(cur)
+    # (then kept current: changed questions are reloaded and their stored answers re-graded)
+    model_answers = ModelAnswerCache(lambda: pyodbc.connect(SQL_CONN, autocommit=False), mode=ANSWER_WRITE_MODE,
+                                     normalizations=GRADING_NORMALIZE, weights_file=GRADING_WEIGHTS_FILE,
+                                     bucket_size=MODEL_ANSWER_BUCKET_SIZE,  # row mode keeps exact-match grading
+                                     shard=ANSWER_SHARD, shard_key=ANSWER_SHARD_KEY)
+    model_answers.load(cur)
+    if MODEL_ANSWER_REFRESH_SECONDS > 0:
+        model_answers.start(MODEL_ANSWER_REFRESH_SECONDS)
+
+    if METRICS_PORT:
+        METRICS.serve(METRICS_HOST, METRICS_PORT)
+        print(f"Metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics (Prometheus) and /metrics.json")
+    if METRICS_SNAPSHOT_FILE:
+        METRICS.write_snapshots(METRICS_SNAPSHOT_FILE, METRICS_SNAPSHOT_SECONDS)
 
     print("Starting answer sync loop... Press Ctrl+C to stop.")
+    if ANSWER_PIPELINE == "on" and ANSWER_WRITE_MODE == "bulk" and (feed or stream):
+        run_pipeline(cn, cur, stream or feed, model_answers, processed_keys)
+        return
+
     while True:
         try:
-            items = get_student_answers()  # [(key, record), ...]
+            if stream:
+                # Answers arrive as soon as they are written; batches() reconnects by itself
+                for items in stream.batches():
+                    METRICS.fetched(items)
+                    mine, foreign_keys = own_answers(items)
+                    with model_answers.use() as current:
+                        done_keys, new_answer_count = process_answers(cn, cur, mine, current, processed_keys)
+                    processed_keys.add_many(done_keys)
+                    stream.commit(done_keys + foreign_keys)
+                    METRICS.finished([key for key, _ in items], done_keys)
+                    if new_answer_count > 0:
+                        print(f"Successfully processed and graded {new_answer_count} new answers.")
+                continue
+
+            items = feed.poll() if feed else get_student_answers()  # [(key, record), ...]
             if not items:
                 # print("No new answers found, sleeping...")
                 time.sleep(3)
                 continue
 
-            new_answer_count = 0
-            for key, rec in items:
-                if key in processed_keys:
-                    continue
-                
-                # record should have Exam_ID, Question_ID, Student_ID, Student_Answer
-                try:
-                    exam_id = int(rec.get("Exam_ID"))
-                    qid = int(rec.get("Question_ID"))
-                    sid = int(rec.get("Student_ID"))
-                    ans = rec.get("Student_Answer") # This can be "N/A" or the answer text
-                    
-                    if ans is None:
-                        print(f"Invalid record (ans is None), skipping: {key}")
-                        processed_keys.add(key)
-                        continue
-
-                except Exception as e:
-                    print(f"Invalid record format, skipping: {key}, Record: {rec}, Error: {e}")
-                    processed_keys.add(key)
-                    continue
-
-                # --- MODIFIED: Pass the model_answers_map ---
-                upsert_answer(cur, exam_id, qid, sid, ans, model_answers_map)
-                cn.commit()
-                # print(f"Processed {key} -> exam {exam_id}, q {qid}, student {sid}")
-                processed_keys.add(key)
-                new_answer_count += 1
+            METRICS.fetched(items)
+            mine, foreign_keys = own_answers(items)
+            with model_answers.use() as current:
+                done_keys, new_answer_count = process_answers(cn, cur, mine, current, processed_keys)
+
+            # The ledger and the cursor only move once the whole poll is in SQL Server; a failed
+            # poll is read again (re-running upsert_answer for a row that was already committed is harmless)
+            processed_keys.add_many(done_keys)
+            if feed:
+                feed.commit(done_keys + foreign_keys)
+            METRICS.finished([key for key, _ in items], done_keys)
 
             if new_answer_count > 0:
                 print(f"Successfully processed and graded {new_answer_count} new answers.")
@@ -148,10 +376,12 @@ def main():
             time.sleep(3)
 
         except requests.exceptions.RequestException as re:
+            METRICS.error("fetch", "firebase")
             print(f"Connection error to Firebase: {re}")
             print("Retrying in 10 seconds...")
             time.sleep(10)
         except pyodbc.Error as dbe:
+            METRICS.error("write", "database")
             print(f"Database error: {dbe}")
             print("Rolling back and retrying in 10 seconds...")
             try:
@@ -160,6 +390,7 @@ def main():
                 print(f"Rollback failed: {rb_e}")
             time.sleep(10)
         except Exception as e:
+            METRICS.error("loop", "other")
             print(f"An unexpected error occurred: {e}")
             print("Retrying in 10 seconds...")
             time.sleep(10)
@@ -1,16 +1,33 @@
 """
 export_sql_to_firebase.py
 Exports initial tables from local SQL Server (ITIExamintionSystem) to Firebase Realtime Database.
+By default tables are streamed: rows are read with fetchmany and go out in PATCH chunks
+as they arrive, so memory stays flat however large the tables are (EXPORT_MODE=memory
+loads every table first, as before). EXPORT_MODE=delta pushes only the rows changed since
+the last run, with SQL Server change tracking (delta_export.py); with
+EXPORT_INTERVAL_SECONDS=60 it keeps running and exports every minute.
+Uploads go through chunk_uploader.py: byte-sized chunks, EXPORT_UPLOAD_WORKERS at a time,
+backing off when Firebase throttles.
 Usage: python export_sql_to_firebase.py
 """
 
-import time;
+import time
 import pyodbc
-import requests
 import json
 import os
+import sys
+from pathlib import Path
+import requests
 from dotenv import load_dotenv
 
+# The shared Firebase REST client lives in the firebase_client package at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from firebase_client import FirebaseClient
+from chunk_uploader import ChunkUploader
+from delta_export import run_delta
+from exam_bundles import bundle_sql, bundles_from_tables, group_bundles
+from student_course_index import index_entry, index_from_tables, index_sql
+
 load_dotenv()
 
 FIREBASE_URL = os.getenv("FIREBASE_URL")  # e.g. https://project-id-default-rtdb.firebaseio.com
@@ -19,10 +36,22 @@ FIREBASE_URL = os.getenv("FIREBASE_URL")  # e.g. https://project-id-default-rtdb
 if not FIREBASE_URL:
     raise SystemExit("Set FIREBASE_URL in environment or .env (e.g. https://...firebaseio.com)")
 
-def fb_path(p):
-    # returns full REST URL for a path
-    auth = ""
-    return f"{FIREBASE_URL.rstrip('/')}/{p}.json{auth}"
+# Pooled keep-alive session with retries; long read timeout for the large export chunks
+client = FirebaseClient(FIREBASE_URL, timeout=(10, 300))
+
+EXPORT_MODE = os.getenv("EXPORT_MODE", "stream")  # "stream": fetchmany straight into upload chunks, "memory": whole tables first,
+                                                  # "delta": only the rows changed since the last run (delta_export.py)
+EXPORT_STATE_FILE = os.getenv("EXPORT_STATE_FILE",
+                              str(Path(__file__).resolve().parent / "export_state.json"))  # delta mode high-water marks
+EXPORT_INTERVAL_SECONDS = float(os.getenv("EXPORT_INTERVAL_SECONDS", "0"))  # delta mode: run again every N s (0 = once)
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "5000"))  # rows per cursor.fetchmany() in stream mode
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", "4000000"))  # serialized bytes per PATCH
+EXPORT_UPLOAD_WORKERS = int(os.getenv("EXPORT_UPLOAD_WORKERS", "8"))  # PATCHes in flight at most
+
+# Uploads get their own client without retries: the uploader backs off and lowers its
+# concurrency itself when Firebase throttles (chunk_uploader.py)
+uploader = ChunkUploader(FirebaseClient(FIREBASE_URL, timeout=(10, 300), retries=0, pool_size=EXPORT_UPLOAD_WORKERS),
+                         max_bytes=EXPORT_CHUNK_BYTES, workers=EXPORT_UPLOAD_WORKERS)
 
 
 # SQL Server connection config - fill or set via .env
@@ -44,43 +73,130 @@ def query_table(cursor, sql):
     return [dict(zip(cols, row)) for row in rows]
 
 def push_to_firebase(path, data):
-    url = fb_path(path)
-    # Use PUT to overwrite at path (clean export), you can change to POST for appends
     """
-    Uploads data to Firebase in multiple small PATCH requests.
-    Each batch sends 'batch_size' records at a time.
+    Uploads data to Firebase in PATCH requests (merges instead of overwriting), sized by
+    bytes and sent several at a time by the chunk uploader, then stamps the version.
     """
-    batch_size = 25000
+    print(f"Total records to push: {len(data)}")
+    summary = uploader.upload(path, data.items())
+    print("✅ All batches uploaded successfully.")
+    stamp_version(path)
+    return summary
 
+def stream_rows(cursor, sql, fetch_size=EXPORT_FETCH_SIZE):
+    """Yields the rows of a query as dicts, fetch_size rows at a time (never the whole table)."""
+    cursor.execute(sql)
+    cols = [c[0] for c in cursor.description]
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield dict(zip(cols, row))
 
-    # Convert dictionary items to a list
-    items = list(data.items())
-    total = len(items)
-    print(f"Total records to push: {total}")
+def group_rows(rows, group_key, value):
+    """
+    Yields (group, [value(row), ...]) for rows ordered by group_key (ORDER BY in the query),
+    so each group is complete when it is yielded and only one group is held at a time.
+    """
+    current, values = None, []
+    for row in rows:
+        key = str(row[group_key])
+        if key != current and values:
+            yield current, values
+            values = []
+        current = key
+        values.append(value(row))
+    if values:
+        yield current, values
 
-    for i in range(0, total, batch_size):
-        # Take one chunk of items
-        chunk = dict(items[i:i + batch_size])
+def push_stream(path, records):
+    """
+    Streaming push_to_firebase: (key, record) pairs are serialized into PATCH chunks as
+    they arrive, so only the chunks in flight are in memory. Returns the upload summary.
+    """
+    summary = uploader.upload(path, records)
+    stamp_version(path)
+    return summary
 
-        # Push this chunk using PATCH (merges instead of overwriting)
-        r = requests.patch(url, json=chunk)
+def export_streaming(cur):
+    """Streams every collection from SQL Server to Firebase, one fetchmany batch at a time."""
+    print("Streaming Course...")
+    push_stream("courses", ((str(c["Course_ID"]), c)
+                            for c in stream_rows(cur, "SELECT Course_ID, Course_Name FROM Course")))
 
-        # Log progress
-        print(f"Batch {i // batch_size + 1}: "
-              f"records {i + 1}–{min(i + batch_size, total)} → Status {r.status_code}")
+    print("Streaming Student_Course...")
+    push_stream("student_courses", ((f"{sc['Student_ID']}_{sc['Course_ID']}", sc)
+                                    for sc in stream_rows(cur, "SELECT Student_ID, Course_ID FROM Student_Course")))
 
-        # Optional: short delay to avoid rate limits
-        time.sleep(0.5)
+    print("Streaming Exam...")
+    push_stream("exams", ((str(e["Exam_ID"]), e) for e in stream_rows(
+        cur, "SELECT Exam_ID, Course_ID, Instructor_ID, Exam_Duration_Minutes, Exam_Type FROM Exam")))
 
-  
-    print("✅ All batches uploaded successfully.")
-    r.raise_for_status()
-    return r.json()
+    print("Streaming Question_Bank...")
+    push_stream("questions", ((str(q["Question_ID"]), q) for q in stream_rows(
+        cur, "SELECT Question_ID, Course_ID, Question_Type, Question_Description, Question_Model_Answer FROM Question_Bank")))
+
+    print("Streaming Question_Choice...")
+    push_stream("choices", ((str(ch["Question_Choice_ID"]), ch) for ch in stream_rows(
+        cur, "SELECT Question_Choice_ID, Question_ID, Choice_Text FROM Question_Choice")))
+
+    print("Streaming Exam_Questions...")
+    push_stream("exam_questions", ((f"{eq['Exam_ID']}_{eq['Question_ID']}", eq)
+                                   for eq in stream_rows(cur, "SELECT Exam_ID, Question_ID FROM Exam_Questions")))
+
+    # Grouped collections: the ORDER BY makes every group complete before it is pushed
+    print("Streaming exam_questions_grouped...")
+    push_stream("exam_questions_grouped", group_rows(
+        stream_rows(cur, "SELECT Exam_ID, Question_ID FROM Exam_Questions ORDER BY Exam_ID, Question_ID"),
+        "Exam_ID", lambda eq: eq["Question_ID"]))
+    print("Streaming choices_by_question...")
+    push_stream("choices_by_question", group_rows(
+        stream_rows(cur, "SELECT Question_Choice_ID, Question_ID, Choice_Text FROM Question_Choice "
+                         "ORDER BY Question_ID, Question_Choice_ID"),
+        "Question_ID", lambda ch: ch))
+
+    # Read-optimized exam_bundles/<Exam_ID>: one GET starts an exam in the portal (exam_bundles.py)
+    print("Streaming exam_bundles...")
+    push_stream("exam_bundles", group_bundles(stream_rows(cur, bundle_sql())))
+
+    # student_course_index/<Student_ID>: one student's courses in one keyed GET (student_course_index.py)
+    print("Streaming student_course_index...")
+    push_stream("student_course_index", group_rows(stream_rows(cur, index_sql()), "Student_ID", index_entry))
+
+def stamp_version(path):
+    """
+    Writes the server time to meta/versions/<path>. Running portals poll this node
+    and re-download only the collections whose stamp changed.
+    """
+    client.put(f"meta/versions/{path}", {".sv": "timestamp"})
 
 def main():
     cn = pyodbc.connect(SQL_CONN)
     cur = cn.cursor()
 
+    if EXPORT_MODE == "delta":
+        while True:
+            try:
+                run_delta(cur, client, uploader, EXPORT_STATE_FILE, export_streaming)
+                cn.commit()  # ends the read transaction, so the next run sees new changes
+            except (pyodbc.Error, requests.exceptions.RequestException) as e:
+                if not EXPORT_INTERVAL_SECONDS:
+                    raise
+                cn.rollback()
+                print(f"Delta export failed: {e} (the marks are unchanged; retrying on the next run)")
+            if not EXPORT_INTERVAL_SECONDS:
+                break
+            time.sleep(EXPORT_INTERVAL_SECONDS)
+        print(f"Firebase requests: {client.stats.snapshot()}, uploads: {uploader.client.stats.snapshot()}")
+        return
+
+    if EXPORT_MODE == "stream":
+        export_streaming(cur)
+        print("Export complete.")
+        print(f"Firebase requests: {client.stats.snapshot()}, uploads: {uploader.client.stats.snapshot()}")
+        return
+
     print("Querying Course...")
     courses = query_table(cur, "SELECT Course_ID, Course_Name FROM Course")
     courses_map = {c["Course_ID"]: c for c in courses}
@@ -133,8 +249,11 @@ def main():
     # optionally push mapping structures that speed up queries in streamlit app (e.g., exam->question list)
     push_to_firebase("exam_questions_grouped", eq_by_exam)
     push_to_firebase("choices_by_question", choices_by_q)
+    push_to_firebase("exam_bundles", dict(bundles_from_tables(exams_map, eq_by_exam, questions_map, choices_by_q)))
+    push_to_firebase("student_course_index", index_from_tables(courses, student_courses))
 
     print("Export complete.")
+    print(f"Firebase requests: {client.stats.snapshot()}, uploads: {uploader.client.stats.snapshot()}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,360 @@
+"""
+answer_feed.py
+Incremental reader of /student_answers for ReceiveFireBaseDataApp.py.
+Answers are stored under push keys, which start with their creation time and
+sort in submission order, so instead of downloading the whole tree every poll:
+  GET student_answers.json?orderBy="$key"&startAt="<cursor>"&limitToFirst=<page>
+pages through only the answers added since the last poll. The cursor is kept in
+a small JSON checkpoint file (written with an atomic replace) so a restart
+continues where the daemon stopped.
+Push keys are generated by the portal hosts (batch submit) and by Firebase (POST),
+so a host with a slow clock can write a key just below the cursor. Each poll
+therefore starts a few seconds before the cursor (the overlap window) and skips
+the keys it has already returned. The portal hosts must keep their clocks in sync
+(NTP) to well within that window: a key written further back is below every later
+query. A periodic reconciliation pass catches those: a shallow key scan of the
+whole path (keys only, no records) compared with the ledger. The keys below the cursor
+(back to the reconcile window) that the ledger does not hold are read in pages; the
+ones of another shard are remembered and skipped, the rest are logged and returned.
+AnswerStream subscribes to the same query with the REST streaming protocol instead
+of polling, and resumes from the checkpoint whenever the stream drops.
+Both have a batches() generator for the pipelined daemon (answer_pipeline.py): the
+answers it hands out stay "in flight" until commit(), so the fetcher can read ahead
+of the SQL writer without returning them twice.
+"""
+
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+import requests
+
+from firebase_client import push_id_floor, push_id_time
+
+
+class SyncCheckpoint:
+    """Durable cursor of the sync daemon: the last /student_answers key it has processed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.last_key = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.last_key = json.load(f).get("last_key")
+        except FileNotFoundError:
+            self.last_key = None
+        except (ValueError, AttributeError) as e:
+            print(f"Checkpoint file '{self.path}' is unreadable ({e}); starting from the first answer.")
+            self.last_key = None
+        return self.last_key
+
+    def save(self, last_key):
+        """Writes the checkpoint to a temp file and renames it over the old one."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".checkpoint-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"last_key": last_key, "saved_at": int(time.time())}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self.last_key = last_key
+
+
+class AnswerFeed:
+    """
+    poll() returns the answers not yet committed as [(key, record), ...] in key order;
+    commit(keys) marks them processed and advances the durable cursor, and is called
+    once they are in SQL Server, so answers of a failed batch are returned again.
+    batches() polls in a loop and reads past the answers it has handed out, which
+    are skipped until they are committed (or until batches() is started again).
+    """
+
+    def __init__(self, client, checkpoint, path="student_answers", page_size=1000, overlap_ms=5000,
+                 ledger=None, reconcile_seconds=0, reconcile_window_ms=3_600_000, owns=None):
+        self.client = client
+        self.checkpoint = checkpoint
+        self.path = path
+        self.page_size = page_size
+        self.overlap_ms = overlap_ms
+        # Committed keys that are still inside the overlap window: {key: timestamp ms}.
+        # After a restart only the cursor itself is known; the rest of the window is read again.
+        self._recent = {}
+        if checkpoint.last_key is not None:
+            self._recent[checkpoint.last_key] = push_id_time(checkpoint.last_key) or 0
+        # Keys handed out by batches() and not committed yet, and the highest of them
+        self._pending = set()
+        self._read_key = None
+        self._lock = threading.Lock()  # batches() and commit() run on different threads in the pipeline
+        self.on_error = None  # optional callback(exception) for the Firebase errors batches() retries
+        # Reconciliation: processed keys (AnswerLedger) to scan against, every reconcile_seconds (0: off),
+        # for keys up to reconcile_window_ms below the cursor (0: all of them)
+        self.ledger = ledger
+        self.reconcile_seconds = reconcile_seconds
+        self.reconcile_window_ms = reconcile_window_ms
+        self.owns = owns  # record -> True if this worker's shard handles it; None: every record
+        self._next_reconcile = time.monotonic()  # first pass on the first poll
+        self._missed = set()  # keys returned by the last reconcile() and not committed yet
+        # Other shards' keys inside the reconcile window: {key: timestamp ms}. They never reach
+        # this worker's ledger, so without them every scan would read them again.
+        self._foreign = {}
+
+    def _start_key(self):
+        last_key = max((k for k in (self.checkpoint.last_key, self._read_key) if k is not None), default=None)
+        if last_key is None:
+            return None
+        last_ms = push_id_time(last_key)
+        if last_ms is None or not self.overlap_ms:
+            return last_key
+        return min(last_key, push_id_floor(last_ms - self.overlap_ms))
+
+    def _page(self, start_key):
+        params = {"orderBy": json.dumps("$key"), "limitToFirst": self.page_size}
+        if start_key is not None:
+            params["startAt"] = json.dumps(start_key)
+        data = self.client.get(self.path, params=params) or {}
+        if isinstance(data, list):  # keys that look like array indexes
+            data = {str(i): v for i, v in enumerate(data) if v is not None}
+        return sorted(data.items())
+
+    def _window_floor(self, start_key):
+        """Lowest key reconcile() looks at, or None for the whole path."""
+        start_ms = push_id_time(start_key)
+        if start_ms is None or not self.reconcile_window_ms:
+            return None
+        return push_id_floor(start_ms - self.reconcile_window_ms)
+
+    def _range(self, first_key, last_key):
+        """[(key, record), ...] from first_key to last_key inclusive, page_size at a time."""
+        items, start_key = [], first_key
+        while True:
+            params = {"orderBy": json.dumps("$key"), "startAt": json.dumps(start_key),
+                      "endAt": json.dumps(last_key), "limitToFirst": self.page_size}
+            page = sorted((self.client.get(self.path, params=params) or {}).items())
+            items.extend(kv for kv in page if kv[0] != start_key or start_key == first_key)
+            if len(page) < self.page_size or page[-1][0] == start_key:
+                return items
+            start_key = page[-1][0]
+
+    def reconcile(self):
+        """
+        Shallow key scan of the whole path against the ledger. Returns the answers of this
+        worker below the start key that were never processed, as [(key, record), ...] in
+        key order: written by a portal whose clock was behind by more than the overlap window.
+        """
+        start_key = self._start_key()
+        if start_key is None or self.ledger is None:
+            return []
+        floor = self._window_floor(start_key)
+        keys = self.client.get(self.path, params={"shallow": "true"})
+        if not isinstance(keys, dict):
+            return []
+        with self._lock:
+            candidates = sorted(key for key in keys
+                                if key < start_key and (floor is None or key >= floor) and key not in self._recent
+                                and key not in self._pending and key not in self._foreign)
+        candidates = [key for key in candidates if key not in self.ledger]
+        items, foreign = [], {}
+        if candidates:
+            wanted = set(candidates)
+            for key, record in self._range(candidates[0], candidates[-1]):
+                if key not in wanted or not isinstance(record, dict):
+                    continue
+                if self.owns is None or self.owns(record):
+                    items.append((key, record))
+                else:
+                    foreign[key] = push_id_time(key) or 0
+        with self._lock:
+            self._foreign.update(foreign)
+            self._missed = {key for key, _ in items}
+        if items:
+            print(f"Reconciliation: {len(items)} answer(s) below the cursor {start_key} were never read "
+                  f"(a portal clock more than {self.overlap_ms / 1000:g} s behind?), processing them now: "
+                  f"{[key for key, _ in items[:5]]}{' ...' if len(items) > 5 else ''}")
+        return items
+
+    def _reconcile_due(self):
+        """
+        reconcile() once every reconcile_seconds, otherwise []; straight away when answers
+        it returned were neither committed nor are in flight (their batch failed).
+        """
+        if not self.reconcile_seconds or self.ledger is None:
+            return []
+        with self._lock:
+            retry = bool(self._missed - self._pending)
+        if not retry and time.monotonic() < self._next_reconcile:
+            return []
+        items = self.reconcile()
+        self._next_reconcile = time.monotonic() + self.reconcile_seconds
+        return items
+
+    def poll(self):
+        """Pages through the new answers. Raises requests.exceptions.RequestException on failures."""
+        items = self._reconcile_due()
+        seen = {key for key, _ in items}
+        start_key = self._start_key()
+        while True:
+            page = self._page(start_key)
+            with self._lock:
+                for key, rec in page:
+                    if key in self._recent or key in self._pending or key in seen:
+                        continue
+                    seen.add(key)
+                    items.append((key, rec))
+            if len(page) < self.page_size:
+                break
+            if page[-1][0] == start_key:  # page_size 1: only the cursor itself came back
+                break
+            start_key = page[-1][0]  # startAt is inclusive; the repeated key is skipped above
+        return items
+
+    def _hand_out(self, items):
+        """Marks items as in flight: later reads skip them and start after them."""
+        with self._lock:
+            self._pending.update(key for key, _ in items)
+            last_key = items[-1][0]
+            if self._read_key is None or last_key > self._read_key:
+                self._read_key = last_key
+
+    def _restart(self):
+        """Forgets the in-flight answers of a previous batches() run; they are read again."""
+        with self._lock:
+            self._pending.clear()
+            self._read_key = None
+
+    def batches(self, idle_seconds=3, retry_seconds=10):
+        """Yields each non-empty poll forever; commit(keys) after each one is stored."""
+        self._restart()
+        while True:
+            try:
+                items = self.poll()
+            except requests.exceptions.RequestException as e:
+                if self.on_error:
+                    self.on_error(e)
+                print(f"Connection error to Firebase: {e}")
+                print(f"Retrying in {retry_seconds} seconds...")
+                time.sleep(retry_seconds)
+                continue
+            if not items:
+                time.sleep(idle_seconds)
+                continue
+            self._hand_out(items)
+            yield items
+
+    def commit(self, keys):
+        """Marks keys returned by poll() as processed and persists the cursor past them."""
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                self._recent[key] = push_id_time(key) or 0
+            self._pending.difference_update(keys)
+            self._missed.difference_update(keys)
+            last_key = max(keys)
+            if self.checkpoint.last_key is None or last_key > self.checkpoint.last_key:
+                self.checkpoint.save(last_key)
+            # Forget the keys that fell out of the overlap window
+            last_ms = push_id_time(self.checkpoint.last_key)
+            if last_ms is not None:
+                horizon = last_ms - self.overlap_ms
+                self._recent = {k: ms for k, ms in self._recent.items() if ms >= horizon}
+                if self._foreign and self.reconcile_window_ms:
+                    horizon = last_ms - self.overlap_ms - self.reconcile_window_ms
+                    self._foreign = {k: ms for k, ms in self._foreign.items() if ms >= horizon}
+
+
+class AnswerStream(AnswerFeed):
+    """
+    Streaming version of AnswerFeed: GET student_answers?orderBy="$key"&startAt=<cursor>
+    with Accept: text/event-stream. Firebase first sends every answer after the cursor
+    (one put event), then one put or patch event per write. batches() yields the new
+    answers of each event and reconnects with backoff, from the checkpoint, when the
+    stream drops or Firebase cancels it.
+    """
+
+    def __init__(self, client, checkpoint, path="student_answers", overlap_ms=5000,
+                 read_timeout=90, max_reconnect_delay=30, ledger=None, reconcile_seconds=0,
+                 reconcile_window_ms=3_600_000, owns=None):
+        super().__init__(client, checkpoint, path=path, overlap_ms=overlap_ms, ledger=ledger,
+                         reconcile_seconds=reconcile_seconds, reconcile_window_ms=reconcile_window_ms, owns=owns)
+        self.read_timeout = read_timeout
+        self.max_reconnect_delay = max_reconnect_delay
+
+    def _params(self):
+        params = {"orderBy": json.dumps("$key")}
+        start_key = self._start_key()
+        if start_key is not None:
+            params["startAt"] = json.dumps(start_key)
+        return params
+
+    def _event_items(self, event, data):
+        """[(key, record), ...] carried by a put or patch event, minus committed keys."""
+        if not isinstance(data, dict):
+            return []
+        path = str(data.get("path") or "/").strip("/")
+        value = data.get("data")
+        if event == "patch":
+            prefix = f"{path}/" if path else ""
+            changes = {prefix + k: v for k, v in (value or {}).items()}
+        elif path:
+            changes = {path: value}
+        elif isinstance(value, list):  # keys that look like array indexes
+            changes = {str(i): v for i, v in enumerate(value) if v is not None}
+        else:
+            changes = value or {}
+
+        records = {}
+        for child_path, record in changes.items():
+            key, _, field = child_path.partition("/")
+            if key in self._recent or key in self._pending:
+                continue
+            if field:
+                # Only part of the answer changed: read the whole record
+                record = self.client.get(f"{self.path}/{key}")
+            if isinstance(record, dict):
+                records[key] = record
+        return sorted(records.items())
+
+    def batches(self):
+        """Yields lists of new (key, record) pairs forever; commit(keys) after each one is stored."""
+        self._restart()
+        delay = 1
+        while True:
+            try:
+                for event, data in self.client.stream(self.path, self._params(), read_timeout=self.read_timeout):
+                    missed = self._reconcile_due()  # checked on every event, keep-alives included
+                    if missed:
+                        self._hand_out(missed)
+                        yield missed
+                    if event in ("put", "patch"):
+                        delay = 1
+                        items = self._event_items(event, data)
+                        if items:
+                            self._hand_out(items)
+                            yield items
+                    elif event == "cancel":
+                        print("Answer stream cancelled by Firebase (security rules), reconnecting...")
+                        break
+                    elif event == "auth_revoked":
+                        print("Answer stream credential expired, reconnecting...")
+                        break
+                    # keep-alive: nothing to do
+                else:
+                    print("Answer stream closed by the server, reconnecting...")
+            except requests.exceptions.RequestException as e:
+                if self.on_error:
+                    self.on_error(e)
+                print(f"Answer stream dropped ({e}), reconnecting...")
+            # Jittered exponential backoff; the new subscription resumes from the checkpoint
+            time.sleep(random.uniform(delay / 2, delay))
+            delay = min(delay * 2, self.max_reconnect_delay)
@@ -0,0 +1,99 @@
+"""
+answer_ledger.py
+Durable record of the /student_answers keys ReceiveFireBaseDataApp.py has already
+stored in SQL Server, replacing the in-memory processed_keys set that grew forever
+and was lost on restart.
+  - the keys live in a SQLite file (one WITHOUT ROWID table keyed by the push key);
+  - a Bloom filter in memory answers "never seen" (the common case for new answers)
+    without touching the disk, in a fixed amount of RAM set by the expected key count;
+  - "maybe seen" is confirmed with a primary-key lookup in SQLite.
+Keys are added after the SQL Server commit of their batch, so a crash in between
+only re-applies that batch (the upserts are idempotent).
+"""
+
+import hashlib
+import math
+import sqlite3
+import threading
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on a 128-bit BLAKE2b digest)."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(1, int(capacity))
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class AnswerLedger:
+    """
+    Usage:
+        ledger = AnswerLedger("answer_ledger.sqlite3")
+        if key in ledger: ...            # already stored in SQL Server
+        ledger.add_many(done_keys)       # after the SQL Server commit
+    """
+
+    def __init__(self, path, expected_keys=2_000_000, error_rate=0.001):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS processed_keys (key TEXT PRIMARY KEY) WITHOUT ROWID")
+        self._db.commit()
+
+        self._bloom = BloomFilter(expected_keys, error_rate)
+        self._count = 0
+        for (key,) in self._db.execute("SELECT key FROM processed_keys"):
+            self._bloom.add(key)
+            self._count += 1
+        if self._count > expected_keys:
+            print(f"Answer ledger holds {self._count} keys, more than the {expected_keys} it was sized for; "
+                  "raise ANSWER_LEDGER_EXPECTED_KEYS to keep lookups off the disk.")
+
+    def __contains__(self, key):
+        if key not in self._bloom:
+            return False
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM processed_keys WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self._count
+
+    def add_many(self, keys):
+        """Records keys as processed, durably, in one SQLite transaction."""
+        keys = list(keys)
+        if not keys:
+            return
+        with self._lock:
+            before = self._db.total_changes
+            with self._db:
+                self._db.executemany("INSERT OR IGNORE INTO processed_keys (key) VALUES (?)",
+                                     [(key,) for key in keys])
+            self._count += self._db.total_changes - before
+        for key in keys:
+            self._bloom.add(key)
+
+    def last_key(self):
+        """Highest key recorded (push keys sort by time), or None for an empty ledger."""
+        with self._lock:
+            return self._db.execute("SELECT MAX(key) FROM processed_keys").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
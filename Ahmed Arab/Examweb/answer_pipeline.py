@@ -0,0 +1,140 @@
+"""
+answer_pipeline.py
+Runs the stages of ReceiveFireBaseDataApp.py on their own threads, connected by
+bounded queues, instead of fetch -> grade -> write one batch at a time:
+  fetch   new answers from Firebase (AnswerFeed / AnswerStream batches())
+  grade   validate the records and grade them (grading.py)
+  write   staging load + MERGE + commit, then the ledger and the checkpoint
+While SQL Server writes one batch, the grader works on the next one and the fetcher
+reads the one after, so throughput is set by the slowest stage instead of the sum of
+all of them. When the writer falls behind, its queue fills up, the grader blocks on
+put(), then the fetcher stops reading Firebase (backpressure): at most `depth`
+batches wait between two stages.
+Batches go through every stage in order, so the checkpoint still only moves forward.
+"""
+
+import queue
+import threading
+import time
+
+
+class StagePipeline:
+    """
+    Usage:
+        pipeline = StagePipeline(feed.batches(), [("grade", grade), ("write", write)], depth=4)
+        pipeline.run()  # blocks; stages retry a failed batch until it goes through
+    The source is iterated on the fetch thread; each stage function takes the previous
+    stage's output, and the last stage's return value is dropped.
+    """
+
+    def __init__(self, source, stages, depth=4, on_error=None, retry_seconds=10, report_seconds=60):
+        self.source = source
+        self.stages = list(stages)
+        self.depth = depth
+        self.on_error = on_error
+        self.retry_seconds = retry_seconds
+        self.report_seconds = report_seconds
+        self.queues = [queue.Queue(maxsize=depth) for _ in self.stages]
+        names = ["fetch"] + [name for name, _ in self.stages]
+        # Seconds spent working rather than waiting on a queue (for fetch this includes
+        # waiting for new answers, so a high fetch share with empty queues means "idle")
+        self.busy = {name: 0.0 for name in names}
+        self.batches = {name: 0 for name in names}
+        self._stop = threading.Event()
+        self._failure = None
+
+    def _put(self, q, item):
+        """Blocks while the next stage is `depth` batches behind (backpressure)."""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _call(self, name, fn, batch):
+        """Runs one stage on a batch, retrying after errors until it succeeds or the pipeline stops."""
+        while not self._stop.is_set():
+            try:
+                return fn(batch)
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(name, e)
+                else:
+                    print(f"Pipeline stage '{name}' failed: {e}")
+                print(f"Retrying the {name} stage in {self.retry_seconds} seconds...")
+                self._stop.wait(self.retry_seconds)
+        return None
+
+    def _fetch(self):
+        source = iter(self.source)
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            batch = next(source)
+            self.busy["fetch"] += time.perf_counter() - started
+            self.batches["fetch"] += 1
+            if not self._put(self.queues[0], batch):
+                return
+
+    def _stage(self, index):
+        name, fn = self.stages[index]
+        inbox = self.queues[index]
+        outbox = self.queues[index + 1] if index + 1 < len(self.stages) else None
+        while not self._stop.is_set():
+            try:
+                batch = inbox.get(timeout=1)
+            except queue.Empty:
+                continue
+            started = time.perf_counter()
+            result = self._call(name, fn, batch)
+            self.busy[name] += time.perf_counter() - started
+            self.batches[name] += 1
+            if outbox is not None and not self._put(outbox, result):
+                return
+
+    def _guard(self, target, *args):
+        try:
+            target(*args)
+        except BaseException as e:  # the source ran dry or broke: stop every stage
+            self._failure = e
+            self._stop.set()
+
+    def status(self):
+        """Per-stage batches, busy seconds and queued batches (queue in front of the stage)."""
+        queued = [None] + [q.qsize() for q in self.queues]
+        return {name: {"batches": self.batches[name], "busy_seconds": round(self.busy[name], 3),
+                       "queued": queued[i]}
+                for i, name in enumerate(self.busy)}
+
+    def _report(self, started, last_busy):
+        elapsed = time.perf_counter() - started
+        parts = []
+        for name, busy in self.busy.items():
+            share = min(100, 100 * (busy - last_busy[name]) / elapsed)  # a stage's time is counted when its batch ends
+            parts.append(f"{name} {share:.0f}%")
+        queued = ", ".join(f"{q.qsize()}/{self.depth}" for q in self.queues)
+        print(f"Pipeline busy: {', '.join(parts)}; queued between stages: {queued}")
+
+    def run(self):
+        threads = [threading.Thread(target=self._guard, args=(self._fetch,), name="answer-fetch", daemon=True)]
+        for index, (name, _) in enumerate(self.stages):
+            threads.append(threading.Thread(target=self._guard, args=(self._stage, index),
+                                            name=f"answer-{name}", daemon=True))
+        for thread in threads:
+            thread.start()
+        try:
+            started, last_busy = time.perf_counter(), dict(self.busy)
+            while not self._stop.wait(1):
+                if self.report_seconds and time.perf_counter() - started >= self.report_seconds:
+                    self._report(started, last_busy)
+                    started, last_busy = time.perf_counter(), dict(self.busy)
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join(timeout=5)
+        if self._failure is not None and not isinstance(self._failure, StopIteration):
+            raise self._failure
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,142 @@
+"""
+answer_shards.py
+Sharded answer ingestion: N ReceiveFireBaseDataApp.py worker processes, each owning
+one hash partition of the answers, so grading and SQL writes scale with the cores.
+  worker i of N  handles the answers with crc32(str(<ANSWER_SHARD_KEY>)) % N == i
+                 (ANSWER_SHARD="i/N"; the key is Exam_ID by default, or Student_ID)
+Every answer row (Exam_ID, Question_ID, Student_ID) belongs to exactly one shard, so
+no two workers ever upsert the same row. Each worker keeps its own checkpoint and
+ledger (answer_sync_checkpoint.shard-i-of-N.json, answer_ledger.shard-i-of-N.sqlite3)
+and its own staging table (#temp tables are per connection). Workers still read the
+whole feed; the other shards' answers only move their cursor forward.
+Changing the number of workers starts new checkpoints and ledgers: the answers still
+in /student_answers are applied again (the upserts are idempotent), so compact first.
+The supervisor starts the workers, prefixes their output with the shard, gives each
+its own metrics port (METRICS_PORT + i) and restarts a worker that exits:
+  python answer_shards.py --workers 4 --shard-key Exam_ID
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+RECEIVER = str(Path(__file__).resolve().parent / "ReceiveFireBaseDataApp.py")
+SHARD_KEYS = ("Exam_ID", "Student_ID")
+
+
+# --- Partitioning ---
+def parse_shard(value):
+    """ "i/N" -> (i, N), or None when sharding is off (empty value)."""
+    if not value:
+        return None
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"ANSWER_SHARD must look like 'i/N', got {value!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"ANSWER_SHARD {value!r} is out of range (0 <= i < N)")
+    return index, count
+
+
+def shard_of(record, key_field, count):
+    """Shard of an answer record; stable across processes and runs (unlike hash())."""
+    value = record.get(key_field) if isinstance(record, dict) else None
+    return zlib.crc32(str(value).encode("utf-8")) % count
+
+
+def split_items(items, shard, key_field="Exam_ID"):
+    """[(key, record), ...] -> (this shard's items, keys of the other shards' items)."""
+    index, count = shard
+    mine, foreign_keys = [], []
+    for key, record in items:
+        if shard_of(record, key_field, count) == index:
+            mine.append((key, record))
+        else:
+            foreign_keys.append(key)
+    return mine, foreign_keys
+
+
+def shard_path(path, shard):
+    """answer_ledger.sqlite3 -> answer_ledger.shard-1-of-4.sqlite3"""
+    path = Path(path)
+    index, count = shard
+    return str(path.with_name(f"{path.stem}.shard-{index}-of-{count}{path.suffix}"))
+
+
+def shard_paths(path):
+    """The unsharded file and every shard file derived from it that exists."""
+    path = Path(path)
+    found = sorted(path.parent.glob(f"{path.stem}.shard-*-of-*{path.suffix}"))
+    return [str(p) for p in ([path] if path.exists() else []) + found]
+
+
+# --- Supervisor ---
+def _relay(shard_label, stream):
+    for line in iter(stream.readline, ""):
+        print(f"[shard {shard_label}] {line}", end="", flush=True)
+
+
+def start_worker(index, count, shard_key, metrics_base_port):
+    env = dict(os.environ, ANSWER_SHARD=f"{index}/{count}", ANSWER_SHARD_KEY=shard_key, PYTHONUNBUFFERED="1")
+    env["METRICS_PORT"] = str(metrics_base_port + index) if metrics_base_port else "0"
+    proc = subprocess.Popen([sys.executable, RECEIVER], env=env, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True, encoding="utf-8", errors="replace")
+    threading.Thread(target=_relay, args=(f"{index}/{count}", proc.stdout), daemon=True).start()
+    return proc
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run sharded answer sync workers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--shard-key", choices=SHARD_KEYS, default=os.getenv("ANSWER_SHARD_KEY", "Exam_ID"))
+    parser.add_argument("--metrics-base-port", type=int, default=int(os.getenv("METRICS_PORT", "9108")),
+                        help="worker i serves metrics on this port + i (0 disables)")
+    parser.add_argument("--max-restart-delay", type=float, default=60)
+    args = parser.parse_args()
+
+    count = max(1, args.workers)
+    print(f"Starting {count} answer sync workers sharded by crc32({args.shard_key}) % {count}... "
+          "Press Ctrl+C to stop.")
+    workers = {}  # index -> [process, started_at, restart delay, restart at]
+    for index in range(count):
+        workers[index] = [start_worker(index, count, args.shard_key, args.metrics_base_port), time.time(), 1, None]
+
+    try:
+        while True:
+            time.sleep(1)
+            now = time.time()
+            for index, worker in workers.items():
+                proc, started_at, delay, restart_at = worker
+                if restart_at is not None:
+                    if now >= restart_at:
+                        print(f"Restarting shard {index}/{count}...")
+                        worker[:] = [start_worker(index, count, args.shard_key, args.metrics_base_port),
+                                     now, delay, None]
+                    continue
+                code = proc.poll()
+                if code is None:
+                    continue
+                if now - started_at > 60:
+                    delay = 1  # it ran for a while: restart promptly
+                print(f"Shard {index}/{count} exited with code {code}; restarting in {delay:g} s.")
+                worker[:] = [proc, started_at, min(delay * 2, args.max_restart_delay), now + delay]
+    except KeyboardInterrupt:
+        print("Stopping workers...")
+    finally:
+        for proc, *_ in workers.values():
+            if proc.poll() is None:
+                proc.terminate()
+        for proc, *_ in workers.values():
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+if __name__ == "__main__":
+    main()
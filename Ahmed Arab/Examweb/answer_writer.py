@@ -0,0 +1,112 @@
+"""
+answer_writer.py
+Set-based write path of ReceiveFireBaseDataApp.py: a batch of graded answers is
+loaded into the session's #Answer_Staging temp table with fast_executemany and
+merged into Student_Exam_Answer by one MERGE, with one commit per batch, instead
+of SELECT + UPDATE/INSERT + COMMIT for every answer. The batch is graded in one
+vectorized pass by grading.ModelAnswerTable.
+"""
+
+import pandas as pd
+
+STAGING_TABLE = "#Answer_Staging"
+ANSWER_COLUMNS = ["Exam_ID", "Question_ID", "Student_ID", "Student_Answer"]
+KEY_COLUMNS = ["Exam_ID", "Question_ID", "Student_ID"]
+
+
+def ensure_staging_table(cur):
+    """Creates the staging table once per connection (temp tables live as long as the session)."""
+    cur.execute(f"""
+        IF OBJECT_ID('tempdb..{STAGING_TABLE}') IS NULL
+            CREATE TABLE {STAGING_TABLE} (
+                Exam_ID INT NOT NULL,
+                Question_ID INT NOT NULL,
+                Student_ID INT NOT NULL,
+                Student_Answer NVARCHAR(1000) NULL,
+                Student_Grade DECIMAL(6,2) NULL,
+                PRIMARY KEY (Exam_ID, Question_ID, Student_ID)
+            )
+    """)
+
+
+def load_staging(cur, batch):
+    """Replaces the staging table's rows with a grade_answers() batch (fast_executemany)."""
+    ensure_staging_table(cur)
+    cur.execute(f"TRUNCATE TABLE {STAGING_TABLE}")
+    cur.fast_executemany = True
+    cur.executemany(
+        f"INSERT INTO {STAGING_TABLE} (Exam_ID, Question_ID, Student_ID, Student_Answer, Student_Grade) "
+        "VALUES (?, ?, ?, ?, ?)",
+        batch[ANSWER_COLUMNS + ["Student_Grade"]].astype(object).to_numpy().tolist())  # plain Python ints/floats for pyodbc
+
+
+def grade_answers(rows, model_answers):
+    """
+    Grades rows [(exam_id, question_id, student_id, student_answer), ...] against
+    model_answers (a grading.ModelAnswerTable) into a DataFrame ready for
+    write_graded_answers(). When a batch has several answers for the same question
+    of a student, the last one wins, as with row-by-row upserts.
+    """
+    batch = pd.DataFrame(rows, columns=ANSWER_COLUMNS).drop_duplicates(KEY_COLUMNS, keep="last")
+    missing = model_answers.missing_questions(batch["Question_ID"])
+    if missing:
+        print(f"WARNING: No model answer found for QIDs {missing}. Defaulting to grade 0.")
+    batch["Student_Grade"] = model_answers.grade(batch)
+    return batch
+
+
+def write_graded_answers(cn, cur, batch, table="Student_Exam_Answer"):
+    """
+    Writes a grade_answers() batch with one staging load, one MERGE and one commit.
+    Returns the number of rows merged; raises pyodbc.Error (nothing is committed then).
+    """
+    if batch.empty:
+        return 0
+    load_staging(cur, batch)
+    cur.execute(f"""
+        MERGE {table} WITH (HOLDLOCK) AS t
+        USING {STAGING_TABLE} AS s
+           ON t.Exam_ID = s.Exam_ID AND t.Question_ID = s.Question_ID AND t.Student_ID = s.Student_ID
+        WHEN MATCHED THEN
+            UPDATE SET t.Student_Answer = s.Student_Answer, t.Student_Grade = s.Student_Grade
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT (Exam_ID, Question_ID, Student_ID, Student_Answer, Student_Grade)
+            VALUES (s.Exam_ID, s.Question_ID, s.Student_ID, s.Student_Answer, s.Student_Grade);
+    """)
+    cn.commit()
+    return len(batch)
+
+
+def bulk_upsert_answers(cn, cur, rows, model_answers, table="Student_Exam_Answer"):
+    """
+    grade_answers() + write_graded_answers(): grades rows [(exam_id, question_id,
+    student_id, student_answer), ...] and writes them in one MERGE and one commit.
+    Returns the number of rows merged; raises pyodbc.Error (nothing is committed then).
+    """
+    if not rows:
+        return 0
+    return write_graded_answers(cn, cur, grade_answers(rows, model_answers), table=table)
+
+
+def regrade_answers(cn, cur, batch, table="Student_Exam_Answer"):
+    """
+    Stores new grades for answers already in the table (a grade_answers() batch of
+    stored answers), with one staging load, one UPDATE and one commit. A row is only
+    updated while it still holds the graded answer, so an answer resubmitted in the
+    meantime keeps the grade it was written with.
+    Returns the number of grades changed; raises pyodbc.Error (nothing is committed then).
+    """
+    if batch.empty:
+        return 0
+    load_staging(cur, batch)
+    cur.execute(f"""
+        UPDATE t SET t.Student_Grade = s.Student_Grade
+        FROM {table} AS t
+        JOIN {STAGING_TABLE} AS s
+          ON t.Exam_ID = s.Exam_ID AND t.Question_ID = s.Question_ID AND t.Student_ID = s.Student_ID
+         AND t.Student_Answer = s.Student_Answer
+        WHERE t.Student_Grade IS NULL OR t.Student_Grade <> s.Student_Grade;
+    """)
+    changed = cur.rowcount
+    cn.commit()
+    return changed
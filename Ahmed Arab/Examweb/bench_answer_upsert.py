@@ -0,0 +1,94 @@
+"""
+bench_answer_upsert.py
+Rows/second of the two write paths of ReceiveFireBaseDataApp.py against SQL Server:
+  row   SELECT + UPDATE/INSERT + COMMIT per answer (upsert_answer)
+  bulk  fast_executemany into #Answer_Staging, one MERGE and one COMMIT per batch
+The writes go to a temp copy of Student_Exam_Answer (#Student_Exam_Answer_Bench),
+so the real table is not touched. Each path runs an insert pass (new answers) and
+an update pass (the same answers resubmitted).
+Usage:
+  python bench_answer_upsert.py --rows 20000 --batch-size 1000
+"""
+
+import argparse
+import random
+import time
+
+import pyodbc
+
+from ReceiveFireBaseDataApp import SQL_CONN, upsert_answer
+from answer_writer import bulk_upsert_answers
+from grading import ModelAnswerTable
+
+BENCH_TABLE = "#Student_Exam_Answer_Bench"
+
+
+def make_answers(count, seed=7):
+    """Synthetic answers [(exam_id, question_id, student_id, answer), ...] and their model answers."""
+    rng = random.Random(seed)
+    model_answers_map = {str(qid): rng.choice("ABCD") for qid in range(1, 501)}
+    rows = []
+    for i in range(count):
+        student_id, question_id = divmod(i, 500)
+        rows.append((1 + student_id % 20, question_id + 1, student_id + 1, rng.choice("ABCD")))
+    return rows, model_answers_map
+
+
+def reset_bench_table(cn, cur):
+    cur.execute(f"IF OBJECT_ID('tempdb..{BENCH_TABLE}') IS NOT NULL DROP TABLE {BENCH_TABLE}")
+    cur.execute(f"""
+        CREATE TABLE {BENCH_TABLE} (
+            Exam_ID INT NOT NULL,
+            Question_ID INT NOT NULL,
+            Student_ID INT NOT NULL,
+            Student_Answer NVARCHAR(1000) NULL,
+            Student_Grade DECIMAL(6,2) NULL,
+            PRIMARY KEY (Exam_ID, Question_ID, Student_ID)
+        )
+    """)
+    cn.commit()
+
+
+def run_row(cn, cur, rows, model_answers_map, batch_size):
+    for exam_id, qid, sid, ans in rows:
+        upsert_answer(cur, exam_id, qid, sid, ans, model_answers_map, table=BENCH_TABLE)
+        cn.commit()
+
+
+def run_bulk(cn, cur, rows, model_answers_map, batch_size):
+    model_table = ModelAnswerTable.from_mapping(model_answers_map)
+    for start in range(0, len(rows), batch_size):
+        bulk_upsert_answers(cn, cur, rows[start:start + batch_size], model_table, table=BENCH_TABLE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row-by-row vs set-based upsert of graded answers")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    rows, model_answers_map = make_answers(args.rows)
+    resubmitted = [(eid, qid, sid, "B") for eid, qid, sid, _ in rows]
+
+    cn = pyodbc.connect(SQL_CONN, autocommit=False)
+    cur = cn.cursor()
+    results = {}
+    for name, run in (("row", run_row), ("bulk", run_bulk)):
+        reset_bench_table(cn, cur)
+        for phase, data in (("insert", rows), ("update", resubmitted)):
+            started = time.perf_counter()
+            run(cn, cur, data, model_answers_map, args.batch_size)
+            elapsed = time.perf_counter() - started
+            results[(name, phase)] = elapsed
+            print(f"{name:<5} {phase:<7} {len(data):>8} rows  {elapsed:8.2f} s  {len(data) / elapsed:10.0f} rows/s")
+
+    for phase in ("insert", "update"):
+        print(f"bulk is {results[('row', phase)] / results[('bulk', phase)]:.1f}x faster on {phase}s "
+              f"(batch size {args.batch_size})")
+    cur.execute(f"DROP TABLE {BENCH_TABLE}")
+    cn.commit()
+    cn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+bench_export_upload.py
+Wall time of the SendDatabaseDataApp.py uploads against the local stub Firebase server
+(firebase_client.stub_server, with --latency-ms per request to stand in for the network):
+  fixed     25000-record PATCH chunks, one at a time, 0.5 s sleep after each (the old push_to_firebase)
+  adaptive  chunk_uploader.ChunkUploader: byte-sized chunks, --workers PATCHes at a time
+on synthetic collections shaped like the export (exam_portal.synthetic).
+Usage:
+  python bench_export_upload.py --questions 20000 --latency-ms 80 --workers 8 --chunk-bytes 1000000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from exam_portal.synthetic import synthetic_collections
+from firebase_client import FirebaseClient
+from firebase_client.stub_server import StubFirebaseServer
+from chunk_uploader import ChunkUploader
+
+
+def run_fixed(client, collections, batch_size=25000, pause=0.5):
+    for path, data in collections.items():
+        items = list(data.items())
+        for i in range(0, len(items), batch_size):
+            client.request("PATCH", path, json=dict(items[i:i + batch_size]))
+            time.sleep(pause)
+
+
+def run_adaptive(client, collections, chunk_bytes, workers):
+    uploader = ChunkUploader(client, max_bytes=chunk_bytes, workers=workers)
+    for path, data in collections.items():
+        uploader.upload(path, data.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed-size sequential vs byte-sized concurrent export uploads")
+    parser.add_argument("--questions", type=int, default=20000)
+    parser.add_argument("--students", type=int, default=3000)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--chunk-bytes", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    collections = synthetic_collections(questions=args.questions, students=args.students)
+    total = sum(len(data) for data in collections.values())
+    results = {}
+    for name in ("fixed", "adaptive"):
+        server = StubFirebaseServer(latency_ms=args.latency_ms).start()
+        client = FirebaseClient(server.url, timeout=(10, 300), retries=0, pool_size=args.workers)
+        started = time.perf_counter()
+        if name == "fixed":
+            run_fixed(client, collections)
+        else:
+            run_adaptive(client, collections, args.chunk_bytes, args.workers)
+        elapsed = time.perf_counter() - started
+        sent = client.stats.snapshot()["PATCH"]
+        results[name] = elapsed
+        print(f"{name:<8} {total:>8} records  {sent['requests']:>5} PATCHes  {sent['bytes_sent'] / 1e6:8.2f} MB  "
+              f"{elapsed:7.2f} s  {sent['bytes_sent'] / 1e6 / elapsed:7.2f} MB/s")
+        client.close()
+        server.stop()
+    print(f"adaptive is {results['fixed'] / results['adaptive']:.1f}x faster "
+          f"({args.workers} workers, {args.chunk_bytes} byte chunks, {args.latency_ms:g} ms latency)")
+
+
+if __name__ == "__main__":
+    main()
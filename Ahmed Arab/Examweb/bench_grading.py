@@ -0,0 +1,95 @@
+"""
+bench_grading.py
+Rows/second of answer grading, without SQL Server:
+  exact       the per-row model_answers_map lookup and == of upsert_answer
+  vectorized  grading.ModelAnswerTable.grade on one DataFrame (normalized comparison)
+The synthetic answers mix MCQ choices and True/False answers with the noise portals
+actually send (stray spaces, other case, "T"/"yes"), so the report also shows how
+many correct answers exact matching scores 0.
+Usage:
+  python bench_grading.py --rows 2000000 --questions 5000
+"""
+
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from grading import ModelAnswerTable
+
+CHOICES = ["Primary key", "Foreign key", "Unique index", "Check constraint"]
+NOISE = [lambda a: a, lambda a: a, lambda a: a, lambda a: f" {a} ", str.lower, str.upper, lambda a: a + "  "]
+TRUE_FALSE_NOISE = {"True": ["True", "true", "T", "yes", " TRUE"], "False": ["False", "false", "F", "no", "FALSE "]}
+
+
+def make_batch(rows, questions, seed=7):
+    """Synthetic model answers {qid: answer}, question types, and a DataFrame of answers."""
+    rng = random.Random(seed)
+    model_answers_map, question_types = {}, {}
+    for qid in range(1, questions + 1):
+        if qid % 4 == 0:
+            question_types[str(qid)] = "True/False"
+            model_answers_map[str(qid)] = rng.choice(["True", "False"])
+        else:
+            question_types[str(qid)] = "MCQ"
+            model_answers_map[str(qid)] = rng.choice(CHOICES)
+
+    question_ids = [rng.randint(1, questions) for _ in range(rows)]
+    answers = []
+    for qid in question_ids:
+        model_answer = model_answers_map[str(qid)]
+        right = rng.random() < 0.6
+        if question_types[str(qid)] == "True/False":
+            value = model_answer if right else ("False" if model_answer == "True" else "True")
+            answers.append(rng.choice(TRUE_FALSE_NOISE[value]))
+        else:
+            value = model_answer if right else rng.choice(CHOICES)
+            answers.append(rng.choice(NOISE)(value))
+    batch = pd.DataFrame({"Exam_ID": 1, "Question_ID": question_ids,
+                          "Student_ID": range(1, rows + 1), "Student_Answer": answers})
+    return model_answers_map, question_types, batch
+
+
+def grade_exact(batch, model_answers_map):
+    """The row-by-row grading of upsert_answer, kept for comparison."""
+    grades = []
+    for qid, answer in zip(batch["Question_ID"].tolist(), batch["Student_Answer"].tolist()):
+        model_answer = model_answers_map.get(str(qid))
+        grades.append(1 if model_answer is not None and answer == model_answer else 0)
+    return grades
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row-by-row vs vectorized answer grading")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--questions", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows} answers over {args.questions} questions...")
+    model_answers_map, question_types, batch = make_batch(args.rows, args.questions, args.seed)
+
+    started = time.perf_counter()
+    table = ModelAnswerTable.from_mapping(model_answers_map, question_types)
+    build_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    exact = grade_exact(batch, model_answers_map)
+    exact_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectorized = table.grade(batch)
+    vectorized_time = time.perf_counter() - started
+
+    print(f"model table  {len(table):>9} questions  {build_time:8.3f} s")
+    print(f"exact        {args.rows:>9} rows  {exact_time:8.2f} s  {args.rows / exact_time:12.0f} rows/s"
+          f"  {sum(exact):>9} correct")
+    print(f"vectorized   {args.rows:>9} rows  {vectorized_time:8.2f} s  {args.rows / vectorized_time:12.0f} rows/s"
+          f"  {int(vectorized.sum()):>9} correct")
+    print(f"vectorized is {exact_time / vectorized_time:.1f}x faster; exact matching scored "
+          f"{int(vectorized.sum()) - sum(exact)} correct answers 0")
+
+
+if __name__ == "__main__":
+    main()
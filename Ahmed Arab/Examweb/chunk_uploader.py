@@ -0,0 +1,153 @@
+"""
+chunk_uploader.py
+Uploads of SendDatabaseDataApp.py: (key, record) pairs go to Firebase as PATCH
+chunks sized by their serialized bytes instead of a fixed record count, several
+chunks at a time.
+  - Every record is serialized once; a chunk is closed when the next record would take it
+    past max_bytes (a single larger record is sent on its own), so long question texts
+    stay under the request limits and small rows do not waste round trips.
+  - A bounded pool of `workers` threads sends the chunks. At most 2 x workers chunks are
+    serialized and waiting, so memory stays flat on a streamed export.
+  - Throttling (429, 5xx, timeouts) is handled here, not with a fixed sleep: the number of
+    concurrent PATCHes is halved and every sender waits a shared backoff delay (at least
+    Retry-After). Each success shortens the delay, and a run of successes lets one more
+    PATCH run at a time again, up to `workers`.
+  - Every upload reports records, MB, chunks, throttled retries and MB/s.
+Give it a FirebaseClient with retries=0, so throttling reaches the uploader right away
+instead of being retried (and slept on) inside the client.
+Usage:
+    uploader = ChunkUploader(FirebaseClient(FIREBASE_URL, retries=0), max_bytes=4_000_000, workers=8)
+    uploader.upload("questions", ((str(q["Question_ID"]), q) for q in questions))
+"""
+
+import json
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from firebase_client.client import RETRY_STATUS
+
+
+def serialized_chunks(records, max_bytes):
+    """Yields (JSON object body as bytes, record count) of at most max_bytes each (bar single large records)."""
+    parts, size, count = [], 2, 0  # 2: the braces
+    for key, record in records:
+        part = (json.dumps(str(key), ensure_ascii=False) + ":"
+                + json.dumps(record, ensure_ascii=False, separators=(",", ":"))).encode("utf-8")
+        if parts and size + len(part) + 1 > max_bytes:
+            yield b"{" + b",".join(parts) + b"}", count
+            parts, size, count = [], 2, 0
+        parts.append(part)
+        size += len(part) + (1 if count else 0)  # the comma
+        count += 1
+    if parts:
+        yield b"{" + b",".join(parts) + b"}", count
+
+
+class ChunkUploader:
+    """Byte-sized, concurrent, self-throttling PATCH uploads (see the module docstring)."""
+
+    def __init__(self, client, max_bytes=4_000_000, workers=8, max_retries=8, backoff=0.5, max_backoff=30.0):
+        self.client = client
+        self.max_bytes = max_bytes
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limit = self.workers  # PATCHes allowed at once, between 1 and workers
+        self.delay = 0.0  # shared backoff every sender waits after throttling
+        self._active = 0
+        self._successes = 0  # in a row, since the last throttling
+        self._cond = threading.Condition()
+
+    # --- Adaptive limit ---
+    def _enter(self):
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+            return self.delay
+
+    def _leave(self, throttled, retry_after=0):
+        """throttled: True, False (success) or None (failed for good: only frees the slot)."""
+        with self._cond:
+            self._active -= 1
+            if throttled:
+                self._successes = 0
+                self.limit = max(1, self.limit // 2)
+                self.delay = min(self.max_backoff, max(self.backoff, self.delay * 2, retry_after))
+            elif throttled is False:
+                self._successes += 1
+                self.delay = self.delay / 2 if self.delay >= 0.05 else 0.0
+                if self._successes >= self.limit and self.limit < self.workers:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+    def _send(self, path, body):
+        """PATCHes one chunk, retrying throttled attempts; returns the number of retries."""
+        retries = 0
+        while True:
+            delay = self._enter()
+            throttled, retry_after = None, 0  # None: failed for good, neither success nor throttling
+            try:
+                if delay:
+                    time.sleep(random.uniform(delay / 2, delay))
+                self.client.request("PATCH", path, data=body)
+                throttled = False
+                return retries
+            except requests.exceptions.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status not in RETRY_STATUS or retries >= self.max_retries:
+                    raise
+                header = e.response.headers.get("Retry-After", "")
+                throttled, retry_after = True, int(header) if header.isdigit() else 0
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if retries >= self.max_retries:
+                    raise
+                throttled = True
+            finally:
+                self._leave(throttled, retry_after)
+            retries += 1
+
+    # --- Uploading ---
+    def upload(self, path, records):
+        """
+        PATCHes (key, record) pairs under path; records may be a generator (it is consumed
+        while earlier chunks upload). Returns {records, bytes, chunks, retries, seconds, mb_per_s};
+        raises requests.exceptions.RequestException when a chunk fails for good.
+        """
+        summary = {"records": 0, "bytes": 0, "chunks": 0, "retries": 0}
+        started = time.perf_counter()
+        pending = set()
+
+        def collect(done):
+            for future in done:
+                summary["retries"] += future.result()  # re-raises the chunk's error
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export-upload") as pool:
+            try:
+                for body, count in serialized_chunks(records, self.max_bytes):
+                    if len(pending) >= 2 * self.workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    pending.add(pool.submit(self._send, path, body))
+                    summary["records"] += count
+                    summary["bytes"] += len(body)
+                    summary["chunks"] += 1
+                done, pending = wait(pending)
+                collect(done)
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        summary["mb_per_s"] = round(summary["bytes"] / 1e6 / max(summary["seconds"], 1e-9), 2)
+        print(f"Pushed {summary['records']} records to /{path}: {summary['bytes'] / 1e6:.2f} MB in "
+              f"{summary['chunks']} chunk(s), {summary['seconds']:.2f} s, {summary['mb_per_s']:.2f} MB/s, "
+              f"{summary['retries']} throttled retries (now {self.limit} PATCHes at a time)")
+        return summary
@@ -0,0 +1,183 @@
+"""
+compact_answers.py
+Moves the answers ReceiveFireBaseDataApp.py has already stored in SQL Server out of
+/student_answers, so the hot path (incremental pulls, the answer stream, full mode and
+the RTDB footprint) only holds answers that are still on their way to SQL Server.
+An answer is compacted only when
+  - its key is in the answer ledger (answer_ledger.py), i.e. its SQL Server batch is committed
+    (with sharded workers, in the ledger of any shard: answer_ledger.shard-i-of-N.sqlite3), and
+  - it is older than --min-age-hours, far outside the daemon's overlap window.
+Archive targets (--archive):
+  firebase  moved under /student_answers_archive/<YYYY-MM-DD>/<key> (UTC submission day);
+            the copy and the delete are one multi-path PATCH, so each batch moves atomically
+  file      appended to <archive-dir>/student_answers-<YYYY-MM-DD>.jsonl.gz and fsynced,
+            then deleted with one multi-path PATCH of nulls per batch. If the job stops
+            between the two, the batch is archived again on the next run (restores keep
+            the last line per key).
+Run it next to the daemon (it reads the same ledger file), e.g. nightly:
+  python compact_answers.py --archive file --archive-dir D:/exam_archive
+  python compact_answers.py --archive firebase --dry-run
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+from dotenv import load_dotenv
+
+# The shared Firebase REST client lives in the firebase_client package at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from firebase_client import FirebaseClient, push_id_floor, push_id_time
+from answer_ledger import AnswerLedger
+from answer_shards import shard_paths
+
+load_dotenv()
+FIREBASE_URL = os.getenv("FIREBASE_URL")
+ANSWER_LEDGER_FILE = os.getenv("ANSWER_LEDGER_FILE",
+                               str(Path(__file__).resolve().parent / "answer_ledger.sqlite3"))  # same file as the daemon
+ANSWER_LEDGER_EXPECTED_KEYS = int(os.getenv("ANSWER_LEDGER_EXPECTED_KEYS", "2000000"))
+ANSWERS_PATH = "student_answers"
+ARCHIVE_PATH = os.getenv("ANSWER_ARCHIVE_PATH", "student_answers_archive")  # Firebase archive root (firebase mode)
+ARCHIVE_DIR = os.getenv("ANSWER_ARCHIVE_DIR", str(Path(__file__).resolve().parent / "answer_archive"))  # file mode
+COMPACT_MIN_AGE_HOURS = float(os.getenv("COMPACT_MIN_AGE_HOURS", "24"))  # never touch answers younger than this
+COMPACT_BATCH_SIZE = int(os.getenv("COMPACT_BATCH_SIZE", "500"))  # answers per multi-path PATCH
+
+
+def archive_day(key):
+    """UTC submission day of a push key, or "undated" for keys that are not push IDs."""
+    ms = push_id_time(key)
+    if ms is None:
+        return "undated"
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def old_answer_pages(client, end_key, page_size):
+    """Yields pages [(key, record), ...] of /student_answers up to end_key, in key order."""
+    start_key = None
+    while True:
+        params = {"orderBy": json.dumps("$key"), "endAt": json.dumps(end_key), "limitToFirst": page_size}
+        if start_key is not None:
+            params["startAt"] = json.dumps(start_key)
+        data = client.get(ANSWERS_PATH, params=params) or {}
+        if isinstance(data, list):  # keys that look like array indexes
+            data = {str(i): v for i, v in enumerate(data) if v is not None}
+        page = sorted((k, v) for k, v in data.items() if k != start_key)
+        if not page:
+            return
+        yield page
+        start_key = page[-1][0]  # startAt is inclusive; the repeated key is dropped above
+
+
+def archive_to_file(archive_dir, batch):
+    """Appends the batch to one gzip JSON Lines file per submission day; returns bytes written."""
+    by_day = {}
+    for key, record in batch:
+        by_day.setdefault(archive_day(key), []).append(json.dumps({"key": key, "record": record}))
+    os.makedirs(archive_dir, exist_ok=True)
+    written = 0
+    for day, lines in sorted(by_day.items()):
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+        path = os.path.join(archive_dir, f"{ANSWERS_PATH}-{day}.jsonl.gz")
+        with open(path, "ab") as f:  # every append is a new gzip member; gzip.open reads them all
+            f.write(gzip.compress(payload))
+            f.flush()
+            os.fsync(f.fileno())
+        written += len(payload)
+    return written
+
+
+def compaction_updates(batch, archive):
+    """Root multi-path PATCH for a batch: deletes, plus the archive copies in firebase mode."""
+    updates = {}
+    for key, record in batch:
+        if archive == "firebase":
+            updates[f"{ARCHIVE_PATH}/{archive_day(key)}/{key}"] = record
+        updates[f"{ANSWERS_PATH}/{key}"] = None
+    return updates
+
+
+def compact(client, ledgers, archive="file", archive_dir=ARCHIVE_DIR, min_age_hours=COMPACT_MIN_AGE_HOURS,
+            batch_size=COMPACT_BATCH_SIZE, dry_run=False):
+    """
+    Archives and deletes the answers older than min_age_hours that one of the ledgers confirms.
+    Returns a summary dict; raises requests.exceptions.RequestException on Firebase errors
+    (every batch before the failing one is already compacted).
+    """
+    cutoff_ms = int((time.time() - min_age_hours * 3600) * 1000)
+    end_key = push_id_floor(cutoff_ms)  # every push key created before the cutoff sorts below it
+    summary = {"scanned": 0, "compacted": 0, "kept_not_ingested": 0, "archived_bytes": 0, "days": set()}
+
+    def flush(batch):
+        if dry_run:
+            summary["compacted"] += len(batch)
+            return
+        if archive == "file":
+            summary["archived_bytes"] += archive_to_file(archive_dir, batch)
+        client.patch("", compaction_updates(batch, archive))
+        summary["compacted"] += len(batch)
+
+    batch = []
+    for page in old_answer_pages(client, end_key, batch_size):
+        for key, record in page:
+            summary["scanned"] += 1
+            if not any(key in ledger for ledger in ledgers):
+                summary["kept_not_ingested"] += 1  # still on its way to SQL Server (or invalid and not seen yet)
+                continue
+            batch.append((key, record))
+            summary["days"].add(archive_day(key))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+    if batch:
+        flush(batch)
+    summary["days"] = sorted(summary["days"])
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive and delete ingested answers from /student_answers")
+    parser.add_argument("--archive", choices=("file", "firebase"), default="file")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--min-age-hours", type=float, default=COMPACT_MIN_AGE_HOURS)
+    parser.add_argument("--batch-size", type=int, default=COMPACT_BATCH_SIZE)
+    parser.add_argument("--ledger", default=ANSWER_LEDGER_FILE,
+                        help="ledger file; its shard-i-of-N siblings are read too")
+    parser.add_argument("--dry-run", action="store_true", help="count what would be compacted, change nothing")
+    args = parser.parse_args()
+
+    if not FIREBASE_URL:
+        raise SystemExit("Set FIREBASE_URL in .env")
+    ledger_paths = shard_paths(args.ledger)
+    if not ledger_paths:
+        raise SystemExit(f"Answer ledger '{args.ledger}' not found; nothing is confirmed as ingested.")
+
+    ledgers = [AnswerLedger(path, expected_keys=ANSWER_LEDGER_EXPECTED_KEYS) for path in ledger_paths]
+    print(f"Answer ledgers: {sum(len(ledger) for ledger in ledgers)} answers confirmed in SQL Server "
+          f"({len(ledgers)} file{'s' if len(ledgers) > 1 else ''}).")
+    started = time.perf_counter()
+    try:
+        summary = compact(FirebaseClient(FIREBASE_URL), ledgers, archive=args.archive, archive_dir=args.archive_dir,
+                          min_age_hours=args.min_age_hours, batch_size=args.batch_size, dry_run=args.dry_run)
+    except requests.exceptions.RequestException as re:
+        raise SystemExit(f"Connection error to Firebase: {re} (batches before the error are compacted; run again)")
+    finally:
+        for ledger in ledgers:
+            ledger.close()
+
+    target = args.archive_dir if args.archive == "file" else f"/{ARCHIVE_PATH}"
+    print(f"{'Would compact' if args.dry_run else 'Compacted'} {summary['compacted']} of {summary['scanned']} "
+          f"answers older than {args.min_age_hours:g} h into {target} "
+          f"({', '.join(summary['days']) or 'no days'}); {summary['kept_not_ingested']} not yet in SQL Server kept "
+          f"in {time.perf_counter() - started:.1f} s.")
+    if summary["archived_bytes"]:
+        print(f"Archive files: {summary['archived_bytes'] / 1e6:.2f} MB of JSON appended.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+delta_export.py
+Delta mode of SendDatabaseDataApp.py (EXPORT_MODE=delta): instead of re-exporting every
+collection, only the rows inserted, updated or deleted since the last run are pushed,
+so the export can run every minute.
+  - SQL Server change tracking ("SQL Scripts/Change Tracking.sql") on Course, Student_Course,
+    Exam, Question_Bank, Question_Choice and Exam_Questions.
+  - A high-water mark per table in EXPORT_STATE_FILE (export_state.json): the change
+    tracking version the table was exported up to. Each run reads
+    CHANGE_TRACKING_CURRENT_VERSION() first, then CHANGETABLE(CHANGES <table>, <mark>)
+    joined to the table for the current rows, and saves the new marks only after
+    Firebase took every update. A change committed while the run reads is seen again
+    on the next run; the updates are idempotent, so that is harmless.
+  - Updates are one set of root multi-path PATCHes: "<collection>/<key>": row, or null
+    for a deleted row. exam_questions_grouped and choices_by_question are rebuilt for
+    the exams / questions that changed. Then meta/versions/<collection> is stamped for
+    the collections that changed, so the portals refresh only those.
+  - exam_bundles/<Exam_ID> (exam_bundles.py) is rebuilt for every exam whose row, question
+    list, questions or choices changed, and removed for exams with no questions left;
+    student_course_index/<Student_ID> (student_course_index.py) for every student whose
+    enrollments changed or who is enrolled in a course that changed.
+  - No state yet, or a mark older than the change tracking retention: a full export,
+    then the marks start from the version read before it.
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from exam_bundles import bundle_sql, group_bundles
+from student_course_index import index_entry, index_sql
+
+# table -> (collection, key columns, exported columns); the columns match the full export
+CHANGE_TABLES = {
+    "Course": ("courses", ["Course_ID"], ["Course_ID", "Course_Name"]),
+    "Student_Course": ("student_courses", ["Student_ID", "Course_ID"], ["Student_ID", "Course_ID"]),
+    "Exam": ("exams", ["Exam_ID"],
+             ["Exam_ID", "Course_ID", "Instructor_ID", "Exam_Duration_Minutes", "Exam_Type"]),
+    "Question_Bank": ("questions", ["Question_ID"],
+                      ["Question_ID", "Course_ID", "Question_Type", "Question_Description", "Question_Model_Answer"]),
+    "Question_Choice": ("choices", ["Question_Choice_ID"], ["Question_Choice_ID", "Question_ID", "Choice_Text"]),
+    "Exam_Questions": ("exam_questions", ["Exam_ID", "Question_ID"], ["Exam_ID", "Question_ID"]),
+}
+IDS_PER_QUERY = 500  # parameters per IN (...) list; SQL Server allows 2100 per statement
+
+
+# --- State file ---
+def load_state(path):
+    """{"versions": {table: version}, "exported_at": epoch seconds}, or an empty state."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"versions": {}}
+
+
+def save_state(path, versions):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".export-state-", dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"versions": versions, "exported_at": int(time.time())}, f, indent=2)
+    os.replace(tmp_path, path)  # a crash leaves the old marks, never a half-written file
+
+
+# --- Change tracking ---
+def current_version(cur):
+    cur.execute("SELECT CHANGE_TRACKING_CURRENT_VERSION()")
+    version = cur.fetchone()[0]
+    if version is None:
+        raise SystemExit("Change tracking is off; run 'SQL Scripts/Change Tracking.sql' first.")
+    return version
+
+
+def min_valid_versions(cur):
+    """{table: oldest version CHANGETABLE can still answer for}; raises if a table is not tracked."""
+    versions = {}
+    for table in CHANGE_TABLES:
+        cur.execute("SELECT CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID(?))", f"dbo.{table}")
+        versions[table] = cur.fetchone()[0]
+        if versions[table] is None:
+            raise SystemExit(f"Change tracking is not enabled on {table}; run 'SQL Scripts/Change Tracking.sql'.")
+    return versions
+
+
+def read_changes(cur, table, since, fetch_size=5000):
+    """
+    [(key tuple, current row dict or None when deleted, "I" / "U" / "D"), ...] of the rows
+    changed after `since` (one entry per row, however often it changed).
+    """
+    _, keys, columns = CHANGE_TABLES[table]
+    cur.execute(f"""
+        SELECT {', '.join(f'ct.{k}' for k in keys)}, ct.SYS_CHANGE_OPERATION, t.{keys[0]} AS Row_Exists,
+               {', '.join(f't.{c}' for c in columns)}
+        FROM CHANGETABLE(CHANGES {table}, ?) AS ct
+        LEFT JOIN {table} AS t ON {' AND '.join(f't.{k} = ct.{k}' for k in keys)}
+    """, since)
+    changes = []
+    while True:
+        rows = cur.fetchmany(fetch_size)
+        if not rows:
+            return changes
+        for row in rows:
+            key, operation, exists = tuple(row[:len(keys)]), row[len(keys)], row[len(keys) + 1] is not None
+            changes.append((key, dict(zip(columns, row[len(keys) + 2:])) if exists else None, operation))
+
+
+def _regroup(cur, sql, group_ids, group_column, value):
+    """{group id: [value(row), ...] or None when the group is now empty} for group_ids."""
+    groups = {str(gid): [] for gid in group_ids}
+    ids = sorted(group_ids)
+    for start in range(0, len(ids), IDS_PER_QUERY):
+        chunk = ids[start:start + IDS_PER_QUERY]
+        cur.execute(sql.format(params=", ".join("?" * len(chunk))), *chunk)
+        cols = [c[0] for c in cur.description]
+        for row in cur.fetchall():
+            row = dict(zip(cols, row))
+            groups[str(row[group_column])].append(value(row))
+    return {gid: values or None for gid, values in groups.items()}
+
+
+def _distinct_ids(cur, sql, ids):
+    """Distinct first-column values of sql ("... IN ({params})") for ids, queried in chunks."""
+    found, ids = set(), sorted(ids)
+    for start in range(0, len(ids), IDS_PER_QUERY):
+        chunk = ids[start:start + IDS_PER_QUERY]
+        cur.execute(sql.format(params=", ".join("?" * len(chunk))), *chunk)
+        found.update(row[0] for row in cur.fetchall())
+    return found
+
+
+def _rebuild_bundles(cur, exam_ids):
+    """{Exam_ID as str: bundle, or None when the exam is gone or has no questions}."""
+    bundles, ids = {str(eid): None for eid in exam_ids}, sorted(exam_ids)
+    for start in range(0, len(ids), IDS_PER_QUERY):
+        chunk = ids[start:start + IDS_PER_QUERY]
+        cur.execute(bundle_sql(f"WHERE e.Exam_ID IN ({', '.join('?' * len(chunk))})"), *chunk)
+        cols = [c[0] for c in cur.description]
+        bundles.update(group_bundles(dict(zip(cols, row)) for row in cur.fetchall()))
+    return bundles
+
+
+def delta_updates(cur, client, marks):
+    """
+    (root multi-path updates, collections changed, {table: rows changed}) since the marks.
+    client is only used to read the exported copy of updated and deleted choices, for the
+    question they belonged to before the change (a deleted row is gone from SQL Server).
+    """
+    updates, collections, counts = {}, set(), {}
+    exam_ids, question_ids = set(), set()
+    bundle_exam_ids, bundle_question_ids = set(), set()  # whose exam_bundles need rebuilding
+    student_ids, course_ids = set(), set()  # whose student_course_index needs rebuilding
+    for table, (collection, _, _) in CHANGE_TABLES.items():
+        changes = read_changes(cur, table, marks[table])
+        counts[table] = len(changes)
+        for key, row, operation in changes:
+            updates[f"{collection}/{'_'.join(str(k) for k in key)}"] = row
+            if table == "Course":
+                course_ids.add(key[0])
+            elif table == "Student_Course":
+                student_ids.add(key[0])
+            elif table == "Exam":
+                bundle_exam_ids.add(key[0])
+            elif table == "Question_Bank":
+                bundle_question_ids.add(key[0])
+            elif table == "Exam_Questions":
+                exam_ids.add(key[0])
+            elif table == "Question_Choice":
+                if row is not None:
+                    question_ids.add(row["Question_ID"])
+                if operation != "I":  # updated or deleted: the exported copy has its question before the change
+                    old = client.get(f"choices/{key[0]}")
+                    if isinstance(old, dict) and old.get("Question_ID") is not None:
+                        question_ids.add(int(old["Question_ID"]))
+        if changes:
+            collections.add(collection)
+
+    if exam_ids:
+        groups = _regroup(cur, "SELECT Exam_ID, Question_ID FROM Exam_Questions WHERE Exam_ID IN ({params}) "
+                               "ORDER BY Exam_ID, Question_ID", exam_ids, "Exam_ID", lambda r: r["Question_ID"])
+        updates.update({f"exam_questions_grouped/{eid}": qids for eid, qids in groups.items()})
+        collections.add("exam_questions_grouped")
+    if question_ids:
+        groups = _regroup(cur, "SELECT Question_Choice_ID, Question_ID, Choice_Text FROM Question_Choice "
+                               "WHERE Question_ID IN ({params}) ORDER BY Question_ID, Question_Choice_ID",
+                          question_ids, "Question_ID", lambda r: r)
+        updates.update({f"choices_by_question/{qid}": choices for qid, choices in groups.items()})
+        collections.add("choices_by_question")
+
+    bundle_exam_ids |= exam_ids
+    if bundle_question_ids | question_ids:
+        bundle_exam_ids |= _distinct_ids(cur, "SELECT DISTINCT Exam_ID FROM Exam_Questions WHERE Question_ID IN ({params})",
+                                         bundle_question_ids | question_ids)
+    if bundle_exam_ids:
+        updates.update({f"exam_bundles/{eid}": bundle for eid, bundle in _rebuild_bundles(cur, bundle_exam_ids).items()})
+        collections.add("exam_bundles")
+
+    if course_ids:
+        student_ids |= _distinct_ids(cur, "SELECT DISTINCT Student_ID FROM Student_Course WHERE Course_ID IN ({params})",
+                                     course_ids)
+    if student_ids:
+        groups = _regroup(cur, index_sql("WHERE sc.Student_ID IN ({params})"), student_ids, "Student_ID", index_entry)
+        updates.update({f"student_course_index/{sid}": entries for sid, entries in groups.items()})
+        collections.add("student_course_index")
+    return updates, collections, counts
+
+
+# --- Run ---
+def run_delta(cur, client, uploader, state_path, full_export):
+    """
+    One delta export; full_export(cur) is called instead when there are no usable marks.
+    Returns {"mode": "full" | "delta", "updates": n, "collections": [...], "counts": {...}}.
+    """
+    version = current_version(cur)
+    min_valid = min_valid_versions(cur)
+    marks = load_state(state_path).get("versions", {})
+    stale = [t for t in CHANGE_TABLES if t not in marks or marks[t] < min_valid[t]]
+    if stale:
+        print(f"No usable export marks for {', '.join(stale)}: running a full export "
+              f"(change tracking version {version}).")
+        full_export(cur)
+        save_state(state_path, {table: version for table in CHANGE_TABLES})
+        return {"mode": "full", "updates": 0, "collections": [], "counts": {}}
+
+    updates, collections, counts = delta_updates(cur, client, marks)
+    if updates:
+        uploader.upload("", updates.items())
+        client.patch("", {f"meta/versions/{c}": {".sv": "timestamp"} for c in sorted(collections)})
+    save_state(state_path, {table: version for table in CHANGE_TABLES})
+    changed = ", ".join(f"{table} {n}" for table, n in counts.items() if n) or "nothing"
+    print(f"Delta export up to change tracking version {version}: {changed}; "
+          f"{len(updates)} paths updated in {', '.join(sorted(collections)) or 'no collections'}.")
+    return {"mode": "delta", "updates": len(updates), "collections": sorted(collections), "counts": counts}
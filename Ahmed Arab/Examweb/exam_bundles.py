@@ -0,0 +1,72 @@
+"""
+exam_bundles.py
+Read-optimized exam_bundles/<Exam_ID> nodes published by SendDatabaseDataApp.py, so a
+portal starts an exam with one small GET instead of reading exams,
+exam_questions_grouped, questions and choices_by_question and joining them:
+  {"Exam_ID": 7, "Course_ID": 3, "Exam_Duration_Minutes": 30, "Exam_Type": "Exam",
+   "Questions": [{"Question_ID": 12, "Course_ID": 3, "Question_Type": "MCQ",
+                  "Question_Description": "...", "Choices": ["...", ...]}, ...]}
+Questions are in exam order (the order of exam_questions_grouped) and choices in
+Question_Choice_ID order. Model answers are left out: the bundle is what the student sees.
+Exams without questions get no bundle.
+"""
+
+# Every exam's questions and choices, one row per choice (questions without choices
+# keep one row with a NULL choice). {where} narrows it to some exams (delta export).
+BUNDLE_SQL = """
+    SELECT e.Exam_ID, e.Course_ID, e.Exam_Duration_Minutes, e.Exam_Type,
+           q.Question_ID, q.Course_ID AS Question_Course_ID, q.Question_Type, q.Question_Description,
+           qc.Choice_Text
+    FROM Exam AS e
+    JOIN Exam_Questions AS eq ON eq.Exam_ID = e.Exam_ID
+    JOIN Question_Bank AS q ON q.Question_ID = eq.Question_ID
+    LEFT JOIN Question_Choice AS qc ON qc.Question_ID = q.Question_ID
+    {where}
+    ORDER BY e.Exam_ID, eq.Question_ID, qc.Question_Choice_ID
+"""
+
+
+def bundle_sql(where=""):
+    return BUNDLE_SQL.format(where=where)
+
+
+def group_bundles(rows):
+    """Yields (Exam_ID as str, bundle) from BUNDLE_SQL rows (dicts); one bundle is held at a time."""
+    bundle = None
+    for row in rows:
+        if bundle is None or bundle["Exam_ID"] != row["Exam_ID"]:
+            if bundle is not None:
+                yield str(bundle["Exam_ID"]), bundle
+            bundle = {"Exam_ID": row["Exam_ID"], "Course_ID": row["Course_ID"],
+                      "Exam_Duration_Minutes": row["Exam_Duration_Minutes"], "Exam_Type": row["Exam_Type"],
+                      "Questions": []}
+        questions = bundle["Questions"]
+        if not questions or questions[-1]["Question_ID"] != row["Question_ID"]:
+            questions.append({"Question_ID": row["Question_ID"], "Course_ID": row["Question_Course_ID"],
+                              "Question_Type": row["Question_Type"],
+                              "Question_Description": row["Question_Description"], "Choices": []})
+        if row["Choice_Text"] is not None:
+            questions[-1]["Choices"].append(row["Choice_Text"])
+    if bundle is not None:
+        yield str(bundle["Exam_ID"]), bundle
+
+
+def bundles_from_tables(exams, question_ids_by_exam, questions, choices_by_question):
+    """
+    The same bundles from tables already in memory (EXPORT_MODE=memory):
+    exams {Exam_ID: row}, question_ids_by_exam {"Exam_ID": [Question_ID, ...]},
+    questions {Question_ID: row}, choices_by_question {"Question_ID": [choice row, ...]}.
+    """
+    for eid, qids in question_ids_by_exam.items():
+        exam = exams.get(int(eid))
+        entries = [questions[qid] for qid in qids if qid in questions]
+        if exam is None or not entries:
+            continue
+        yield str(eid), {
+            "Exam_ID": exam["Exam_ID"], "Course_ID": exam["Course_ID"],
+            "Exam_Duration_Minutes": exam["Exam_Duration_Minutes"], "Exam_Type": exam["Exam_Type"],
+            "Questions": [{"Question_ID": q["Question_ID"], "Course_ID": q["Course_ID"],
+                           "Question_Type": q["Question_Type"], "Question_Description": q["Question_Description"],
+                           "Choices": [ch["Choice_Text"] for ch in choices_by_question.get(str(q["Question_ID"]), [])]}
+                          for q in entries],
+        }
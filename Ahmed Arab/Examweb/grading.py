@@ -0,0 +1,156 @@
+"""
+grading.py
+Vectorized grading for ReceiveFireBaseDataApp.py. A batch of answers arrives as a
+DataFrame (Question_ID, Student_Answer, ...) and is graded against the model answer
+table in one hash join instead of one dictionary lookup and string comparison per row.
+Answers and model answers go through the same normalization before comparing, so
+"  true ", "True" and "T" all match a True/False model answer of "True":
+  trim       strip leading/trailing whitespace
+  spaces     collapse inner runs of whitespace to one space
+  casefold   case-insensitive comparison
+  synonyms   T/F, Yes/No, 1/0 ... for True/False questions (TRUE_FALSE_SYNONYMS)
+A correct answer scores the question's weight (1 unless a weights file says otherwise).
+"""
+
+import numpy as np
+import pandas as pd
+
+NORMALIZATIONS = ("trim", "spaces", "casefold", "synonyms")
+
+TRUE_FALSE_SYNONYMS = {
+    "true": "true", "t": "true", "yes": "true", "y": "true", "1": "true", "correct": "true",
+    "false": "false", "f": "false", "no": "false", "n": "false", "0": "false", "incorrect": "false",
+}
+
+
+def parse_normalizations(value):
+    """GRADING_NORMALIZE value ("trim,casefold", "all", "none") -> set of normalization names."""
+    value = (value or "").strip().lower()
+    if value == "all":
+        return set(NORMALIZATIONS)
+    names = {name.strip() for name in value.split(",") if name.strip() and name.strip() != "none"}
+    unknown = names - set(NORMALIZATIONS)
+    if unknown:
+        raise ValueError(f"Unknown grading normalization(s) {sorted(unknown)}; use {', '.join(NORMALIZATIONS)}")
+    return names
+
+
+def normalize_answers(values, normalizations):
+    """
+    Factorizes and normalizes a Series of answers: returns (codes, uniques) where
+    uniques holds each distinct normalized answer and codes maps every row to it
+    (-1 for a missing answer). Exam answers repeat heavily (MCQ choices, True/False),
+    so the string work is done on a few thousand values, not on every row.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    uniques = pd.Series(uniques, dtype=object).astype(str)
+    if "trim" in normalizations:
+        uniques = uniques.str.strip()
+    if "spaces" in normalizations:
+        uniques = uniques.str.replace(r"\s+", " ", regex=True)
+    if "casefold" in normalizations:
+        uniques = uniques.str.casefold()
+    return codes, uniques
+
+
+def apply_synonyms(uniques):
+    """Maps True/False synonyms to "true"/"false" (whatever the casefold setting); other values are kept."""
+    return uniques.str.casefold().map(TRUE_FALSE_SYNONYMS).fillna(uniques)
+
+
+def load_weights(path):
+    """Per-question weights from a CSV file with Question_ID,Weight columns."""
+    weights = pd.read_csv(path, usecols=["Question_ID", "Weight"])
+    return weights.drop_duplicates("Question_ID", keep="last").set_index("Question_ID")["Weight"].astype(float)
+
+
+class ModelAnswerTable:
+    """
+    Model answers indexed by Question_ID, normalized once when the table is built.
+    Every distinct normalized model answer gets an integer code, so grading a batch is
+    a hash join on Question_ID plus an integer comparison per row.
+    Usage:
+        table = load_model_answer_table(cursor)
+        batch["Student_Grade"] = table.grade(batch)
+    """
+
+    def __init__(self, model_answers, weights=None, normalizations=NORMALIZATIONS):
+        """
+        model_answers: DataFrame with Question_ID, Question_Model_Answer and Question_Type columns.
+        weights: optional Series of weights indexed by Question_ID (missing questions weigh 1).
+        """
+        self.normalizations = set(normalizations)
+        model_answers = model_answers.drop_duplicates("Question_ID", keep="last")
+        model_answers = model_answers[model_answers["Question_Model_Answer"].notna()]
+        question_ids = model_answers["Question_ID"].astype("int64").to_numpy()
+        true_false = model_answers["Question_Type"].eq("True/False").to_numpy()
+
+        codes, uniques = normalize_answers(model_answers["Question_Model_Answer"], self.normalizations)
+        keys = uniques.to_numpy(dtype=object)[codes]
+        if "synonyms" in self.normalizations:
+            keys[true_false] = apply_synonyms(pd.Series(keys[true_false], dtype=object)).to_numpy(dtype=object)
+        key_codes, vocabulary = pd.factorize(pd.Series(keys, dtype=object))
+        self.vocabulary = pd.Index(vocabulary)
+
+        weight = np.ones(len(question_ids))
+        if weights is not None:
+            weight = pd.Series(weights, dtype=float).reindex(question_ids).fillna(1.0).to_numpy()
+
+        self.table = pd.DataFrame({"Model_Key": keys, "Key_Code": key_codes, "True_False": true_false,
+                                   "Weight": weight}, index=pd.Index(question_ids, name="Question_ID"))
+
+    @classmethod
+    def from_mapping(cls, model_answers_map, question_types=None, weights=None, normalizations=NORMALIZATIONS):
+        """Builds the table from a {"Question_ID": "Model_Answer"} map (ModelAnswerCache in row mode)."""
+        question_types = question_types or {}
+        frame = pd.DataFrame({
+            "Question_ID": [int(qid) for qid in model_answers_map],
+            "Question_Model_Answer": list(model_answers_map.values()),
+            "Question_Type": [question_types.get(qid) for qid in model_answers_map],
+        })
+        return cls(frame, weights=weights, normalizations=normalizations)
+
+    def __len__(self):
+        return len(self.table)
+
+    def missing_questions(self, question_ids):
+        """Question IDs of the batch with no model answer (they are graded 0)."""
+        question_ids = pd.unique(pd.Series(question_ids).astype("int64"))
+        return sorted(int(qid) for qid in question_ids[self.table.index.get_indexer(question_ids) < 0])
+
+    def grade(self, answers):
+        """
+        Grades a DataFrame with Question_ID and Student_Answer columns.
+        Returns a float Series aligned with answers.index: the question's weight for a
+        correct answer, 0 for a wrong one and for questions without a model answer.
+        """
+        # Join on Question_ID; position -1 (no model answer) picks the trailing sentinel
+        position = self.table.index.get_indexer(answers["Question_ID"].astype("int64").to_numpy())
+        model_code = np.append(self.table["Key_Code"].to_numpy(), -3)[position]
+        weight = np.append(self.table["Weight"].to_numpy(), 0.0)[position]
+        true_false = np.append(self.table["True_False"].to_numpy(dtype=bool), False)[position]
+
+        # Code of each distinct answer in the model answer vocabulary (-1: matches no model answer),
+        # position -1 (missing answer) picks the trailing sentinel
+        codes, uniques = normalize_answers(answers["Student_Answer"], self.normalizations)
+        answer_code = np.append(self.vocabulary.get_indexer(uniques), -2)[codes]
+        if "synonyms" in self.normalizations and true_false.any():
+            synonym_code = np.append(self.vocabulary.get_indexer(apply_synonyms(uniques)), -2)[codes]
+            answer_code = np.where(true_false, synonym_code, answer_code)
+
+        return pd.Series(np.where(answer_code == model_code, weight, 0.0), index=answers.index,
+                         name="Student_Grade")
+
+
+def load_model_answer_table(cursor, weights_file=None, normalizations=NORMALIZATIONS):
+    """Loads Question_Bank model answers (and optional weights) into a ModelAnswerTable."""
+    print("Loading model answers from Question_Bank...")
+    cursor.execute("SELECT Question_ID, Question_Model_Answer, Question_Type FROM Question_Bank")
+    frame = pd.DataFrame.from_records([tuple(row) for row in cursor.fetchall()],
+                                      columns=["Question_ID", "Question_Model_Answer", "Question_Type"])
+    weights = load_weights(weights_file) if weights_file else None
+    table = ModelAnswerTable(frame, weights=weights, normalizations=normalizations)
+    print(f"Loaded {len(table)} model answers"
+          f"{f', weights from {weights_file}' if weights_file else ''}"
+          f" (normalization: {', '.join(sorted(table.normalizations)) or 'none'}).")
+    return table
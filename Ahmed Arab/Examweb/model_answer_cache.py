@@ -0,0 +1,239 @@
+"""
+model_answer_cache.py
+Model answers of ReceiveFireBaseDataApp.py, kept current while the daemon runs, so
+a question added or a model answer corrected mid-exam is graded right without a restart.
+  - Change detection is one cheap aggregate: Question_Bank split into buckets of
+    Question_ID ranges with COUNT_BIG(*) and CHECKSUM_AGG(BINARY_CHECKSUM(...)) per
+    bucket (BINARY_CHECKSUM is case-sensitive, so case-only corrections are seen too).
+  - Only the buckets whose count or checksum moved are read again, and compared row
+    by row with the cache to find the questions that changed. A weights file
+    (GRADING_WEIGHTS_FILE) is reloaded when its modification time changes.
+  - The new grading table is swapped in, then the stored answers of the changed
+    questions are re-graded in bulk (answer_writer.regrade_answers): after every batch
+    graded with the old table is written, and only where the stored answer is still
+    the graded one. A sharded worker (ANSWER_SHARD) re-grades only its own shard's
+    rows, the same crc32 partition it ingests, so N workers never re-grade a row twice.
+Usage:
+    cache = ModelAnswerCache(connect, mode="bulk")
+    cache.load(cursor)
+    cache.start(30)                 # refresh thread with its own connection
+    with cache.use() as model_answers:
+        process_answers(cn, cur, items, model_answers)
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from answer_shards import shard_of
+from answer_writer import grade_answers, regrade_answers
+from grading import NORMALIZATIONS, ModelAnswerTable, load_weights
+
+MODEL_COLUMNS = ["Question_ID", "Question_Model_Answer", "Question_Type"]
+REGRADE_QUESTIONS_PER_QUERY = 50  # Question_IDs per SELECT of stored answers
+REGRADE_BATCH_SIZE = 5000  # answers per staging load + UPDATE
+
+
+class ModelAnswerCache:
+    """Model answers for one grading mode ("bulk": ModelAnswerTable, "row": exact-match map)."""
+
+    def __init__(self, connect, mode="bulk", normalizations=NORMALIZATIONS, weights_file=None,
+                 bucket_size=1000, table="Student_Exam_Answer", shard=None, shard_key="Exam_ID"):
+        self.connect = connect  # () -> new pyodbc connection, used by the refresh thread
+        self.mode = mode
+        self.normalizations = set(normalizations) if mode == "bulk" else set()  # row mode grades exact matches
+        self.weights_file = weights_file if mode == "bulk" else None  # row mode grades 1 or 0
+        self.bucket_size = int(bucket_size)
+        self.table = table
+        self.shard = shard  # (i, N): only re-grade the rows of this worker's shard, or None for all
+        self.shard_key = shard_key  # "Exam_ID" or "Student_ID", as in answer_shards.py
+        self.rows = {}  # Question_ID -> (model answer, question type)
+        self.weights = None
+        self._weights_mtime = None
+        self._checksums = {}  # bucket -> (row count, checksum)
+        self._current = None  # ModelAnswerTable (bulk) or {"Question_ID": "Model_Answer"} (row)
+        self._grader = None  # ModelAnswerTable used to re-grade stored answers
+        self.generation = 0
+        self._in_flight = {}  # generation -> batches graded with it and not written yet
+        self._cond = threading.Condition()
+        self._pending = set()  # Question_IDs whose stored answers still need re-grading
+        self._thread = None
+
+    # --- Loading ---
+    def _checksum_query(self):
+        size = self.bucket_size  # an int, inlined so SELECT and GROUP BY use the same expression
+        return f"""
+            SELECT Question_ID / {size} AS Bucket, COUNT_BIG(*) AS Row_Count,
+                   CHECKSUM_AGG(BINARY_CHECKSUM(Question_ID, Question_Model_Answer, Question_Type)) AS Bucket_Checksum
+            FROM Question_Bank
+            GROUP BY Question_ID / {size}
+        """
+
+    def _read_checksums(self, cursor):
+        cursor.execute(self._checksum_query())
+        return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    def _read_rows(self, cursor, buckets=None):
+        """{Question_ID: (answer, type)} of the whole table, or of the given buckets."""
+        sql = "SELECT Question_ID, Question_Model_Answer, Question_Type FROM Question_Bank"
+        if buckets is None:
+            cursor.execute(sql)
+            return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        rows = {}
+        for bucket in sorted(buckets):
+            cursor.execute(sql + " WHERE Question_ID >= ? AND Question_ID < ?",
+                           bucket * self.bucket_size, (bucket + 1) * self.bucket_size)
+            rows.update({row[0]: (row[1], row[2]) for row in cursor.fetchall()})
+        return rows
+
+    def _read_weights(self):
+        if not self.weights_file:
+            return None, None
+        return load_weights(self.weights_file), os.path.getmtime(self.weights_file)
+
+    def _build(self):
+        frame = pd.DataFrame([(qid, answer, qtype) for qid, (answer, qtype) in self.rows.items()],
+                             columns=MODEL_COLUMNS)
+        grader = ModelAnswerTable(frame, weights=self.weights, normalizations=self.normalizations)
+        current = grader if self.mode == "bulk" else {str(qid): answer for qid, (answer, _) in self.rows.items()}
+        with self._cond:
+            self._grader, self._current = grader, current
+            self.generation += 1
+
+    def load(self, cursor):
+        """Full load at startup."""
+        print("Loading model answers from Question_Bank...")
+        self._checksums = self._read_checksums(cursor)
+        self.rows = self._read_rows(cursor)
+        self.weights, self._weights_mtime = self._read_weights()
+        self._build()
+        print(f"Loaded {len(self.rows)} model answers"
+              f"{f', weights from {self.weights_file}' if self.weights_file else ''}"
+              f" (normalization: {', '.join(sorted(self.normalizations)) or 'none, exact match'}).")
+
+    # --- Grading batches ---
+    def acquire(self):
+        """(model answers, generation) for one batch; release(generation) once it is written."""
+        with self._cond:
+            self._in_flight[self.generation] = self._in_flight.get(self.generation, 0) + 1
+            return self._current, self.generation
+
+    def release(self, generation):
+        with self._cond:
+            self._in_flight[generation] -= 1
+            if not self._in_flight[generation]:
+                del self._in_flight[generation]
+            self._cond.notify_all()
+
+    @contextmanager
+    def use(self):
+        """Model answers for a batch graded and written inside the with block."""
+        current, generation = self.acquire()
+        try:
+            yield current
+        finally:
+            self.release(generation)
+
+    # --- Refreshing ---
+    def refresh(self, cursor):
+        """Reloads what changed; returns the Question_IDs added or changed (empty when nothing did)."""
+        checksums = self._read_checksums(cursor)
+        buckets = {b for b in set(checksums) | set(self._checksums) if checksums.get(b) != self._checksums.get(b)}
+        changed = set()
+        if buckets:
+            fresh = self._read_rows(cursor, buckets)
+            old = {qid: row for qid, row in self.rows.items() if qid // self.bucket_size in buckets}
+            changed = {qid for qid, row in fresh.items() if old.get(qid) != row}
+            removed = set(old) - set(fresh)
+            rows = dict(self.rows)
+            for qid in removed:
+                del rows[qid]
+            rows.update(fresh)
+            self.rows = rows
+            if removed:
+                print(f"Model answers: {len(removed)} question(s) removed from Question_Bank.")
+        self._checksums = checksums
+
+        if self.weights_file:
+            mtime = os.path.getmtime(self.weights_file)
+            if mtime != self._weights_mtime:
+                weights, self._weights_mtime = self._read_weights()
+                old = self.weights if self.weights is not None else pd.Series(dtype=float)
+                changed |= {int(qid) for qid in set(old.index) | set(weights.index)
+                            if int(qid) in self.rows and old.get(qid, 1.0) != weights.get(qid, 1.0)}
+                self.weights = weights
+
+        if changed or buckets:
+            self._build()
+        return changed
+
+    def _wait_for_older_batches(self, generation):
+        with self._cond:
+            while any(gen < generation for gen in self._in_flight):
+                self._cond.wait(1)
+
+    def regrade(self, cn, cur, question_ids):
+        """Re-grades the stored answers of question_ids with the current model answers."""
+        with self._cond:
+            grader, generation = self._grader, self.generation
+        self._wait_for_older_batches(generation)
+        question_ids = sorted(question_ids)
+        graded_rows = changed = 0
+        for start in range(0, len(question_ids), REGRADE_QUESTIONS_PER_QUERY):
+            chunk = question_ids[start:start + REGRADE_QUESTIONS_PER_QUERY]
+            cur.execute(f"SELECT Exam_ID, Question_ID, Student_ID, Student_Answer FROM {self.table} "
+                        f"WHERE Student_Answer IS NOT NULL AND Question_ID IN ({', '.join('?' * len(chunk))})",
+                        *chunk)
+            rows = [tuple(row) for row in cur.fetchall()]
+            if self.shard:
+                rows = self._own_rows(rows)
+            for offset in range(0, len(rows), REGRADE_BATCH_SIZE):
+                batch = grade_answers(rows[offset:offset + REGRADE_BATCH_SIZE], grader)
+                changed += regrade_answers(cn, cur, batch, table=self.table)
+                graded_rows += len(batch)
+        return graded_rows, changed
+
+    def _own_rows(self, rows):
+        """The (Exam_ID, Question_ID, Student_ID, Student_Answer) rows of this worker's shard."""
+        index, count = self.shard
+        column = 0 if self.shard_key == "Exam_ID" else 2
+        return [row for row in rows if shard_of({self.shard_key: row[column]}, self.shard_key, count) == index]
+
+    def _refresh_once(self, cn, cur):
+        changed = self.refresh(cur)
+        if changed:
+            print(f"Model answers: {len(changed)} question(s) added or changed: {sorted(changed)[:20]}"
+                  f"{' ...' if len(changed) > 20 else ''}")
+        self._pending |= changed
+        if self._pending:
+            started = time.perf_counter()
+            graded_rows, regraded = self.regrade(cn, cur, self._pending)
+            print(f"Re-graded {graded_rows} stored answers of {len(self._pending)} question(s): "
+                  f"{regraded} grade(s) changed in {time.perf_counter() - started:.1f} s.")
+            self._pending = set()
+
+    def start(self, interval_seconds=30):
+        """Refreshes every interval_seconds on a background thread with its own connection."""
+        def loop():
+            cn = None
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    if cn is None:
+                        cn = self.connect()
+                    self._refresh_once(cn, cn.cursor())
+                except Exception as e:  # pyodbc.Error, a bad weights file...: keep the cache, try again
+                    print(f"Model answer refresh failed: {e}")
+                    try:
+                        if cn is not None:
+                            cn.rollback()
+                            cn.close()
+                    except Exception:
+                        pass
+                    cn = None
+
+        self._thread = threading.Thread(target=loop, name="model-answer-refresh", daemon=True)
+        self._thread.start()
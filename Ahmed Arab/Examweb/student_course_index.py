@@ -0,0 +1,41 @@
+"""
+student_course_index.py
+student_course_index/<Student_ID> nodes published by SendDatabaseDataApp.py, so a portal
+reads one student's courses with one keyed GET. Without them it queries student_courses
+(keyed "<Student_ID>_<Course_ID>") with orderBy/equalTo and then GETs every course:
+  [{"Course_ID": 3, "Course_Name": "Databases"}, ...]     in Course_ID order
+A list rather than {Course_ID: name}, because Firebase turns objects with small numeric
+keys into arrays. Students without courses get no node.
+"""
+
+# Every enrollment with its course name, grouped by student. {where} narrows it to some
+# students (delta export).
+INDEX_SQL = """
+    SELECT sc.Student_ID, c.Course_ID, c.Course_Name
+    FROM Student_Course AS sc
+    JOIN Course AS c ON c.Course_ID = sc.Course_ID
+    {where}
+    ORDER BY sc.Student_ID, c.Course_ID
+"""
+
+
+def index_sql(where=""):
+    return INDEX_SQL.format(where=where)
+
+
+def index_entry(row):
+    return {"Course_ID": row["Course_ID"], "Course_Name": row["Course_Name"]}
+
+
+def index_from_tables(courses, student_courses):
+    """
+    The same nodes from tables already in memory (EXPORT_MODE=memory):
+    courses [Course row, ...], student_courses [Student_Course row, ...].
+    """
+    names = {c["Course_ID"]: c["Course_Name"] for c in courses}
+    index = {}
+    for sc in student_courses:
+        if sc["Course_ID"] in names:
+            index.setdefault(str(sc["Student_ID"]), []).append(sc["Course_ID"])
+    return {sid: [{"Course_ID": cid, "Course_Name": names[cid]} for cid in sorted(cids)]
+            for sid, cids in index.items()}
@@ -0,0 +1,269 @@
+"""
+sync_metrics.py
+Metrics of ReceiveFireBaseDataApp.py, to see how far SQL Server lags behind the
+portals during an exam:
+  GET http://<METRICS_HOST>:<METRICS_PORT>/metrics        Prometheus text format
+  GET http://<METRICS_HOST>:<METRICS_PORT>/metrics.json   the same values as JSON
+With METRICS_SNAPSHOT_FILE set, the JSON snapshot is also rewritten every
+METRICS_SNAPSHOT_SECONDS (for hosts without a Prometheus server).
+Series (all prefixed answer_sync_):
+  oldest_unprocessed_age_seconds   now - Submitted_At of the oldest answer read from Firebase
+                                   and not committed to SQL Server yet (0 when caught up)
+  in_flight_answers                answers read and not committed yet
+  answers_total{stage}             fetch, grade, write, skip (invalid records)
+  batches_total{stage}             fetch, grade, write
+  errors_total{stage,kind}         kind: firebase, database, other
+  batch_size                       histogram: answers per SQL write
+  sql_write_seconds                histogram: one SQL write (MERGE batch, or row upsert + commit)
+  grade_seconds                    histogram: grading one batch
+  commit_lag_seconds               histogram: Submitted_At -> SQL Server commit, per answer
+  queued_batches{stage}            pipeline mode: batches waiting in front of each stage
+The JSON snapshot also has answers/second per stage since that consumer's previous
+snapshot: the snapshot file and /metrics.json keep separate windows, and scrapers can
+ask for their own with /metrics.json?consumer=<name> (the MAX_RATE_CONSUMERS most
+recently seen names are kept; a name dropped from them starts a new window).
+"""
+
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+PREFIX = "answer_sync"
+STAGES = ("fetch", "grade", "write", "skip")
+BATCH_STAGES = ("fetch", "grade", "write")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BATCH_SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+LAG_BUCKETS = (1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+MAX_RATE_CONSUMERS = 16  # rate windows kept, least recently used dropped first
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)  # per bucket, not cumulative; made cumulative on export
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value, n=1):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += n
+        self.count += n
+        self.sum += value * n
+
+    def cumulative(self):
+        total, result = 0, []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def snapshot(self):
+        return {"count": self.count, "sum": round(self.sum, 6),
+                "buckets": {str(bound): count for bound, count in self.cumulative()}}
+
+
+def submitted_at_seconds(record):
+    """Submitted_At of an answer record in epoch seconds (portals write seconds), or None."""
+    value = record.get("Submitted_At") if isinstance(record, dict) else None
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        return None
+    return value / 1000 if value > 1e11 else value  # server-value timestamps are in ms
+
+
+class SyncMetrics:
+    """Thread-safe counters, gauges and histograms of the sync daemon."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.answers = Counter()
+        self.batches = Counter()
+        self.errors = Counter()  # (stage, kind) -> count
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.sql_write_seconds = Histogram(LATENCY_BUCKETS)
+        self.grade_seconds = Histogram(LATENCY_BUCKETS)
+        self.commit_lag_seconds = Histogram(LAG_BUCKETS)
+        self._in_flight = {}  # key -> Submitted_At (seconds) or None
+        self._last_rates = OrderedDict()  # consumer -> (time, answers) of its previous snapshot, LRU order
+        self.pipeline = None  # answer_pipeline.StagePipeline in pipeline mode
+
+    # --- Recording ---
+    def fetched(self, items):
+        """A batch [(key, record), ...] was read from Firebase."""
+        with self._lock:
+            for key, record in items:
+                self._in_flight.setdefault(key, submitted_at_seconds(record))
+            self.answers["fetch"] += len(items)
+            self.batches["fetch"] += 1
+
+    def graded(self, count, seconds):
+        with self._lock:
+            self.answers["grade"] += count
+            self.batches["grade"] += 1
+            self.grade_seconds.observe(seconds)
+
+    def written(self, count, seconds):
+        """One SQL write of `count` answers took `seconds` (including its commit)."""
+        with self._lock:
+            self.answers["write"] += count
+            self.batches["write"] += 1
+            self.batch_size.observe(count)
+            self.sql_write_seconds.observe(seconds)
+
+    def skipped(self, count):
+        if count:
+            with self._lock:
+                self.answers["skip"] += count
+
+    def finished(self, keys, committed_keys=None):
+        """
+        A fetched batch is done: keys leave the in-flight set, and the commit lag is
+        recorded for committed_keys (the answers stored or skipped now, not the ones
+        the ledger had already processed).
+        """
+        now = time.time()
+        committed = set(keys if committed_keys is None else committed_keys)
+        lags = Counter()
+        with self._lock:
+            for key in keys:
+                submitted_at = self._in_flight.pop(key, None)
+                if key in committed and submitted_at is not None:
+                    lags[max(0.0, now - submitted_at)] += 1
+            for lag, n in lags.items():
+                self.commit_lag_seconds.observe(lag, n)
+
+    def error(self, stage, kind):
+        with self._lock:
+            self.errors[(stage, kind)] += 1
+
+    # --- Export ---
+    def _oldest_age(self, now):
+        stamps = [ts for ts in self._in_flight.values() if ts is not None]
+        return max(0.0, now - min(stamps)) if stamps else 0.0
+
+    def snapshot(self, consumer="default"):
+        """Every series as one JSON-ready dict; the rates cover the time since consumer's previous call."""
+        now = time.time()
+        with self._lock:
+            last_time, last_answers = self._last_rates.get(consumer, (self.started, Counter()))
+            elapsed = max(now - last_time, 1e-9)
+            rates = {stage: round((self.answers[stage] - last_answers[stage]) / elapsed, 2) for stage in STAGES}
+            self._last_rates[consumer] = (now, Counter(self.answers))
+            self._last_rates.move_to_end(consumer)
+            while len(self._last_rates) > MAX_RATE_CONSUMERS:
+                self._last_rates.popitem(last=False)
+            data = {
+                "time": int(now),
+                "uptime_seconds": round(now - self.started, 1),
+                "oldest_unprocessed_age_seconds": round(self._oldest_age(now), 3),
+                "in_flight_answers": len(self._in_flight),
+                "answers_total": {stage: self.answers[stage] for stage in STAGES},
+                "answers_per_second": rates,
+                "batches_total": {stage: self.batches[stage] for stage in BATCH_STAGES},
+                "errors_total": {f"{stage}/{kind}": n for (stage, kind), n in sorted(self.errors.items())},
+                "batch_size": self.batch_size.snapshot(),
+                "sql_write_seconds": self.sql_write_seconds.snapshot(),
+                "grade_seconds": self.grade_seconds.snapshot(),
+                "commit_lag_seconds": self.commit_lag_seconds.snapshot(),
+            }
+        if self.pipeline is not None:
+            data["queued_batches"] = {name: s["queued"] for name, s in self.pipeline.status().items()
+                                      if s["queued"] is not None}
+        return data
+
+    def prometheus(self):
+        """Every series in the Prometheus text exposition format."""
+        now = time.time()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{PREFIX}_{name}{suffix}{{{label_text}}} {value}" if label_text
+                             else f"{PREFIX}_{name}{suffix} {value}")
+
+        def histogram(name, help_text, hist):
+            samples = [("_bucket", {"le": bound}, count) for bound, count in hist.cumulative()]
+            samples += [("_bucket", {"le": "+Inf"}, hist.count), ("_sum", {}, round(hist.sum, 6)),
+                        ("_count", {}, hist.count)]
+            metric(name, "histogram", help_text, samples)
+
+        with self._lock:
+            metric("oldest_unprocessed_age_seconds", "gauge",
+                   "Age of the oldest answer read from Firebase and not yet committed to SQL Server.",
+                   [("", {}, round(self._oldest_age(now), 3))])
+            metric("in_flight_answers", "gauge", "Answers read from Firebase and not yet committed.",
+                   [("", {}, len(self._in_flight))])
+            metric("answers_total", "counter", "Answers handled per stage.",
+                   [("", {"stage": stage}, self.answers[stage]) for stage in STAGES])
+            metric("batches_total", "counter", "Batches handled per stage.",
+                   [("", {"stage": stage}, self.batches[stage]) for stage in BATCH_STAGES])
+            metric("errors_total", "counter", "Errors per stage and kind.",
+                   [("", {"stage": stage, "kind": kind}, n) for (stage, kind), n in sorted(self.errors.items())])
+            histogram("batch_size", "Answers per SQL write.", self.batch_size)
+            histogram("sql_write_seconds", "Duration of one SQL write including its commit.", self.sql_write_seconds)
+            histogram("grade_seconds", "Duration of grading one batch.", self.grade_seconds)
+            histogram("commit_lag_seconds", "Submitted_At to SQL Server commit, per answer.",
+                      self.commit_lag_seconds)
+        if self.pipeline is not None:
+            metric("queued_batches", "gauge", "Pipeline batches waiting in front of each stage.",
+                   [("", {"stage": name}, s["queued"]) for name, s in self.pipeline.status().items()
+                    if s["queued"] is not None])
+        return "\n".join(lines) + "\n"
+
+    # --- Surfaces ---
+    def serve(self, host="127.0.0.1", port=9108):
+        """Serves /metrics and /metrics.json on a background thread; returns the server."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                pass
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path == "/metrics":
+                    body, content_type = metrics.prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+                elif url.path == "/metrics.json":
+                    consumer = "http:" + parse_qs(url.query).get("consumer", [""])[0][:64]
+                    body, content_type = json.dumps(metrics.snapshot(consumer)).encode("utf-8"), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="answer-metrics", daemon=True).start()
+        return server
+
+    def write_snapshots(self, path, interval_seconds=15):
+        """Rewrites the JSON snapshot at path every interval_seconds, on a background thread."""
+        def loop():
+            directory = os.path.dirname(os.path.abspath(path))
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    fd, tmp_path = tempfile.mkstemp(prefix=".metrics-", dir=directory)
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        json.dump(self.snapshot("file"), f, indent=2)
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    print(f"Could not write the metrics snapshot to '{path}': {e}")
+
+        threading.Thread(target=loop, name="answer-metrics-snapshot", daemon=True).start()
@@ -0,0 +1,36 @@
+-- =================================================================================
+-- Enable Change Tracking for the Firebase Delta Export
+-- =================================================================================
+-- SendDatabaseDataApp.py with EXPORT_MODE=delta pushes only the rows inserted, updated
+-- or deleted since its last run. It reads them with CHANGETABLE(CHANGES <table>, <version>),
+-- which needs change tracking on the database and on every exported table.
+-- 1. Turns change tracking on for ITIExaminationSystem, keeping 7 days of changes
+--    (an export that has not run for longer falls back to a full export).
+-- 2. Enables it on Course, Student_Course, Exam, Question_Bank, Question_Choice and
+--    Exam_Questions (all of them have a primary key, which change tracking requires).
+-- Safe to re-run: tables that are already tracked are skipped.
+-- =================================================================================
+
+USE ITIExaminationSystem;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_databases WHERE database_id = DB_ID())
+    ALTER DATABASE ITIExaminationSystem
+    SET CHANGE_TRACKING = ON (CHANGE_RETENTION = 7 DAYS, AUTO_CLEANUP = ON);
+GO
+
+DECLARE @sql NVARCHAR(MAX) = N'';
+SELECT @sql += N'ALTER TABLE [dbo].[' + t.name + N'] ENABLE CHANGE_TRACKING;' + CHAR(13)
+FROM sys.tables AS t
+WHERE t.name IN (N'Course', N'Student_Course', N'Exam', N'Question_Bank', N'Question_Choice', N'Exam_Questions')
+  AND NOT EXISTS (SELECT 1 FROM sys.change_tracking_tables AS ct WHERE ct.object_id = t.object_id);
+EXEC sp_executesql @sql;
+GO
+
+-- Check: every exported table should be listed with its minimum valid version.
+SELECT OBJECT_NAME(ct.object_id) AS Table_Name,
+       ct.min_valid_version AS Min_Valid_Version,
+       CHANGE_TRACKING_CURRENT_VERSION() AS Current_Version
+FROM sys.change_tracking_tables AS ct
+ORDER BY Table_Name;
+GO
@@ -13,10 +13,18 @@ import re
 #from catboost import CatBoostClassifier, Pool
 import time
 import random
-import json
+import sys
 #from pbixray import PBIXRay
 
 
+# Shared portal helpers live in the exam_portal package at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from exam_portal import CatalogStore, build_answer_records, submit_records
+from exam_portal.countdown import COUNTDOWN_HEIGHT, countdown_html, within_submit_grace
+from exam_portal.paging import answered_count, paginate
+from firebase_client import FirebaseClient
+
+
 # --- Page setup (set ONCE) ---
 st.set_page_config(
     page_title="ITI Examination System Dashboard",
@@ -260,107 +268,72 @@ with FireBase:
 
     # --- Firebase Configuration ---
     FIREBASE_URL = "https://iti-examination-default-rtdb.firebaseio.com"
+    # "batch": one multi-path PATCH per exam, "sequential": one POST per answer
+    SUBMIT_MODE = "batch"
+    # "full": download the exam collections once at startup, "lazy": fetch per student / per exam on demand
+    DATA_LOADING_MODE = "full"
+    # How often the cached catalog is revalidated against Firebase (0 disables it)
+    CATALOG_REFRESH_SECONDS = 60
+    # Without meta/versions in Firebase, how often every collection is re-downloaded instead (0 disables it)
+    CATALOG_ETAG_REFRESH_SECONDS = 3600
+    # Questions per page of the exam form (0 shows the whole exam on one page)
+    EXAM_PAGE_SIZE = 10
 
 
     if not FIREBASE_URL:
         st.error("FIREBASE_URL not set in .env")
         st.stop()
 
-    def fb_url(path):
-        auth ="" # Add auth token if needed: ?auth={token}
-        return f"{FIREBASE_URL.rstrip('/')}/{path}.json{auth}"
+    @st.cache_resource
+    def get_firebase_client():
+        # One pooled client per server process: keep-alive connections, retries with backoff, timeouts
+        return FirebaseClient(FIREBASE_URL)
 
     # --- Firebase Helper Functions ---
-    def fb_get(path):
-        url = fb_url(path)
+    def fb_get(path, params=None):
         try:
-            r = requests.get(url)
-            r.raise_for_status()  # Raise an exception for bad status codes
-            return r.json() or {}
+            # params: Firebase REST query, e.g. orderBy/equalTo/shallow
+            return get_firebase_client().get(path, params=params) or {}
         except requests.exceptions.RequestException as e:
             print(f"Error fetching data from Firebase path '{path}': {e}") # Use print for backend errors
             return {}
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON from Firebase path '{path}'. Response was: {r.text}")
+        except ValueError:
+            print(f"Error decoding JSON from Firebase path '{path}'.")
             return {}
 
     def fb_post(path, payload):
-        url = fb_url(path)
         try:
-            r = requests.post(url, json=payload)
-            r.raise_for_status()
-            return r.json()
+            return get_firebase_client().post(path, payload)
         except requests.exceptions.RequestException as e:
             print(f"Error posting data to Firebase path '{path}': {e}")
             return None
 
     def fb_put(path, payload):
-        url = fb_url(path)
         try:
-            r = requests.put(url, json=payload)
-            r.raise_for_status()
-            return r.json()
+            return get_firebase_client().put(path, payload)
         except requests.exceptions.RequestException as e:
             print(f"Error putting data to Firebase path '{path}': {e}")
             return None
 
+    def fb_patch(path, payload):
+        try:
+            return get_firebase_client().patch(path, payload)
+        except requests.exceptions.RequestException as e:
+            print(f"Error patching data at Firebase path '{path}': {e}")
+            return None
+
     # --- Data Loading ---
     @st.cache_resource
-    def load_all_data():
-        # This function runs inside st.spinner, so no need for toasts
-        def process_to_id_map(raw_data, id_field_name):
-            processed_map = {}
-            if isinstance(raw_data, dict):
-                for key, val in raw_data.items():
-                    if not (val and isinstance(val, dict)): continue
-                    cid = val.get(id_field_name)
-                    if cid: processed_map[str(cid)] = val
-                    elif key.isdigit(): processed_map[key] = val
-            elif isinstance(raw_data, list):
-                for idx, val in enumerate(raw_data):
-                    if not (val and isinstance(val, dict)): continue
-                    cid = val.get(id_field_name)
-                    if cid: processed_map[str(cid)] = val
-                    else: processed_map[str(idx)] = val
-            return processed_map
-
-        courses = process_to_id_map(fb_get("courses"), "Course_ID")
-        exams = process_to_id_map(fb_get("exams"), "Exam_ID")
-        questions = process_to_id_map(fb_get("questions"), "Question_ID")
-
-        student_courses_raw = fb_get("student_courses")
-        student_courses_map = {}
-        if isinstance(student_courses_raw, dict):
-            student_courses_map = student_courses_raw
-        elif isinstance(student_courses_raw, list):
-            for idx, val in enumerate(student_courses_raw):
-                if val: student_courses_map[str(idx)] = val
-        
-        choices = fb_get("choices")
-        
-        def get_as_dict(path):
-            data = fb_get(path)
-            if isinstance(data, dict): return data or {}
-            if isinstance(data, list):
-                converted_dict = {}
-                for idx, val in enumerate(data):
-                    if val: converted_dict[str(idx)] = val
-                return converted_dict
-            print(f"Data at path '{path}' was not a dictionary or list. Using empty map.")
-            return {}
+    def get_catalog_store():
+        # One store per server process. It loads the collections (or a lazy catalog) and
+        # revalidates them in the background, so re-exported exams show up without a restart.
+        return CatalogStore(get_firebase_client(), fb_get, lazy=DATA_LOADING_MODE == "lazy",
+                            refresh_seconds=CATALOG_REFRESH_SECONDS,
+                            etag_refresh_seconds=CATALOG_ETAG_REFRESH_SECONDS)
 
-        exam_questions_grouped = get_as_dict("exam_questions_grouped")
-        choices_by_question = get_as_dict("choices_by_question")
-        
-        return {
-            "courses": courses,
-            "student_courses": student_courses_map,
-            "exams": exams,
-            "questions": questions,
-            "choices": choices,
-            "exam_questions_grouped": exam_questions_grouped,
-            "choices_by_question": choices_by_question
-        }
+    def load_all_data():
+        # Current snapshot; the store swaps in a new one when Firebase data changes
+        return get_catalog_store().snapshot
 
     # --- GUI Styling ---
     # REMOVED: All CSS from here is now consolidated at the top of the file.
@@ -378,6 +351,7 @@ with FireBase:
     if "answers" not in st.session_state: st.session_state.answers = {}
     if "end_time" not in st.session_state: st.session_state.end_time = None
     if "duration_minutes" not in st.session_state: st.session_state.duration_minutes = 0
+    if "exam_page" not in st.session_state: st.session_state.exam_page = 0
 
     # --- UI Functions (Steps) ---
     def step1_ui():
@@ -399,22 +373,7 @@ with FireBase:
         st.info(f"Welcome, Student ID: **{sid}**")
         st.write("Please select an exam from your available courses.")
 
-        sc_map = data["student_courses"] or {}
-        courses_map = data["courses"] or {}
-
-        available = []
-        if isinstance(sc_map, dict):
-            for key, sc in sc_map.items():
-                try: sc_student = str(sc.get("Student_ID") or sc.get("student_id") or sc.get("StudentID"))
-                except Exception: sc_student = None
-                
-                if sc_student == str(sid):
-                    cid = str(sc.get("Course_ID"))
-                    course = courses_map.get(cid) 
-                    if course:
-                        available.append((cid, course.get("Course_Name")))
-        else:
-            st.error("Student courses data is not in the expected dictionary format.")
+        available = data["catalog"].courses_for_student(sid)
 
         if not available:
             st.error("No courses found for this Student ID. Please contact your administrator.")
@@ -433,8 +392,7 @@ with FireBase:
             st.rerun()
 
     def start_exam_for_course(course_id):
-        exams_map = data["exams"]
-        matching = [eid for eid, e in exams_map.items() if str(e.get("Course_ID")) == str(course_id)]
+        matching = data["catalog"].exams_for_course(course_id)
         if not matching: return None
         chosen = random.choice(matching)
         return chosen
@@ -449,16 +407,17 @@ with FireBase:
                 st.error("No exam found for this course.")
                 return
             st.session_state.exam_id = exam_id
-            exam_info = data["exams"].get(str(exam_id), {})
+            exam_info = data["catalog"].exam(exam_id)
             
-            dur = exam_info.get("Exam_Duration_Minutes") or exam_info.get("Exam_Duration")
+            dur = exam_info.duration_minutes if exam_info else None
             try: dur = int(dur)
             except (ValueError, TypeError): dur = 30 # Default
             
             st.session_state.duration_minutes = dur
             st.session_state.end_time = time.time() + dur * 60
-            st.session_state.exam_questions = data["exam_questions_grouped"].get(str(exam_id), [])
+            st.session_state.exam_questions = data["catalog"].exam_question_ids(exam_id)
             st.session_state.answers = {str(qid): None for qid in st.session_state.exam_questions}
+            st.session_state.exam_page = 0
 
         if st.session_state.exam_id:
             st.caption(f"Student ID: {st.session_state.student_id} | Exam ID: {st.session_state.exam_id}")
@@ -467,35 +426,42 @@ with FireBase:
         if remaining <= 0:
             st.warning("Time is up. Submitting...")
             st.toast("Time's up! Automatically submitting your exam.", icon="⏰")
+            # The timer's own submit (within a few seconds of the deadline) keeps what was selected
+            # in the form; later, only the answers saved before the deadline are submitted
+            if within_submit_grace(st.session_state.end_time):
+                for qid_s in st.session_state.answers:
+                    if f"q_{qid_s}" in st.session_state:
+                        st.session_state.answers[qid_s] = st.session_state[f"q_{qid_s}"]
             submit_answers()
             st.rerun() 
             return
-            
-        minutes = remaining // 60
-        seconds = remaining % 60
-        st.markdown(f"**Time remaining: {minutes:02d}:{seconds:02d}**")
 
-        questions_map = data["questions"]
-        choices_by_q = data["choices_by_question"]
+        # The countdown runs in the browser and clicks "Submit Exam" at end_time,
+        # so the script only reruns when the student interacts
+        components.html(countdown_html(st.session_state.end_time), height=COUNTDOWN_HEIGHT)
+
+        bundle = data["catalog"].question_bundle(st.session_state.exam_id)
+        # Only the page being shown is built as widgets; the other pages' answers stay in session state
+        first, page_entries, page, page_count = paginate(bundle, st.session_state.exam_page, EXAM_PAGE_SIZE)
+        st.session_state.exam_page = page
 
         st.write("---")
         with st.form(key="exam_form"):
-            for idx, qid in enumerate(st.session_state.exam_questions, start=1):
-                qid_s = str(qid)
-                q = questions_map.get(qid_s)
+            for idx, entry in enumerate(page_entries, start=first + 1):
+                qid_s = entry.question_id
+                q = entry.question
                 if not q:
                     st.error(f"Question {qid_s} not found.")
                     continue
                 
-                st.write(f"**Q{idx}. {q.get('Question_Description')}**")
-                qtype = q.get("Question_Type")
+                st.write(f"**Q{idx}. {q.description}**")
+                qtype = q.question_type
                 key = f"q_{qid_s}"
                 
                 current_val = st.session_state.answers.get(qid_s)
                 
                 if qtype == "MCQ":
-                    choices_list = choices_by_q.get(qid_s) or []
-                    labels = [c.get("Choice_Text") for c in choices_list if c]
+                    labels = entry.choices
                     if not labels:
                         st.warning(f"No choices found for question {qid_s}")
                         continue
@@ -519,15 +485,24 @@ with FireBase:
                     st.session_state.answers[qid_s] = txt
                 st.write("---")
             
+            if page_count > 1:
+                st.caption(f"Page {page + 1} of {page_count} | "
+                           f"{answered_count(st.session_state.answers)} of {len(st.session_state.answers)} questions answered")
+                col_prev, col_next = st.columns(2)
+                prev_page = col_prev.form_submit_button("Previous", disabled=page == 0)
+                next_page = col_next.form_submit_button("Next", disabled=page == page_count - 1)
+                if prev_page or next_page:
+                    st.session_state.exam_page = page + (1 if next_page else -1)
+                    st.rerun()
+                    return
+
+            # Shown on every page: the countdown clicks it when time is up
             submitted = st.form_submit_button("Submit Exam")
             if submitted:
                 submit_answers()
                 st.rerun()
                 return
 
-        time.sleep(1)
-        st.rerun()
-
     def submit_answers():
         st.toast("Submitting your answers...")
         sid = st.session_state.student_id
@@ -538,23 +513,12 @@ with FireBase:
         if not all_answered:
             st.warning("You have not answered all questions, but submitting anyway.")
 
-        payloads = []
-        for qid, ans in answers.items():
-            record = {
-                "Exam_ID": int(exam_id) if str(exam_id).isdigit() else exam_id,
-                "Question_ID": int(qid) if str(qid).isdigit() else qid,
-                "Student_ID": int(sid) if str(sid).isdigit() else sid,
-                "Student_Answer": ans if ans is not None else "N/A",
-                "Submitted_At": int(time.time())
-            }
-            payloads.append(record)
-
-        results = []
+        payloads = build_answer_records(sid, exam_id, answers)
+
         with st.spinner("Submitting your answers to the database..."):
-            for rec in payloads:
-                res = fb_post("student_answers", rec)
-                if res: results.append(res.get("name"))
-                else: st.error(f"Failed to submit answer for Question ID: {rec['Question_ID']}")
+            results, failed = submit_records(payloads, fb_post, fb_patch, mode=SUBMIT_MODE)
+        for qid in failed:
+            st.error(f"Failed to submit answer for Question ID: {qid}")
 
         st.session_state.step = 4
         st.session_state.submitted_results = results
@@ -571,6 +535,7 @@ with FireBase:
         st.session_state.exam_questions = []
         st.session_state.answers = {}
         st.session_state.end_time = None
+        st.session_state.exam_page = 0
         
         st.info("If you need to take another exam, please REFRESH the page to log in again.")
         
@@ -0,0 +1,12 @@
+"""
+exam_portal
+Shared helpers for the ITI Student Exam Portal pages
+(Streamlit_App/App.py, Streamlit App/App.py and Ahmed Arab/Examweb/WebApp.py).
+"""
+
+from exam_portal.catalog import ExamCatalog, LazyExamCatalog, QuestionEntry
+from exam_portal.refresh import CatalogStore
+from exam_portal.submission import build_answer_records, new_push_id, submit_records
+
+__all__ = ["CatalogStore", "ExamCatalog", "LazyExamCatalog", "QuestionEntry",
+           "build_answer_records", "new_push_id", "submit_records"]
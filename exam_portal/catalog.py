@@ -0,0 +1,250 @@
+"""
+catalog.py
+Indexed, read-only view over the exam collections exported to Firebase.
+Built once per process inside load_all_data() so that the lookups the portal
+makes on every click (student -> courses, course -> exams, exam -> questions)
+are dict hits instead of scans over every Student_Course / Exam row.
+LazyExamCatalog offers the same lookups without downloading whole collections.
+"""
+
+import json
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from exam_portal.compact import as_id, as_list, compact_bundle, compact_choices, compact_exam, compact_question
+
+# One renderable question of an exam: the Question record (None if it is missing
+# from /questions) and the tuple of choice labels (empty for non-MCQ questions).
+QuestionEntry = namedtuple("QuestionEntry", ["question_id", "question", "choices"])
+
+# Read-optimized nodes published by SendDatabaseDataApp.py that LazyExamCatalog reads
+# first; the full catalog does not need them (it joins the collections in memory)
+LAZY_INDEXES = ("exam_bundles", "student_course_index")
+
+
+def _key(value):
+    """Returns the string form of an ID, as handed to the pages and kept in session state."""
+    if value is None:
+        return None
+    return str(value).strip()
+
+
+class ExamCatalog:
+    """
+    Holds the compact exam collections (see exam_portal.compact) with the indexes the
+    portal needs:
+      student_id -> (course_id, ...)        stored as student_courses
+      course_id  -> [exam_id, ...]
+      exam_id    -> (QuestionEntry, ...)    built the first time the exam is opened
+    Lookups take and return IDs as strings; inside the catalog they are ints.
+    """
+
+    def __init__(self, courses, student_courses, exams, questions,
+                 exam_questions_grouped, choices_by_question):
+        self.courses = courses or {}
+        self.student_courses = student_courses or {}
+        self.exams = exams or {}
+        self.questions = questions or {}
+        self.exam_questions_grouped = exam_questions_grouped or {}
+        self.choices_by_question = choices_by_question or {}
+
+        self._exams_by_course = {}
+        for eid, exam in self.exams.items():
+            self._exams_by_course.setdefault(exam.course_id, []).append(eid)
+        self._bundles = {}
+
+    # --- Lookups used by the portal ---
+    def courses_for_student(self, student_id):
+        """Returns [(course_id, course_name), ...] for the courses the student is enrolled in."""
+        return [(_key(cid), self.courses[cid])
+                for cid in self.student_courses.get(as_id(student_id), ()) if cid in self.courses]
+
+    def exams_for_course(self, course_id):
+        """Returns the IDs of all exams of a course."""
+        return [_key(eid) for eid in self._exams_by_course.get(as_id(course_id), ())]
+
+    def exam(self, exam_id):
+        """Returns the Exam record, or None if it does not exist."""
+        return self.exams.get(as_id(exam_id))
+
+    def exam_question_ids(self, exam_id):
+        """Returns the question IDs of an exam in exam order, as strings."""
+        return [_key(qid) for qid in self.exam_questions_grouped.get(as_id(exam_id), ())]
+
+    def question_bundle(self, exam_id):
+        """Returns the exam's questions as a tuple of QuestionEntry, ready to render."""
+        eid = as_id(exam_id)
+        bundle = self._bundles.get(eid)
+        if bundle is None:
+            bundle = tuple(QuestionEntry(_key(qid), self.questions.get(qid), self.choices_by_question.get(qid, ()))
+                           for qid in self.exam_questions_grouped.get(eid, ()))
+            self._bundles[eid] = bundle
+        return bundle
+
+
+class LazyExamCatalog:
+    """
+    Same lookups as ExamCatalog, but nothing is downloaded up front: each lookup
+    fetches only the records it needs and caches them for every later session.
+      courses_for_student -> student_course_index/<sid>: the student's course IDs and names in one GET;
+                             without it student_courses?orderBy="Student_ID"&equalTo=<sid>, courses/<cid>
+      exams_for_course    -> exams?orderBy="Course_ID"&equalTo=<cid>
+      exam, exam_question_ids, question_bundle
+                          -> exam_bundles/<eid>: the exam, its questions and their choices in one GET;
+                             without it exams/<eid>, exam_questions_grouped/<eid>, questions/<qid>
+                             and choices_by_question/<qid>
+    The orderBy queries need these rules in the Realtime Database:
+      "student_courses": {".indexOn": ["Student_ID"]}, "exams": {".indexOn": ["Course_ID"]}
+    Records are cached in the same compact form ExamCatalog uses.
+    fetch(path, params=None) is the page's fb_get and must return {} on errors. Since an
+    error and a missing record look alike, empty results (no courses, no exam, no
+    questions) are not cached: the next lookup asks Firebase again instead of keeping
+    a transient failure for the life of the process.
+    """
+
+    def __init__(self, fetch, max_workers=8):
+        self.fetch = fetch
+        self.max_workers = max_workers
+        self._courses = {}
+        self._courses_by_student = {}
+        self._exams = {}
+        self._exams_by_course = {}
+        self._question_ids_by_exam = {}
+        self._questions = {}
+        self._choices = {}
+
+        # shallow=true lists the top-level collections without downloading them
+        self.collections = set((fetch("", {"shallow": "true"}) or {}).keys())
+        missing = {"student_courses", "courses", "exams", "questions",
+                   "exam_questions_grouped", "choices_by_question"} - self.collections
+        if missing:
+            print(f"Lazy catalog: collections not found in Firebase: {sorted(missing)}")
+        self.has_bundles = "exam_bundles" in self.collections
+        self.has_student_index = "student_course_index" in self.collections
+
+    def _query(self, path, field, value):
+        """Records of a collection whose <field> equals value, via orderBy/equalTo."""
+        value = int(value) if str(value).isdigit() else str(value)
+        raw = self.fetch(path, {"orderBy": json.dumps(field), "equalTo": json.dumps(value)})
+        if isinstance(raw, list):
+            return [v for v in raw if isinstance(v, dict)]
+        if isinstance(raw, dict):
+            return [v for v in raw.values() if isinstance(v, dict)]
+        return []
+
+    def _fetch_many(self, paths):
+        """GETs several keyed paths in parallel. Returns {path: data}."""
+        if not paths:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(paths))) as pool:
+            return dict(zip(paths, pool.map(self.fetch, paths)))
+
+    def _load_bundle(self, eid):
+        """Caches the exam, its question IDs, questions and choices from exam_bundles/<eid>."""
+        if not self.has_bundles:
+            return
+        bundle = compact_bundle(self.fetch(f"exam_bundles/{eid}"))
+        if bundle is None or bundle[0] is None or not bundle[1]:
+            return  # no bundle, or the GET failed: the caller falls back and a later lookup tries again
+        exam, entries = bundle
+        self._exams[eid] = exam
+        self._question_ids_by_exam[eid] = [_key(qid) for qid, _, _ in entries]
+        for qid, question, choices in entries:
+            self._questions[_key(qid)] = question
+            self._choices[_key(qid)] = choices
+
+    def _course_name(self, cid):
+        if cid not in self._courses:
+            course = self.fetch(f"courses/{cid}")
+            name = course.get("Course_Name") if isinstance(course, dict) and course else None
+            if not name:
+                return None
+            self._courses[cid] = name
+        return self._courses[cid]
+
+    # --- Lookups used by the portal ---
+    def courses_for_student(self, student_id):
+        sid = _key(student_id)
+        if sid not in self._courses_by_student and self.has_student_index:
+            available = []
+            for entry in as_list(self.fetch(f"student_course_index/{sid}")):
+                if isinstance(entry, dict) and entry.get("Course_Name"):
+                    cid = _key(entry.get("Course_ID"))
+                    self._courses[cid] = entry["Course_Name"]
+                    available.append((cid, entry["Course_Name"]))
+            if available:  # otherwise: not in the index yet, or the GET failed; fall back to the query
+                self._courses_by_student[sid] = available
+        if sid not in self._courses_by_student:
+            cids = [_key(sc.get("Course_ID")) for sc in self._query("student_courses", "Student_ID", sid)]
+            missing = [f"courses/{cid}" for cid in cids if cid not in self._courses]
+            for path, course in self._fetch_many(missing).items():
+                name = course.get("Course_Name") if isinstance(course, dict) and course else None
+                if name:
+                    self._courses[path.split("/", 1)[1]] = name
+            available = []
+            for cid in cids:
+                name = self._course_name(cid)
+                if name:
+                    available.append((cid, name))
+            if not available:
+                return []
+            self._courses_by_student[sid] = available
+        return list(self._courses_by_student[sid])
+
+    def exams_for_course(self, course_id):
+        cid = _key(course_id)
+        if cid not in self._exams_by_course:
+            eids = []
+            for raw in self._query("exams", "Course_ID", cid):
+                eid = _key(raw.get("Exam_ID"))
+                exam = compact_exam(raw)
+                if exam is not None:
+                    self._exams[eid] = exam
+                eids.append(eid)
+            if not eids:
+                return []
+            self._exams_by_course[cid] = eids
+        return list(self._exams_by_course[cid])
+
+    def exam(self, exam_id):
+        eid = _key(exam_id)
+        if eid not in self._exams:
+            self._load_bundle(eid)
+        if eid not in self._exams:
+            exam = compact_exam(self.fetch(f"exams/{eid}"))
+            if exam is None:
+                return None
+            self._exams[eid] = exam
+        return self._exams[eid]
+
+    def exam_question_ids(self, exam_id):
+        eid = _key(exam_id)
+        if eid not in self._question_ids_by_exam:
+            self._load_bundle(eid)
+        if eid not in self._question_ids_by_exam:
+            raw = self.fetch(f"exam_questions_grouped/{eid}")
+            qids = [_key(q) for q in as_list(raw) if q is not None]
+            if not qids:
+                return []
+            self._question_ids_by_exam[eid] = qids
+        return list(self._question_ids_by_exam[eid])
+
+    def question_bundle(self, exam_id):
+        qids = self.exam_question_ids(exam_id)
+        paths = [f"questions/{qid}" for qid in qids if qid not in self._questions]
+        paths += [f"choices_by_question/{qid}" for qid in qids if qid not in self._choices]
+        fetched = {path: raw for path, raw in self._fetch_many(paths).items()}
+        for qid in qids:
+            if f"questions/{qid}" in fetched:
+                question = compact_question(fetched[f"questions/{qid}"])
+                if question is not None:
+                    self._questions[qid] = question
+        for qid in qids:
+            if f"choices_by_question/{qid}" in fetched:
+                choices = compact_choices(fetched[f"choices_by_question/{qid}"])
+                question = self._questions.get(qid)
+                # No choices is only an answer for a loaded non-MCQ question; for the rest it may be a failed GET
+                if choices or (question is not None and question.question_type != "MCQ"):
+                    self._choices[qid] = choices
+        return tuple(QuestionEntry(qid, self._questions.get(qid), self._choices.get(qid, ()))
+                     for qid in qids)
@@ -0,0 +1,145 @@
+"""
+compact.py
+Compact in-memory form of the exam collections held by every portal process.
+Instead of the dict-of-dicts copied from the Firebase JSON (every record repeating
+its key strings, plus Question_Model_Answer which the portal never shows) the
+catalog keeps:
+  courses                 {course_id: course name}
+  student_courses         {student_id: (course_id, ...)}
+  exams                   {exam_id: Exam}
+  questions               {question_id: Question}        no model answers
+  exam_questions_grouped  {exam_id: (question_id, ...)}
+  choices_by_question     {question_id: (choice text, ...)}
+with integer IDs, __slots__ records and interned repeated strings.
+exam_portal.memory_report measures the difference.
+"""
+
+import sys
+
+
+def as_id(value):
+    """IDs are stored as ints; anything that is not a plain number stays a string."""
+    if value is None:
+        return None
+    text = str(value).strip()
+    return int(text) if text.isdigit() else text
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def as_list(value):
+    """Firebase returns arrays either as lists or (when they have gaps) as dicts keyed by index."""
+    if isinstance(value, dict):
+        return [v for _, v in sorted(value.items(), key=lambda kv: int(kv[0]) if str(kv[0]).isdigit() else 0)]
+    if isinstance(value, list):
+        return value
+    return []
+
+
+class Exam:
+    __slots__ = ("exam_id", "course_id", "duration_minutes", "exam_type")
+
+    def __init__(self, exam_id, course_id, duration_minutes, exam_type):
+        self.exam_id = exam_id
+        self.course_id = course_id
+        self.duration_minutes = duration_minutes
+        self.exam_type = exam_type
+
+    def __repr__(self):
+        return f"Exam({self.exam_id}, course={self.course_id}, {self.duration_minutes} min)"
+
+
+class Question:
+    __slots__ = ("question_id", "course_id", "question_type", "description")
+
+    def __init__(self, question_id, course_id, question_type, description):
+        self.question_id = question_id
+        self.course_id = course_id
+        self.question_type = question_type
+        self.description = description
+
+    def __repr__(self):
+        return f"Question({self.question_id}, {self.question_type})"
+
+
+# --- Record converters (one raw Firebase record -> compact value) ---
+def compact_exam(raw):
+    if not isinstance(raw, dict) or not raw:
+        return None
+    duration = raw.get("Exam_Duration_Minutes") or raw.get("Exam_Duration")
+    try:
+        duration = int(duration)
+    except (ValueError, TypeError):
+        duration = None
+    return Exam(as_id(raw.get("Exam_ID")), as_id(raw.get("Course_ID")), duration, _intern(raw.get("Exam_Type")))
+
+
+def compact_question(raw):
+    if not isinstance(raw, dict) or not raw:
+        return None
+    return Question(as_id(raw.get("Question_ID")), as_id(raw.get("Course_ID")),
+                    _intern(raw.get("Question_Type")), raw.get("Question_Description"))
+
+
+def compact_choices(raw):
+    return tuple(_intern(c.get("Choice_Text")) for c in as_list(raw) if isinstance(c, dict))
+
+
+def compact_bundle(raw):
+    """
+    exam_bundles/<eid> (published by SendDatabaseDataApp.py) -> (Exam, ((question_id, Question,
+    choice labels), ...)) in exam order, or None when there is no bundle.
+    """
+    if not isinstance(raw, dict) or not raw:
+        return None
+    entries = tuple((as_id(q.get("Question_ID")), compact_question(q),
+                     tuple(_intern(text) for text in as_list(q.get("Choices")) if isinstance(text, str)))
+                    for q in as_list(raw.get("Questions")) if isinstance(q, dict))
+    return compact_exam(raw), entries
+
+
+# --- Collection converters (id map from exam_portal.loader -> compact part) ---
+def compact_courses(id_map):
+    return {as_id(cid): _intern(c.get("Course_Name")) for cid, c in id_map.items() if isinstance(c, dict)}
+
+
+def compact_enrollments(id_map):
+    enrollments = {}
+    for sc in id_map.values():
+        if not isinstance(sc, dict):
+            continue
+        sid = as_id(sc.get("Student_ID") or sc.get("student_id") or sc.get("StudentID"))
+        cid = as_id(sc.get("Course_ID"))
+        if sid is None or cid is None:
+            continue
+        enrollments.setdefault(sid, []).append(cid)
+    return {sid: tuple(cids) for sid, cids in enrollments.items()}
+
+
+def compact_exams(id_map):
+    exams = {}
+    for eid, raw in id_map.items():
+        exam = compact_exam(raw)
+        if exam is not None:
+            exams[as_id(eid)] = exam
+    return exams
+
+
+def compact_questions(id_map):
+    questions = {}
+    for qid, raw in id_map.items():
+        question = compact_question(raw)
+        if question is not None:
+            questions[as_id(qid)] = question
+    return questions
+
+
+def compact_exam_questions(id_map):
+    return {as_id(eid): tuple(as_id(q) for q in as_list(qids) if q is not None)
+            for eid, qids in id_map.items()}
+
+
+def compact_choices_by_question(id_map):
+    return {as_id(qid): compact_choices(raw) for qid, raw in id_map.items()}
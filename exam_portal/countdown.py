@@ -0,0 +1,64 @@
+"""
+countdown.py
+Exam timer that runs in the student's browser instead of rerunning the
+Streamlit script every second. The server stays the authority on the deadline:
+the page passes its end_time and the server's current time, and the browser
+only counts down the difference, so a wrong client clock does not matter.
+When the time is up the timer clicks the exam's submit button, which reruns
+the script once and submits the answers. The answers in the form are only taken
+within SUBMIT_GRACE_SECONDS of end_time (the click's round trip); a later rerun
+submits the answers saved before the deadline.
+"""
+
+import json
+import time
+
+COUNTDOWN_HEIGHT = 60
+SUBMIT_GRACE_SECONDS = 5  # how late the timer's submit may arrive and still take the form's answers
+
+
+def within_submit_grace(end_time, now=None):
+    """True while a submit after end_time may still take the answers selected in the form."""
+    now = time.time() if now is None else now
+    return now - end_time <= SUBMIT_GRACE_SECONDS
+
+
+def countdown_html(end_time, submit_label="Submit Exam", now=None):
+    """Returns the HTML for streamlit.components.v1.html(..., height=COUNTDOWN_HEIGHT)."""
+    now = time.time() if now is None else now
+    remaining_ms = max(0, int((end_time - now) * 1000))
+    return f"""
+<div id="exam-timer" style="font-family: sans-serif; font-size: 1.25rem; font-weight: 800;
+     color: #FF4136; background-color: rgba(10, 10, 10, 0.8); border: 1px solid #FF4136;
+     border-radius: 10px; padding: 0.5rem 1rem; display: inline-block;">Time remaining: --:--</div>
+<script>
+  const deadline = Date.now() + {remaining_ms};
+  const submitLabel = {json.dumps(submit_label)};
+  const timer = document.getElementById("exam-timer");
+  let submitted = false;
+
+  function submitExam() {{
+    // The component iframe shares the page's origin, so it can reach the Streamlit form
+    const buttons = Array.from(window.parent.document.querySelectorAll("button"));
+    const button = buttons.find(b => b.innerText.trim() === submitLabel);
+    if (button) {{
+      button.click();
+    }}
+  }}
+
+  function tick() {{
+    const left = Math.max(0, Math.round((deadline - Date.now()) / 1000));
+    const minutes = String(Math.floor(left / 60)).padStart(2, "0");
+    const seconds = String(left % 60).padStart(2, "0");
+    timer.textContent = "Time remaining: " + minutes + ":" + seconds;
+    if (left === 0 && !submitted) {{
+      submitted = true;
+      timer.textContent = "Time is up. Submitting...";
+      submitExam();
+    }}
+  }}
+
+  tick();
+  setInterval(tick, 1000);
+</script>
+"""
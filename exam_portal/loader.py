@@ -0,0 +1,152 @@
+"""
+loader.py
+Turns the raw Firebase collections into the compact parts the catalog is built from
+(raw JSON -> id map -> exam_portal.compact). Each collection is converted on its own
+so that it can be re-downloaded and swapped without reloading the others, and
+collections are downloaded in parallel with a per-collection timing breakdown.
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from exam_portal import compact
+from exam_portal.catalog import ExamCatalog
+
+
+def process_to_id_map(raw_data, id_field_name):
+    """Converts raw data (list or dict) to a dict keyed by the ID field."""
+    processed_map = {}
+    if isinstance(raw_data, dict):
+        for key, val in raw_data.items():
+            if not (val and isinstance(val, dict)):
+                continue
+            cid = val.get(id_field_name)
+            if cid:
+                processed_map[str(cid)] = val
+            elif key.isdigit():
+                processed_map[key] = val
+    elif isinstance(raw_data, list):
+        for idx, val in enumerate(raw_data):
+            if not (val and isinstance(val, dict)):
+                continue
+            cid = val.get(id_field_name)
+            if cid:
+                processed_map[str(cid)] = val
+            else:
+                processed_map[str(idx)] = val
+    return processed_map
+
+
+def get_as_dict(data, path=""):
+    """Returns a Firebase node as a dict; arrays are keyed by their index."""
+    if isinstance(data, dict):
+        return data or {}
+    if isinstance(data, list):
+        converted_dict = {}
+        for idx, val in enumerate(data):
+            if val:
+                converted_dict[str(idx)] = val
+        return converted_dict
+    print(f"Data at path '{path}' was not a dictionary or list. Using empty map.")
+    return {}
+
+
+# Collection name -> function normalizing its raw JSON into an id map.
+# The keys are the Firebase paths and also the keyword arguments of ExamCatalog.
+ID_MAPS = {
+    "courses": lambda raw: process_to_id_map(raw, "Course_ID"),
+    "student_courses": lambda raw: get_as_dict(raw, "student_courses"),
+    "exams": lambda raw: process_to_id_map(raw, "Exam_ID"),
+    "questions": lambda raw: process_to_id_map(raw, "Question_ID"),
+    "exam_questions_grouped": lambda raw: get_as_dict(raw, "exam_questions_grouped"),
+    "choices_by_question": lambda raw: get_as_dict(raw, "choices_by_question"),
+}
+
+# Collection name -> function turning its raw JSON into the compact part kept in memory.
+COMPACTORS = {
+    "courses": compact.compact_courses,
+    "student_courses": compact.compact_enrollments,
+    "exams": compact.compact_exams,
+    "questions": compact.compact_questions,
+    "exam_questions_grouped": compact.compact_exam_questions,
+    "choices_by_question": compact.compact_choices_by_question,
+}
+COLLECTIONS = tuple(ID_MAPS)
+
+
+def normalize_collection(name, raw):
+    return COMPACTORS[name](ID_MAPS[name](raw))
+
+
+def build_snapshot(collections):
+    """Returns the dict load_all_data() hands to the pages; only the catalog is kept."""
+    return {"catalog": ExamCatalog(**collections)}
+
+
+def download_collection(client, name, skip_etag=None):
+    """
+    GETs one collection with its ETag, decodes it and builds its compact part.
+    Returns (part, etag, timing); part is None when the ETag equals skip_etag. The body is
+    downloaded either way (Firebase ignores If-None-Match): skip_etag only saves the decode.
+    Raises requests.exceptions.RequestException or ValueError on failures.
+    """
+    started = time.perf_counter()
+    r = client.request("GET", name, headers={"X-Firebase-ETag": "true"})
+    fetched = time.perf_counter()
+    etag = r.headers.get("ETag")
+    timing = {"fetch_ms": (fetched - started) * 1000, "decode_ms": 0.0, "build_ms": 0.0,
+              "bytes": len(r.content)}
+    if skip_etag and etag == skip_etag:
+        return None, etag, timing
+
+    raw = json.loads(r.content) or {}
+    decoded = time.perf_counter()
+    part = normalize_collection(name, raw)
+    timing["decode_ms"] = (decoded - fetched) * 1000
+    timing["build_ms"] = (time.perf_counter() - decoded) * 1000
+    return part, etag, timing
+
+
+def load_collections(client, names=None, etags=None, max_workers=None):
+    """
+    Downloads collections in parallel on a thread pool; each part is built as soon
+    as its download completes, so cold start costs about the slowest collection
+    instead of the sum of all of them.
+    Returns (results, timings): results maps name -> (part, etag) for the collections
+    that loaded (part None if unchanged per etags), timings maps name -> timing dict.
+    """
+    names = list(names or COLLECTIONS)
+    etags = etags or {}
+    results, timings = {}, {}
+    if not names:
+        return results, timings
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers or len(names)) as pool:
+        futures = {pool.submit(download_collection, client, name, etags.get(name)): name for name in names}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                part, etag, timing = future.result()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Error fetching data from Firebase path '{name}': {e}")
+                continue
+            results[name] = (part, etag)
+            timings[name] = timing
+    timings["_wall_ms"] = (time.perf_counter() - started) * 1000
+    return results, timings
+
+
+def format_timings(timings):
+    """Renders the per-collection timing breakdown returned by load_collections()."""
+    lines = ["Catalog load timings:"]
+    rows = sorted(((n, t) for n, t in timings.items() if not n.startswith("_")),
+                  key=lambda nt: -(nt[1]["fetch_ms"] + nt[1]["decode_ms"] + nt[1]["build_ms"]))
+    for name, t in rows:
+        lines.append(f"  {name:<24} fetch {t['fetch_ms']:9.1f} ms  decode {t['decode_ms']:8.1f} ms  "
+                     f"build {t['build_ms']:8.1f} ms  {t['bytes'] / 1048576:8.2f} MB")
+    serial = sum(t["fetch_ms"] + t["decode_ms"] + t["build_ms"] for _, t in rows)
+    lines.append(f"  wall {timings.get('_wall_ms', 0.0):.1f} ms (one after another: {serial:.1f} ms)")
+    return "\n".join(lines)
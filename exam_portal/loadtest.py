@@ -0,0 +1,314 @@
+"""
+loadtest.py
+Load test for the exam flow of the portal: N simulated students go through
+  courses     step2_ui     courses_for_student
+  start_exam  step3_ui     exams_for_course, exam, exam_question_ids, question_bundle
+  submit      submit_answers  build_answer_records + submit_records
+concurrently, against the stub Firebase server (firebase_client.stub_server) seeded
+with a synthetic question bank. The stub runs in its own process, so its CPU time
+and peak memory are measured separately from the simulated portals.
+Each simulated portal has one FirebaseClient and one catalog shared by its students,
+as @st.cache_resource does in the pages. The portals (--portals) are instances in
+this one process, with students on threads, so their CPU time is reported combined.
+Usage:
+  python -m exam_portal.loadtest --students 500
+  python -m exam_portal.loadtest --students 2000 --portals 4 --data-mode lazy --latency-ms 40
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from exam_portal.refresh import CatalogStore
+from exam_portal.submission import build_answer_records, submit_records
+from exam_portal.synthetic import synthetic_collections
+from firebase_client import FirebaseClient
+
+STEPS = ("portal_start", "courses", "start_exam", "submit", "total")
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+# --- Stub server process ---
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub(seed, latency_ms=0):
+    """Starts firebase_client.stub_server in a subprocess seeded with `seed`. Returns (process, url)."""
+    port = _free_port()
+    fd, seed_path = tempfile.mkstemp(suffix=".json", prefix="stub-seed-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(seed, f)
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "firebase_client.stub_server", "--port", str(port),
+         "--seed", seed_path, "--latency-ms", str(latency_ms)],
+        cwd=str(REPO_ROOT), env=env, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                requests.get(f"{url}/__stub__/stats", timeout=1)
+                break
+            except requests.exceptions.RequestException:
+                if process.poll() is not None or time.time() > deadline:
+                    raise RuntimeError("Stub Firebase server did not start")
+                time.sleep(0.1)
+    finally:
+        os.unlink(seed_path)
+    return process, url
+
+
+def stub_stats(url):
+    return requests.get(f"{url}/__stub__/stats", timeout=10).json()
+
+
+def _cpu_seconds():
+    return time.process_time()  # user + system CPU of this process, on every platform
+
+
+def _count_answers(url):
+    keys = requests.get(f"{url}/student_answers.json", params={"shallow": "true"}, timeout=60).json()
+    return len(keys or {})
+
+
+# --- Simulated portal ---
+class Portal:
+    """One simulated portal (in this process): the pooled client, the page helpers and the catalog store."""
+
+    def __init__(self, url, data_mode="full", submit_mode="batch"):
+        self.client = FirebaseClient(url)
+        self.submit_mode = submit_mode
+        started = time.perf_counter()
+        self.store = CatalogStore(self.client, self.fb_get, lazy=data_mode == "lazy", refresh_seconds=0)
+        self.start_seconds = time.perf_counter() - started
+
+    # Same contract as fb_get / fb_post / fb_patch in the pages
+    def fb_get(self, path, params=None):
+        try:
+            return self.client.get(path, params=params) or {}
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error fetching data from Firebase path '{path}': {e}")
+            return {}
+
+    def fb_post(self, path, payload):
+        try:
+            return self.client.post(path, payload)
+        except requests.exceptions.RequestException as e:
+            print(f"Error posting data to Firebase path '{path}': {e}")
+            return None
+
+    def fb_patch(self, path, payload):
+        try:
+            return self.client.patch(path, payload)
+        except requests.exceptions.RequestException as e:
+            print(f"Error patching data at Firebase path '{path}': {e}")
+            return None
+
+
+def run_student(portal, student_id, think_seconds=0.0, seed=0):
+    """
+    Takes one student through the exam flow. Returns (timings, submitted, error):
+    timings maps step -> seconds for the steps that ran, submitted is the number of
+    answer records sent, error is None or the reason the student stopped.
+    """
+    rng = random.Random(seed * 1000003 + student_id)
+    timings = {}
+    catalog = portal.store.snapshot["catalog"]
+    started = time.perf_counter()
+
+    t = time.perf_counter()
+    courses = catalog.courses_for_student(student_id)
+    timings["courses"] = time.perf_counter() - t
+    if not courses:
+        return timings, 0, "no courses"
+    if think_seconds:
+        time.sleep(rng.uniform(0, think_seconds))
+
+    t = time.perf_counter()
+    exam_ids = catalog.exams_for_course(rng.choice(courses)[0])
+    if not exam_ids:
+        return timings, 0, "no exam"
+    exam_id = rng.choice(exam_ids)
+    catalog.exam(exam_id)
+    question_ids = catalog.exam_question_ids(exam_id)
+    bundle = catalog.question_bundle(exam_id)
+    timings["start_exam"] = time.perf_counter() - t
+    if think_seconds:
+        time.sleep(rng.uniform(0, think_seconds))
+
+    answers = {qid: None for qid in question_ids}
+    for entry in bundle:
+        if entry.choices:
+            answers[entry.question_id] = rng.choice(entry.choices)
+
+    t = time.perf_counter()
+    records = build_answer_records(student_id, exam_id, answers)
+    _, failed = submit_records(records, portal.fb_post, portal.fb_patch, mode=portal.submit_mode)
+    timings["submit"] = time.perf_counter() - t
+    timings["total"] = time.perf_counter() - started
+    if failed:
+        return timings, len(records), f"{len(failed)} answers not submitted"
+    return timings, len(records), None
+
+
+# --- Report ---
+def summarize(step_seconds, errors):
+    """Returns {step: {count, errors, p50_ms, p95_ms, p99_ms, max_ms}}."""
+    summary = {}
+    for step in STEPS:
+        values = [s * 1000 for s in step_seconds.get(step, [])]
+        summary[step] = {
+            "count": len(values),
+            "errors": errors.get(step, 0),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(max(values), 2) if values else 0.0,
+        }
+    return summary
+
+
+def format_report(result):
+    lines = [f"Load test: {result['students']} students on {result['portals']} portal instance(s) in one process, "
+             f"data mode {result['data_mode']}, submit mode {result['submit_mode']}, "
+             f"stub latency {result['latency_ms']} ms",
+             f"  {'step':<14}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+    for step, s in result["steps"].items():
+        lines.append(f"  {step:<14}{s['count']:>7}{s['errors']:>8}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}"
+                     f"{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    lines.append(f"  wall {result['wall_seconds']:.2f} s, {result['students_per_second']:.1f} students/s, "
+                 f"CPU of all portals {result['portal_cpu_seconds']:.2f} s")
+    lines.append("Firebase requests from the portals:")
+    for method, s in sorted(result["client_requests"].items()):
+        lines.append(f"  {method:<7}{s['requests']:>8} requests  {s['errors']:>4} errors  {s['retries']:>4} retries  "
+                     f"avg {s['avg_ms']:7.1f} ms  max {s['max_ms']:8.1f} ms  "
+                     f"{(s['bytes_sent'] + s['bytes_received']) / 1048576:8.2f} MB")
+    server = result["server"]
+    peak_rss = "n/a" if server["max_rss_mb"] is None else f"{server['max_rss_mb']:.1f} MB"  # no resource module on Windows
+    lines.append(f"Stub server: {sum(server['requests'].values())} requests {server['requests']}, "
+                 f"CPU {server['cpu_seconds']:.2f} s, peak RSS {peak_rss}")
+    lines.append(f"student_answers written: {result['answers_written']} of {result['answers_expected']} submitted")
+    return "\n".join(lines)
+
+
+def run(students=200, portals=1, data_mode="full", submit_mode="batch", latency_ms=0,
+        ramp_seconds=0.0, think_seconds=0.0, questions=5000, seed=7, url=None):
+    """Runs one load test and returns the result dict that format_report() renders."""
+    process = None
+    if url is None:
+        seed_data = synthetic_collections(questions=questions, students=students, seed=seed)
+        process, url = start_stub(seed_data, latency_ms)
+    try:
+        before = stub_stats(url)
+        answers_before = _count_answers(url)
+        portal_list = [Portal(url, data_mode, submit_mode) for _ in range(portals)]
+        step_seconds = {"portal_start": [p.start_seconds for p in portal_list]}
+        errors = {}
+        answers_expected = 0
+
+        def student(i):
+            if ramp_seconds:
+                time.sleep(ramp_seconds * i / students)
+            return run_student(portal_list[i % portals], i + 1, think_seconds, seed)
+
+        cpu_before = _cpu_seconds()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=students) as pool:
+            outcomes = list(pool.map(student, range(students)))
+        wall = time.perf_counter() - started
+        portal_cpu = _cpu_seconds() - cpu_before
+
+        for timings, submitted, error in outcomes:
+            for step, seconds in timings.items():
+                step_seconds.setdefault(step, []).append(seconds)
+            if error:
+                failed_step = next((s for s in STEPS[1:] if s not in timings), "submit")
+                errors[failed_step] = errors.get(failed_step, 0) + 1
+            answers_expected += submitted
+
+        after = stub_stats(url)
+        answers_written = _count_answers(url) - answers_before
+        client_requests = {}
+        for p in portal_list:
+            for method, s in p.client.stats.snapshot().items():
+                total = client_requests.setdefault(method, {"requests": 0, "errors": 0, "retries": 0,
+                                                            "bytes_sent": 0, "bytes_received": 0,
+                                                            "total_ms": 0.0, "max_ms": 0.0})
+                for key in ("requests", "errors", "retries", "bytes_sent", "bytes_received"):
+                    total[key] += s[key]
+                total["total_ms"] += s["avg_ms"] * s["requests"]
+                total["max_ms"] = max(total["max_ms"], s["max_ms"])
+            p.client.close()
+        for s in client_requests.values():
+            s["avg_ms"] = round(s.pop("total_ms") / s["requests"], 2) if s["requests"] else 0.0
+        return {
+            "students": students, "portals": portals, "data_mode": data_mode,
+            "submit_mode": submit_mode, "latency_ms": latency_ms,
+            "steps": summarize(step_seconds, errors),
+            "wall_seconds": round(wall, 3),
+            "students_per_second": round(students / wall, 2) if wall else 0.0,
+            "portal_cpu_seconds": round(portal_cpu, 3),
+            "client_requests": client_requests,
+            "server": {
+                "requests": {m: n - before["requests"].get(m, 0) for m, n in after["requests"].items()},
+                "cpu_seconds": round(after["cpu_seconds"] - before["cpu_seconds"], 3),
+                "max_rss_mb": after["max_rss_mb"],
+            },
+            "answers_written": answers_written,
+            "answers_expected": answers_expected,
+        }
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-examinee load test against a stub Firebase server")
+    parser.add_argument("--students", type=int, default=200, help="simulated students, all running at once")
+    parser.add_argument("--portals", type=int, default=1, help="simulated portal instances (each with its own client and catalog), all in this process")
+    parser.add_argument("--data-mode", choices=("full", "lazy"), default="full")
+    parser.add_argument("--submit-mode", choices=("batch", "sequential"), default="batch")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay the stub adds to every request")
+    parser.add_argument("--ramp-seconds", type=float, default=0, help="spread the student start times over this period")
+    parser.add_argument("--think-seconds", type=float, default=0, help="max random pause between steps")
+    parser.add_argument("--questions", type=int, default=5000, help="size of the synthetic question bank")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--url", help="use an already running stub server instead of starting one")
+    parser.add_argument("--json", metavar="FILE", help="also write the results to this file")
+    args = parser.parse_args()
+
+    result = run(args.students, args.portals, args.data_mode, args.submit_mode, args.latency_ms,
+                 args.ramp_seconds, args.think_seconds, args.questions, args.seed, args.url)
+    print(format_report(result))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+memory_report.py
+Measures how much memory the exam catalog takes per portal process in the old
+dict-of-dicts form (the id maps copied from Firebase) and in the compact form
+of exam_portal.compact, built from the same collections.
+Usage:
+  python -m exam_portal.memory_report --synthetic 20000
+  python -m exam_portal.memory_report --firebase https://...firebaseio.com
+"""
+
+import argparse
+import sys
+
+from exam_portal.loader import COLLECTIONS, ID_MAPS, normalize_collection
+
+
+def deep_sizeof(obj, seen=None):
+    """Bytes held by obj and everything it references (shared objects counted once)."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += deep_sizeof(k, seen) + deep_sizeof(v, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_sizeof(item, seen)
+    elif hasattr(obj, "__slots__"):
+        for slot in obj.__slots__:
+            size += deep_sizeof(getattr(obj, slot, None), seen)
+    return size
+
+
+def memory_report(raw_collections):
+    """
+    Compares the resident size of the dict-of-dicts id maps (what the catalog used to
+    hold) with the compact parts built from the same raw collections.
+    Returns a list of (collection, dict_bytes, compact_bytes).
+    """
+    rows = []
+    for name in COLLECTIONS:
+        raw = raw_collections.get(name) or {}
+        id_map = ID_MAPS[name](raw)
+        part = normalize_collection(name, raw)
+        rows.append((name, deep_sizeof(id_map), deep_sizeof(part)))
+    return rows
+
+
+def format_memory_report(rows):
+    lines = [f"{'collection':<24} {'dict-of-dicts':>14} {'compact':>12} {'saved':>7}"]
+    for name, before, after in rows + [("TOTAL", sum(r[1] for r in rows), sum(r[2] for r in rows))]:
+        saved = (1 - after / before) * 100 if before else 0.0
+        lines.append(f"{name:<24} {before / 1048576:11.2f} MB {after / 1048576:9.2f} MB {saved:6.1f}%")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory used by the exam catalog: dict-of-dicts vs compact")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--synthetic", type=int, metavar="QUESTIONS",
+                        help="generate a synthetic question bank of this size")
+    source.add_argument("--firebase", metavar="URL", help="download the collections from this database")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from exam_portal.synthetic import synthetic_collections
+        raw = synthetic_collections(questions=args.synthetic)
+    else:
+        from firebase_client import FirebaseClient
+        client = FirebaseClient(args.firebase, timeout=(10, 300))
+        raw = {name: client.get(name) or {} for name in COLLECTIONS}
+
+    print(format_memory_report(memory_report(raw)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+paging.py
+Splits an exam's question bundle into pages so the exam form only builds the
+widgets of the page being shown; answers of the other pages live in session state.
+"""
+
+
+def paginate(entries, page, page_size):
+    """
+    Returns (offset, page_entries, page, page_count) for the 0-based page, clamped to
+    the pages that exist. A page_size of 0 puts every entry on a single page.
+    """
+    if page_size <= 0 or len(entries) <= page_size:
+        return 0, entries, 0, 1
+    page_count = -(-len(entries) // page_size)
+    page = min(max(page, 0), page_count - 1)
+    offset = page * page_size
+    return offset, entries[offset:offset + page_size], page, page_count
+
+
+def answered_count(answers):
+    """Number of questions with a non-empty answer."""
+    return sum(1 for ans in answers.values() if ans is not None and ans != "")
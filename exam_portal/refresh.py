@@ -0,0 +1,144 @@
+"""
+refresh.py
+Keeps the portal's cached exam catalog up to date without restarting Streamlit.
+A background thread revalidates the collections every few seconds and
+re-downloads only the ones that changed:
+  1. SendDatabaseDataApp.py stamps meta/versions/<collection> after each export,
+     so one tiny GET of meta/versions tells which collections changed.
+  2. Without that node, each collection is fetched with X-Firebase-ETag: true
+     and only rebuilt when its ETag differs from the one we already hold. Firebase
+     ignores If-None-Match on GET, so this still downloads every collection: it runs
+     every etag_refresh_seconds (an hour by default) instead of every refresh_seconds,
+     and a log line says periodic refresh is degraded until meta/versions exists.
+The new catalog is built on the side and swapped in with a single assignment,
+so pages reading CatalogStore.snapshot are never blocked.
+"""
+
+import threading
+import time
+
+from exam_portal.catalog import LAZY_INDEXES, LazyExamCatalog
+from exam_portal.loader import COLLECTIONS, build_snapshot, format_timings, load_collections
+
+VERSIONS_PATH = "meta/versions"
+
+
+class CatalogStore:
+    """
+    Owns the current catalog snapshot (the dict load_all_data() returns).
+    fetch(path, params=None) is the page's fb_get; the FirebaseClient is used for the
+    ETag-validated downloads, which need the response headers.
+    """
+
+    def __init__(self, client, fetch, lazy=False, refresh_seconds=60, max_workers=None, etag_refresh_seconds=3600):
+        self.client = client
+        self.fetch = fetch
+        self.lazy = lazy
+        self.refresh_seconds = refresh_seconds
+        self.etag_refresh_seconds = etag_refresh_seconds  # full re-download without meta/versions; 0 disables it
+        self.max_workers = max_workers
+        self._collections = {}
+        self._etags = {}
+        self.load_timings = {}
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._downloaded_at = time.monotonic()
+        self._versions_missing_logged = False
+
+        self._versions = self._read_versions()
+        if refresh_seconds and not self._versions:
+            self._warn_without_versions()
+        if lazy:
+            self._snapshot = {"catalog": LazyExamCatalog(fetch)}
+        else:
+            loaded = self._download(COLLECTIONS)
+            self._collections = {name: loaded.get(name) or {} for name in COLLECTIONS}
+            self._snapshot = build_snapshot(self._collections)
+            print(format_timings(self.load_timings))
+
+        if refresh_seconds:
+            threading.Thread(target=self._run, name="catalog-refresh", daemon=True).start()
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def stop(self):
+        self._stop.set()
+
+    # --- Downloads ---
+    def _read_versions(self):
+        versions = self.fetch(VERSIONS_PATH)
+        return versions if isinstance(versions, dict) else {}
+
+    def _download(self, names, only_if_changed=False):
+        """
+        Downloads collections in parallel and returns {name: compact part} for those that loaded.
+        With only_if_changed, collections whose ETag is the one we hold are left out.
+        """
+        results, timings = load_collections(self.client, names,
+                                            etags=self._etags if only_if_changed else None,
+                                            max_workers=self.max_workers)
+        self.load_timings = timings
+        loaded = {}
+        for name, (part, etag) in results.items():
+            self._etags[name] = etag
+            if part is not None:
+                loaded[name] = part
+        return loaded
+
+    # --- Revalidation ---
+    def _warn_without_versions(self):
+        """Said once: without meta/versions, refresh is not incremental."""
+        self._versions_missing_logged = True
+        print("WARNING: no meta/versions in Firebase (run SendDatabaseDataApp.py to publish it), so catalog "
+              "refresh is not incremental: "
+              + ("it is disabled." if self.lazy or not self.etag_refresh_seconds else
+                 f"every collection is downloaded whole every {self.etag_refresh_seconds:g} s instead."))
+
+    def refresh(self):
+        """Revalidates every collection once. Returns the names of the collections that changed."""
+        with self._refresh_lock:
+            versions = self._read_versions()
+            if versions:
+                watched = COLLECTIONS + LAZY_INDEXES if self.lazy else COLLECTIONS
+                changed = [name for name in watched if versions.get(name) != self._versions.get(name)]
+                if not changed:
+                    return []
+                if self.lazy:
+                    # The lazy catalog caches records from every collection; start a fresh one
+                    self._snapshot = {"catalog": LazyExamCatalog(self.fetch)}
+                    self._versions = versions
+                    return changed
+                updated = self._download(changed)
+                for name in updated:
+                    self._versions[name] = versions.get(name)
+            else:
+                # Without meta/versions the only check is a full download (the ETag saves the rebuild,
+                # not the transfer), which lazy mode avoids and full mode runs rarely
+                if not self._versions_missing_logged:
+                    self._warn_without_versions()
+                if self.lazy or not self.etag_refresh_seconds:
+                    return []
+                if time.monotonic() - self._downloaded_at < self.etag_refresh_seconds:
+                    return []
+                self._downloaded_at = time.monotonic()
+                updated = self._download(COLLECTIONS, only_if_changed=True)
+
+            if not updated:
+                return []
+            collections = dict(self._collections)
+            collections.update(updated)
+            snapshot = build_snapshot(collections)
+            # Readers keep using the old snapshot until this single assignment
+            self._collections = collections
+            self._snapshot = snapshot
+            print(f"Catalog refreshed: {sorted(updated)}")
+            return sorted(updated)
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Catalog refresh failed, keeping the current catalog: {e}")
@@ -0,0 +1,94 @@
+"""
+submission.py
+Builds the /student_answers records for a finished exam and writes them to Firebase.
+"batch" mode writes the whole exam in one multi-path PATCH at the database root,
+using push keys generated on our side; "sequential" mode is the original one POST per answer.
+"""
+
+import time
+
+from firebase_client import new_push_id
+
+
+# --- Records ---
+def _as_int(value):
+    return int(value) if str(value).isdigit() else value
+
+
+def build_answer_records(student_id, exam_id, answers):
+    """Returns one /student_answers record per question of the exam."""
+    submitted_at = int(time.time())
+    records = []
+    for qid, ans in answers.items():
+        records.append({
+            "Exam_ID": _as_int(exam_id),
+            "Question_ID": _as_int(qid),
+            "Student_ID": _as_int(student_id),
+            "Student_Answer": ans if ans is not None else "N/A",  # Store "N/A" if unanswered
+            "Submitted_At": submitted_at
+        })
+    return records
+
+
+# --- Writers ---
+def submit_sequential(records, fb_post):
+    """One POST per record. Returns (push_keys, failed_question_ids)."""
+    keys, failed = [], []
+    for rec in records:
+        res = fb_post("student_answers", rec)
+        if res:
+            keys.append(res.get("name"))  # Get the push key from Firebase
+        else:
+            failed.append(rec["Question_ID"])
+    return keys, failed
+
+
+def submit_batch(records, fb_patch, push_ids=None):
+    """
+    Writes all records in one multi-path PATCH:
+      {"student_answers/<push key>": record, ...}
+    Firebase applies a multi-path update atomically and echoes the written data back,
+    so every path missing from the response is reported as a failed question.
+    push_ids (one per record) reuses the keys of an earlier attempt; new ones otherwise.
+    Returns (push_keys, failed_question_ids).
+    """
+    if push_ids is None:
+        push_ids = [new_push_id() for _ in records]
+    updates = {}
+    for push_id, rec in zip(push_ids, records):
+        updates[f"student_answers/{push_id}"] = rec
+
+    res = fb_patch("", updates)
+    if not isinstance(res, dict):
+        return [], [rec["Question_ID"] for rec in records]
+
+    keys, failed = [], []
+    for path, rec in updates.items():
+        if path in res:
+            keys.append(path.split("/", 1)[1])
+        else:
+            failed.append(rec["Question_ID"])
+    return keys, failed
+
+
+def submit_records(records, fb_post, fb_patch, mode="batch", retries=2):
+    """
+    Submits an exam's answer records. In batch mode, answers the PATCH did not confirm
+    are PATCHed again (up to `retries` times) under the same push keys: a write that
+    landed without its response reaching us is overwritten, never duplicated.
+    Returns (push_keys, failed_question_ids).
+    """
+    if mode != "batch":
+        return submit_sequential(records, fb_post)
+
+    push_ids = [new_push_id() for _ in records]
+    keys, failed = submit_batch(records, fb_patch, push_ids)
+    for _ in range(retries):
+        if not failed:
+            break
+        print(f"Batch submit did not confirm {len(failed)} answers, retrying them under the same keys.")
+        failed_ids = set(failed)
+        retry = [(push_id, rec) for push_id, rec in zip(push_ids, records) if rec["Question_ID"] in failed_ids]
+        retry_keys, failed = submit_batch([rec for _, rec in retry], fb_patch, [push_id for push_id, _ in retry])
+        keys.extend(retry_keys)
+    return keys, failed
@@ -0,0 +1,83 @@
+"""
+synthetic.py
+Generates exam collections shaped like the ones SendDatabaseDataApp.py exports,
+for memory reports, load tests and seeding the stub Firebase server.
+Sizes default to one ITI intake: a few thousand students on ~40 courses.
+"""
+
+import random
+
+QUESTION_TYPES = ("MCQ", "True/False")
+WORDS = ("query", "index", "table", "join", "python", "network", "memory", "function", "class",
+         "linux", "cloud", "model", "server", "schema", "stream", "cache", "thread", "process")
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _bundle(data, eid):
+    """exam_bundles/<eid> as SendDatabaseDataApp.py publishes it (no model answers)."""
+    exam = data["exams"][str(eid)]
+    questions = []
+    for qid in data["exam_questions_grouped"][str(eid)]:
+        q = data["questions"][str(qid)]
+        questions.append({"Question_ID": qid, "Course_ID": q["Course_ID"], "Question_Type": q["Question_Type"],
+                          "Question_Description": q["Question_Description"],
+                          "Choices": [c["Choice_Text"] for c in data["choices_by_question"][str(qid)]]})
+    return {"Exam_ID": eid, "Course_ID": exam["Course_ID"], "Exam_Duration_Minutes": exam["Exam_Duration_Minutes"],
+            "Exam_Type": exam["Exam_Type"], "Questions": questions}
+
+
+def synthetic_collections(questions=20000, courses=40, students=3000, courses_per_student=4,
+                          exams_per_course=3, questions_per_exam=20, choices_per_mcq=4, seed=7):
+    """Returns {collection name: raw JSON} for a synthetic question bank."""
+    rng = random.Random(seed)
+    data = {name: {} for name in ("courses", "student_courses", "exams", "questions",
+                                  "exam_questions_grouped", "choices_by_question", "exam_bundles",
+                                  "student_course_index")}
+
+    for cid in range(1, courses + 1):
+        data["courses"][str(cid)] = {"Course_ID": cid, "Course_Name": f"Course {cid} {_sentence(rng, 2)}"}
+
+    questions_by_course = {}
+    choice_id = 0
+    for qid in range(1, questions + 1):
+        cid = rng.randint(1, courses)
+        qtype = rng.choice(QUESTION_TYPES)
+        if qtype == "MCQ":
+            texts = [_sentence(rng, 3) for _ in range(choices_per_mcq)]
+        else:
+            texts = ["True", "False"]
+        choices = []
+        for text in texts:
+            choice_id += 1
+            choices.append({"Question_Choice_ID": choice_id, "Question_ID": qid, "Choice_Text": text})
+        data["questions"][str(qid)] = {
+            "Question_ID": qid, "Course_ID": cid, "Question_Type": qtype,
+            "Question_Description": f"{_sentence(rng, 12)}?",
+            "Question_Model_Answer": rng.choice(texts),
+        }
+        data["choices_by_question"][str(qid)] = choices
+        questions_by_course.setdefault(cid, []).append(qid)
+
+    eid = 0
+    for cid in range(1, courses + 1):
+        pool = questions_by_course.get(cid, [])
+        for _ in range(exams_per_course):
+            eid += 1
+            data["exams"][str(eid)] = {"Exam_ID": eid, "Course_ID": cid, "Instructor_ID": rng.randint(1, 50),
+                                       "Exam_Date": "2026-06-01", "Exam_Duration_Minutes": 30,
+                                       "Exam_Type": rng.choice(("Exam", "Corrective"))}
+            data["exam_questions_grouped"][str(eid)] = rng.sample(pool, min(questions_per_exam, len(pool)))
+            if data["exam_questions_grouped"][str(eid)]:
+                data["exam_bundles"][str(eid)] = _bundle(data, eid)
+
+    for sid in range(1, students + 1):
+        cids = rng.sample(range(1, courses + 1), min(courses_per_student, courses))
+        for cid in cids:
+            data["student_courses"][f"{sid}_{cid}"] = {"Student_ID": sid, "Course_ID": cid}
+        # student_course_index/<sid> as SendDatabaseDataApp.py publishes it
+        data["student_course_index"][str(sid)] = [
+            {"Course_ID": cid, "Course_Name": data["courses"][str(cid)]["Course_Name"]} for cid in sorted(cids)]
+    return data
@@ -0,0 +1,11 @@
+"""
+firebase_client
+Pooled Firebase Realtime Database REST client used by every script in this project:
+the exam portal pages, SendDatabaseDataApp.py and ReceiveFireBaseDataApp.py.
+firebase_client.stub_server is a local stand-in for the REST API.
+"""
+
+from firebase_client.client import FirebaseClient, RequestStats
+from firebase_client.push_ids import new_push_id, push_id_floor, push_id_time
+
+__all__ = ["FirebaseClient", "RequestStats", "new_push_id", "push_id_floor", "push_id_time"]
@@ -0,0 +1,242 @@
+"""
+client.py
+Firebase Realtime Database REST client shared by the exam portal pages and the
+SQL Server <-> Firebase sync scripts.
+One requests.Session per client keeps TCP/TLS connections alive between calls,
+failed calls are retried with jittered exponential backoff, every call has a
+timeout, and per-method request/latency counters are kept in client.stats.
+stream() subscribes to a location with the REST streaming protocol (server-sent events).
+"""
+
+import json as jsonlib
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+# Status codes worth retrying: throttling and transient server errors
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RequestStats:
+    """Thread-safe request counters: calls, errors, retries and latencies per HTTP method."""
+
+    def __init__(self, keep_latencies=10000):
+        self._lock = threading.Lock()
+        self._keep = keep_latencies
+        self._methods = {}
+
+    def _entry(self, method):
+        entry = self._methods.get(method)
+        if entry is None:
+            entry = {"requests": 0, "errors": 0, "retries": 0, "bytes_sent": 0, "bytes_received": 0,
+                     "total_seconds": 0.0, "max_seconds": 0.0, "latencies": deque(maxlen=self._keep)}
+            self._methods[method] = entry
+        return entry
+
+    def record(self, method, seconds, ok, bytes_sent=0, bytes_received=0):
+        with self._lock:
+            entry = self._entry(method)
+            entry["requests"] += 1
+            entry["errors"] += 0 if ok else 1
+            entry["bytes_sent"] += bytes_sent
+            entry["bytes_received"] += bytes_received
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["latencies"].append(seconds)
+
+    def record_retry(self, method):
+        with self._lock:
+            self._entry(method)["retries"] += 1
+
+    def latencies(self, method=None):
+        """Recent latencies (seconds) of one method, or of all methods."""
+        with self._lock:
+            if method:
+                return list(self._methods.get(method, {}).get("latencies", []))
+            return [s for entry in self._methods.values() for s in entry["latencies"]]
+
+    def snapshot(self):
+        """Returns {method: {requests, errors, retries, bytes_*, avg_ms, max_ms}}."""
+        with self._lock:
+            result = {}
+            for method, entry in self._methods.items():
+                count = entry["requests"]
+                result[method] = {
+                    "requests": count,
+                    "errors": entry["errors"],
+                    "retries": entry["retries"],
+                    "bytes_sent": entry["bytes_sent"],
+                    "bytes_received": entry["bytes_received"],
+                    "avg_ms": round(entry["total_seconds"] / count * 1000, 2) if count else 0.0,
+                    "max_ms": round(entry["max_seconds"] * 1000, 2),
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._methods = {}
+
+
+class FirebaseClient:
+    """
+    Usage:
+        client = FirebaseClient(os.getenv("FIREBASE_URL"))
+        courses = client.get("courses")
+        client.patch("", {"student_answers/<key>": record})
+    get/put/patch/post/delete return the decoded JSON body and raise
+    requests.exceptions.RequestException (HTTPError for bad status codes) on failure.
+    """
+
+    def __init__(self, base_url, auth=None, timeout=(5, 30), retries=3, backoff=0.5,
+                 max_backoff=10.0, pool_size=32):
+        if not base_url:
+            raise ValueError("FirebaseClient needs the database URL (FIREBASE_URL)")
+        self.base_url = base_url.rstrip("/")
+        self.auth = auth
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = RequestStats()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, path):
+        path = str(path).strip("/")
+        return f"{self.base_url}/{path}.json" if path else f"{self.base_url}/.json"
+
+    def _sleep_before_retry(self, attempt, response=None):
+        # Full jitter: a random wait up to the exponential step, so clients do not retry in lockstep.
+        # Retry-After is the lower bound: the jitter only spreads the wait above it.
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        retry_after = 0
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            retry_after = int(response.headers["Retry-After"])
+            delay = max(delay, retry_after)
+        time.sleep(retry_after + random.uniform(0, delay - retry_after))
+
+    def request(self, method, path, params=None, json=None, headers=None, timeout=None, stream=False, data=None):
+        """
+        Sends one REST call, retrying connection errors, timeouts, 429 and 5xx responses.
+        data is an already serialized JSON body (bytes), sent as is instead of json.
+        POST is not idempotent (every call creates a new push key), so it is only
+        retried when the request never reached the server or was throttled.
+        Returns the requests.Response; raises HTTPError once retries are exhausted.
+        """
+        params = dict(params or {})
+        if self.auth:
+            params["auth"] = self.auth
+        url = self.url(path)
+        if data is not None:
+            headers = {"Content-Type": "application/json", **(headers or {})}
+        idempotent = method.upper() != "POST"
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                r = self.session.request(method, url, params=params, json=json, data=data, headers=headers,
+                                         timeout=timeout or self.timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.stats.record(method, time.perf_counter() - started, ok=False)
+                never_sent = isinstance(e, requests.exceptions.ConnectTimeout)
+                if attempt >= self.retries or not (idempotent or never_sent):
+                    raise
+                self.stats.record_retry(method)
+                self._sleep_before_retry(attempt)
+                attempt += 1
+                continue
+
+            elapsed = time.perf_counter() - started
+            sent = len(r.request.body or b"") if r.request is not None else 0
+            received = 0 if stream else len(r.content)
+            retryable = r.status_code in RETRY_STATUS and (idempotent or r.status_code == 429)
+            self.stats.record(method, elapsed, ok=r.ok, bytes_sent=sent, bytes_received=received)
+            if retryable and attempt < self.retries:
+                self.stats.record_retry(method)
+                self._sleep_before_retry(attempt, r)
+                attempt += 1
+                continue
+            r.raise_for_status()
+            return r
+
+    # --- JSON helpers ---
+    def get(self, path, params=None, **kwargs):
+        return self.request("GET", path, params=params, **kwargs).json()
+
+    def put(self, path, payload, **kwargs):
+        return self.request("PUT", path, json=payload, **kwargs).json()
+
+    def patch(self, path, payload, **kwargs):
+        return self.request("PATCH", path, json=payload, **kwargs).json()
+
+    def post(self, path, payload, **kwargs):
+        return self.request("POST", path, json=payload, **kwargs).json()
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs).json()
+
+    # --- Streaming ---
+    def stream(self, path, params=None, read_timeout=90):
+        """
+        Subscribes to path with Accept: text/event-stream and yields (event, data) as the
+        server sends them: "put" / "patch" with data {"path": ..., "data": ...}, "keep-alive",
+        "cancel" and "auth_revoked". Firebase sends a keep-alive every 30 s, so read_timeout
+        only fires on a dead connection. Returns when the server closes the stream; raises
+        requests.exceptions.RequestException when the connection fails or drops.
+        """
+        headers = {"Accept": "text/event-stream", "Accept-Encoding": "identity"}
+        timeout = (self.timeout[0] if isinstance(self.timeout, tuple) else self.timeout, read_timeout)
+        r = self.request("GET", path, params=params, headers=headers, timeout=timeout, stream=True)
+        try:
+            event, data_lines = None, []
+            for line in _event_stream_lines(r.raw):
+                if not line:  # a blank line ends the event
+                    if event is not None:
+                        data = jsonlib.loads("\n".join(data_lines)) if data_lines else None
+                        yield event, data
+                    event, data_lines = None, []
+                elif line.startswith(":"):  # comment
+                    continue
+                else:
+                    field, _, value = line.partition(":")
+                    value = value[1:] if value.startswith(" ") else value
+                    if field == "event":
+                        event = value
+                    elif field == "data":
+                        data_lines.append(value)
+        except urllib3.exceptions.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e) from e
+        finally:
+            r.close()
+
+    def close(self):
+        self.session.close()
+
+
+def _event_stream_lines(raw):
+    """Splits a streamed response body into text lines as soon as each one arrives."""
+    # read1 returns whatever is available instead of waiting for a full buffer (urllib3 >= 2)
+    read = raw.read1 if hasattr(raw, "read1") else (lambda size: raw.read(1))
+    pending = []  # pieces of the line being received (the initial put can be megabytes long)
+    while True:
+        chunk = read(65536)
+        if not chunk:
+            return
+        parts = chunk.split(b"\n")
+        if len(parts) == 1:
+            pending.append(chunk)
+            continue
+        pending.append(parts[0])
+        yield b"".join(pending).rstrip(b"\r").decode("utf-8")
+        for line in parts[1:-1]:
+            yield line.rstrip(b"\r").decode("utf-8")
+        pending = [parts[-1]]
@@ -0,0 +1,67 @@
+"""
+push_ids.py
+Client-side generation of Firebase push keys.
+"""
+
+import random
+import threading
+import time
+
+# Same alphabet and layout as the keys Firebase generates for POST: 8 chars of
+# millisecond timestamp followed by 12 random chars, so our keys sort in
+# submission order together with the server-generated ones.
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+_push_lock = threading.Lock()
+_last_push_time = 0
+_last_rand_chars = [0] * 12
+
+
+def new_push_id(now_ms=None):
+    """Returns a new chronologically ordered Firebase push key."""
+    global _last_push_time, _last_rand_chars
+    now = int(time.time() * 1000) if now_ms is None else int(now_ms)
+    with _push_lock:
+        duplicate_time = now == _last_push_time
+        _last_push_time = now
+
+        time_chars = []
+        for _ in range(8):
+            time_chars.append(PUSH_CHARS[now % 64])
+            now //= 64
+        time_part = "".join(reversed(time_chars))
+
+        if not duplicate_time:
+            _last_rand_chars = [random.randrange(64) for _ in range(12)]
+        else:
+            # Same millisecond: increment the random part so keys stay unique and ordered
+            i = 11
+            while i >= 0 and _last_rand_chars[i] == 63:
+                _last_rand_chars[i] = 0
+                i -= 1
+            if i >= 0:
+                _last_rand_chars[i] += 1
+        return time_part + "".join(PUSH_CHARS[c] for c in _last_rand_chars)
+
+
+def push_id_time(key):
+    """Returns the millisecond timestamp encoded in a push key, or None if key is not one."""
+    if not isinstance(key, str) or len(key) != 20:
+        return None
+    ms = 0
+    for ch in key[:8]:
+        value = PUSH_CHARS.find(ch)
+        if value < 0:
+            return None
+        ms = ms * 64 + value
+    return ms
+
+
+def push_id_floor(ms):
+    """Smallest push key that can be generated at millisecond ms (for startAt queries by time)."""
+    ms = max(0, int(ms))
+    time_chars = []
+    for _ in range(8):
+        time_chars.append(PUSH_CHARS[ms % 64])
+        ms //= 64
+    return "".join(reversed(time_chars)) + PUSH_CHARS[0] * 12
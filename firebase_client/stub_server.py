@@ -0,0 +1,481 @@
+"""
+stub_server.py
+Local stand-in for the Firebase Realtime Database REST API, for trying the portal
+and the sync scripts (and load-testing them) without touching the real database.
+Keeps one JSON tree in memory and supports what this project uses:
+  GET    with shallow, orderBy ($key / $value / "<child>"), equalTo, startAt, endAt,
+         limitToFirst, limitToLast, and X-Firebase-ETag
+  PUT / POST / DELETE, PATCH including multi-path updates ("a/b/c": value)
+  {".sv": "timestamp"} server values
+  GET with Accept: text/event-stream -> streaming (put / patch / keep-alive events)
+  GET /__stub__/stats  -> request counts, CPU seconds and peak RSS of the server
+  fail_next(status, times, headers)  -> the next requests get that error instead
+                                        (429 with Retry-After, 503...), for retry tests
+Usage:
+  python -m firebase_client.stub_server --port 9000 --seed seed.json
+  then set FIREBASE_URL=http://127.0.0.1:9000
+or in Python:
+  server = StubFirebaseServer(seed).start(); FirebaseClient(server.url) ...; server.stop()
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+try:
+    import resource  # peak RSS; Unix only
+except ImportError:
+    resource = None
+
+from firebase_client.push_ids import new_push_id
+
+
+# --- JSON tree helpers ---
+def _split(path):
+    return [unquote(p) for p in path.strip("/").split("/") if p]
+
+
+def _resolve_server_values(value):
+    if isinstance(value, dict):
+        if value.get(".sv") == "timestamp" and len(value) == 1:
+            return int(time.time() * 1000)
+        return {str(k): _resolve_server_values(v) for k, v in value.items()}
+    if isinstance(value, list):
+        # Firebase stores arrays as objects keyed by index
+        return {str(i): _resolve_server_values(v) for i, v in enumerate(value) if v is not None}
+    return value
+
+
+def _prune(value):
+    """Drops nulls and empty objects, as Firebase does."""
+    if isinstance(value, dict):
+        pruned = {k: _prune(v) for k, v in value.items()}
+        pruned = {k: v for k, v in pruned.items() if v is not None and v != {}}
+        return pruned or None
+    return value
+
+
+def _export(value):
+    """Returns objects whose keys are mostly array indexes as lists, like Firebase does."""
+    if isinstance(value, dict):
+        out = {k: _export(v) for k, v in value.items()}
+        if out and all(k.isdigit() for k in out):
+            top = max(int(k) for k in out)
+            if top < 2 * len(out):
+                return [out.get(str(i)) for i in range(top + 1)]
+        return out
+    return value
+
+
+def _sort_key(value):
+    # Firebase ordering: null < false < true < numbers < strings < objects
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, "")
+
+
+class JsonTree:
+    """The in-memory database. All methods are thread-safe."""
+
+    def __init__(self, data=None):
+        self.lock = threading.RLock()
+        self.root = _prune(_resolve_server_values(data or {})) or {}
+
+    def _node(self, path):
+        node = self.root
+        for part in _split(path):
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def get(self, path):
+        with self.lock:
+            return copy.deepcopy(self._node(path))
+
+    def query(self, path, params):
+        """GET with REST query parameters; only the children that match are copied."""
+        with self.lock:
+            node = self._node(path)
+            if params.get("orderBy"):
+                node = apply_query(node if isinstance(node, dict) else {}, params)
+            if params.get("shallow") == "true" and isinstance(node, dict):
+                return {k: (True if isinstance(v, dict) else v) for k, v in node.items()}
+            return copy.deepcopy(node)
+
+    def _set(self, parts, value):
+        if not parts:
+            self.root = value if isinstance(value, dict) else {}
+            return
+        node = self.root
+        trail = []
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = {}
+                node[part] = child
+            trail.append((node, part))
+            node = child
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+        # Remove parents left empty by this write (only along the written path)
+        for parent, part in reversed(trail):
+            if parent[part]:
+                break
+            del parent[part]
+
+    def put(self, path, value):
+        with self.lock:
+            value = _prune(_resolve_server_values(value))
+            self._set(_split(path), value)
+            return value
+
+    def patch(self, path, updates):
+        """Multi-path update: every key of updates may itself be a path below `path`."""
+        with self.lock:
+            base = _split(path)
+            written = {}
+            for key, value in updates.items():
+                value = _prune(_resolve_server_values(value))
+                self._set(base + _split(key), value)
+                written[key] = value
+            return written
+
+    def post(self, path, value):
+        key = new_push_id()
+        self.put(f"{path}/{key}", value)
+        return key
+
+
+def apply_query(node, params):
+    """Applies Firebase REST query parameters to a node; returns the filtered object."""
+    if not isinstance(node, dict):
+        return node
+    order_by = params.get("orderBy")
+    if order_by == "$key":
+        value_of = lambda kv: kv[0]
+        sort_key = lambda kv: kv[0]
+    elif order_by == "$value":
+        value_of = lambda kv: kv[1]
+        sort_key = lambda kv: _sort_key(kv[1])
+    elif order_by:
+        child = order_by
+        value_of = lambda kv: kv[1].get(child) if isinstance(kv[1], dict) else None
+        sort_key = lambda kv: (_sort_key(value_of(kv)), kv[0])
+    else:
+        return node
+
+    items = list(node.items())
+    if "equalTo" in params:
+        # Filter before sorting: equalTo usually leaves a handful of children
+        items = [kv for kv in items if value_of(kv) == params["equalTo"]]
+    items.sort(key=sort_key)
+    if "startAt" in params:
+        items = [kv for kv in items if _sort_key(value_of(kv)) >= _sort_key(params["startAt"])]
+    if "endAt" in params:
+        items = [kv for kv in items if _sort_key(value_of(kv)) <= _sort_key(params["endAt"])]
+    if "limitToFirst" in params:
+        items = items[:int(params["limitToFirst"])]
+    if "limitToLast" in params:
+        items = items[-int(params["limitToLast"]):] if int(params["limitToLast"]) else []
+    return dict(items)
+
+
+def stream_event(tree, listen_path, params, written_paths, method):
+    """
+    The event a streaming listener on listen_path receives for a write that touched
+    written_paths, as (event, data), or None if the write is outside its location.
+    """
+    base = _split(listen_path)
+    changes = {}
+    for written in written_paths:
+        parts = _split(written)
+        if parts[:len(base)] != base:
+            if base[:len(parts)] == parts:  # an ancestor was written: resend the whole location
+                return "put", {"path": "/", "data": _export(tree.query(listen_path, params))}
+            continue
+        relative = parts[len(base):]
+        if not relative:
+            return "put", {"path": "/", "data": _export(tree.query(listen_path, params))}
+        child = relative[0]
+        if params.get("orderBy") and not apply_query({child: tree.get("/".join(base + [child]))}, params):
+            continue  # the child is outside the listener's query
+        changes["/".join(relative)] = _export(tree.get(written))
+    if not changes:
+        return None
+    if method == "PATCH":
+        return "patch", {"path": "/", "data": changes}
+    (relative, value), = changes.items()
+    return "put", {"path": "/" + relative, "data": value}
+
+
+# --- HTTP layer ---
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real REST endpoint
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _count(self):
+        with self.server.stats_lock:
+            self.server.requests[self.command] = self.server.requests.get(self.command, 0) + 1
+
+    def _send_json(self, status, payload, extra_headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (extra_headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _parse(self):
+        url = urlparse(self.path)
+        path = url.path
+        if not path.endswith(".json"):
+            return None, None
+        params = {}
+        for key, values in parse_qs(url.query).items():
+            value = values[0]
+            if key in ("orderBy", "equalTo", "startAt", "endAt"):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    self._send_json(400, {"error": f"Invalid {key} parameter"})
+                    return None, False
+            params[key] = value
+        return path[:-len(".json")], params
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"null"
+        return json.loads(raw.decode("utf-8") or "null")
+
+    def _handle(self, method):
+        self._count()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.path.startswith("/__stub__/stats"):
+            return self._send_json(200, self.server.stats())
+        fault = self.server.take_fault()
+        if fault is not None:
+            status, headers = fault
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))  # else read as the next request
+            return self._send_json(status, {"error": f"Injected {status}"}, headers)
+        path, params = self._parse()
+        if path is None:
+            if params is None:
+                self._send_json(404, {"error": "Not found"})
+            return
+        tree = self.server.tree
+        try:
+            if method == "GET":
+                return self._get(path, params)
+            body = self._body()
+            if method == "PUT":
+                result = tree.put(path, body)
+            elif method == "PATCH":
+                if not isinstance(body, dict):
+                    return self._send_json(400, {"error": "Invalid data; couldn't parse JSON object."})
+                result = tree.patch(path, body)
+            elif method == "POST":
+                result = {"name": tree.post(path, body)}
+            else:  # DELETE
+                tree.put(path, None)
+                result = None
+            self.server.notify(path, method, body, result)
+            self._send_json(200, _export(result))
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+
+    def _send_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _stream(self, path, params):
+        """Serves a text/event-stream subscription until the client or the server closes it."""
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        # Registered before the initial snapshot so no write is missed (one may arrive twice)
+        events = self.server.add_listener(path, params)
+        try:
+            self._send_event("put", {"path": "/", "data": _export(self.server.tree.query(path, params))})
+            while True:
+                try:
+                    item = events.get(timeout=self.server.keepalive_seconds)
+                except queue.Empty:
+                    self._send_event("keep-alive", None)
+                    continue
+                if item is None:
+                    break
+                self._send_event(*item)
+                if item[0] in ("cancel", "auth_revoked"):
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.server.remove_listener(events)
+
+    def _get(self, path, params):
+        if "text/event-stream" in self.headers.get("Accept", ""):
+            return self._stream(path, params)
+        payload = _export(self.server.tree.query(path, params))
+        headers = {}
+        if self.headers.get("X-Firebase-ETag", "").lower() == "true":
+            headers["ETag"] = hashlib.md5(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+        self._send_json(200, payload, headers)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class StubFirebaseServer(ThreadingHTTPServer):
+    """Threaded HTTP server around a JsonTree. start() serves it from a background thread."""
+
+    daemon_threads = True
+
+    def __init__(self, data=None, host="127.0.0.1", port=0, latency_ms=0, verbose=False,
+                 keepalive_seconds=30):
+        super().__init__((host, port), _Handler)
+        self.tree = JsonTree(data)
+        self.latency = latency_ms / 1000.0
+        self.verbose = verbose
+        self.keepalive_seconds = keepalive_seconds
+        self.stats_lock = threading.Lock()
+        self.requests = {}
+        self.listeners_lock = threading.Lock()
+        self.listeners = {}  # event queue -> (path, params) of each open stream
+        self.faults = []  # (status, headers) answered to the next requests, oldest first
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # --- Fault injection ---
+    def fail_next(self, status, times=1, headers=None):
+        """Answers the next `times` requests with `status` (and headers, e.g. Retry-After)."""
+        with self.stats_lock:
+            self.faults.extend([(status, dict(headers or {}))] * times)
+
+    def take_fault(self):
+        with self.stats_lock:
+            return self.faults.pop(0) if self.faults else None
+
+    # --- Streaming listeners ---
+    def add_listener(self, path, params):
+        events = queue.Queue()
+        with self.listeners_lock:
+            self.listeners[events] = (path, params)
+        return events
+
+    def remove_listener(self, events):
+        with self.listeners_lock:
+            self.listeners.pop(events, None)
+
+    def notify(self, path, method, body, result=None):
+        """Called after every write; queues the matching event for each open stream."""
+        with self.listeners_lock:
+            listeners = list(self.listeners.items())
+        if not listeners:
+            return
+        if method == "PATCH":
+            written = [f"{path}/{key}" for key in body]
+        elif method == "POST":
+            written = [f"{path}/{result['name']}"]
+        else:
+            written = [path]
+        for events, (listen_path, params) in listeners:
+            event = stream_event(self.tree, listen_path, params, written, method)
+            if event:
+                events.put(event)
+
+    def drop_streams(self, event=None):
+        """Closes every open stream, after sending event ("cancel" / "auth_revoked") if given."""
+        with self.listeners_lock:
+            listeners = list(self.listeners)
+        for events in listeners:
+            events.put((event, None) if event else None)
+
+    def stats(self):
+        with self.stats_lock:
+            requests_by_method = dict(self.requests)
+        return {
+            "requests": requests_by_method,
+            "cpu_seconds": round(time.process_time(), 3),
+            # ru_maxrss is in KB on Linux; None where the resource module is missing (Windows)
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) if resource else None,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="stub-firebase", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.drop_streams()
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Firebase Realtime Database REST stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--seed", help="JSON file loaded as the initial database")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every request")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    parser.add_argument("--keepalive-seconds", type=float, default=30, help="keep-alive interval of streams")
+    args = parser.parse_args()
+
+    data = None
+    if args.seed:
+        with open(args.seed, encoding="utf-8") as f:
+            data = json.load(f)
+    server = StubFirebaseServer(data, args.host, args.port, args.latency_ms, args.verbose,
+                                args.keepalive_seconds)
+    print(f"Stub Firebase listening on {server.url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Shared fixtures. The tests import the repo-root packages (exam_portal, firebase_client)
+and the Examweb scripts directly, as the apps do, and run against the local stand-in
+for Firebase (firebase_client.stub_server), never the real database.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "Ahmed Arab" / "Examweb"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from firebase_client import FirebaseClient  # noqa: E402
+from firebase_client.stub_server import StubFirebaseServer  # noqa: E402
+
+
+@pytest.fixture
+def stub():
+    server = StubFirebaseServer(keepalive_seconds=0.2).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(stub):
+    fb = FirebaseClient(stub.url, timeout=(5, 10), retries=3, backoff=0.01, max_backoff=0.05)
+    yield fb
+    fb.close()
@@ -0,0 +1,161 @@
+import time
+
+import pytest
+
+from answer_feed import AnswerFeed, SyncCheckpoint
+from answer_ledger import AnswerLedger
+from answer_shards import shard_of
+from firebase_client import new_push_id
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def write_answers(client, records):
+    """{push key: record} -> student_answers, in one multi-path PATCH like the portals."""
+    client.patch("", {f"student_answers/{key}": record for key, record in records.items()})
+    return sorted(records)
+
+
+def gets(client):
+    return client.stats.snapshot().get("GET", {}).get("requests", 0)
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    return SyncCheckpoint(str(tmp_path / "checkpoint.json"))
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = AnswerLedger(str(tmp_path / "ledger.sqlite3"), expected_keys=10000)
+    yield ledger
+    ledger.close()
+
+
+def commit(feed, ledger, items):
+    keys = [key for key, _ in items]
+    ledger.add_many(keys)
+    feed.commit(keys)
+
+
+# --- Paging and the cursor ---
+def test_poll_pages_through_new_answers_in_key_order(client, checkpoint):
+    keys = write_answers(client, {new_push_id(): {"Exam_ID": i} for i in range(25)})
+    feed = AnswerFeed(client, checkpoint, page_size=10)
+    before = gets(client)
+    assert [key for key, _ in feed.poll()] == keys
+    assert gets(client) - before == 3
+
+
+def test_uncommitted_answers_are_returned_again(client, checkpoint):
+    keys = write_answers(client, {new_push_id(): {"Exam_ID": i} for i in range(5)})
+    feed = AnswerFeed(client, checkpoint)
+    assert [key for key, _ in feed.poll()] == keys
+    assert [key for key, _ in feed.poll()] == keys  # the batch failed: nothing was committed
+    feed.commit(keys)
+    assert feed.poll() == []
+
+
+def test_restart_resumes_after_the_checkpoint(client, checkpoint):
+    start = now_ms() - 60000
+    keys = write_answers(client, {new_push_id(start + i * 1000): {"Exam_ID": i} for i in range(20)})
+    feed = AnswerFeed(client, checkpoint, page_size=7, overlap_ms=0)
+    feed.commit([key for key, _ in feed.poll()][:12])
+    assert checkpoint.last_key == keys[11]
+
+    restarted = AnswerFeed(client, SyncCheckpoint(checkpoint.path), page_size=7, overlap_ms=0)
+    assert restarted.checkpoint.last_key == keys[11]
+    assert [key for key, _ in restarted.poll()] == keys[12:]
+
+
+def test_overlap_window_catches_a_slightly_slow_clock(client, checkpoint):
+    base = now_ms() - 60000
+    first = write_answers(client, {new_push_id(base): {"Exam_ID": 1}})
+    feed = AnswerFeed(client, checkpoint, overlap_ms=5000)
+    feed.commit([key for key, _ in feed.poll()])
+
+    late = write_answers(client, {new_push_id(base - 2000): {"Exam_ID": 2}})  # 2 s behind the cursor
+    assert [key for key, _ in feed.poll()] == late
+    strict = AnswerFeed(client, SyncCheckpoint(checkpoint.path), overlap_ms=0)
+    assert strict.poll() == [] and checkpoint.last_key == first[0]
+
+
+# --- Reconciliation ---
+def test_reconcile_finds_answers_below_the_overlap_window(client, checkpoint, ledger, capsys):
+    base = now_ms() - 60000
+    feed = AnswerFeed(client, checkpoint, overlap_ms=5000, ledger=ledger, reconcile_seconds=600)
+    write_answers(client, {new_push_id(base): {"Exam_ID": 1}})
+    commit(feed, ledger, feed.poll())
+
+    late = write_answers(client, {new_push_id(base - 30000): {"Exam_ID": 2}})  # 30 s behind
+    assert feed.poll() == []  # below every later startAt
+    feed._next_reconcile = 0
+    assert [key for key, _ in feed.poll()] == late
+    assert "1 answer(s) below the cursor" in capsys.readouterr().out
+
+
+def test_reconcile_looks_again_when_the_batch_failed(client, checkpoint, ledger):
+    base = now_ms() - 60000
+    feed = AnswerFeed(client, checkpoint, ledger=ledger, reconcile_seconds=600)
+    write_answers(client, {new_push_id(base): {"Exam_ID": 1}})
+    commit(feed, ledger, feed.poll())
+    late = write_answers(client, {new_push_id(base - 30000): {"Exam_ID": 2}})
+    feed._next_reconcile = 0
+
+    assert [key for key, _ in feed.poll()] == late  # not committed: the SQL write failed
+    assert [key for key, _ in feed.poll()] == late  # found again without waiting reconcile_seconds
+    commit(feed, ledger, [(late[0], None)])
+    assert feed.poll() == []
+
+
+def test_reconcile_ignores_keys_older_than_its_window(client, checkpoint, ledger):
+    base = now_ms() - 60000
+    feed = AnswerFeed(client, checkpoint, ledger=ledger, reconcile_seconds=600, reconcile_window_ms=10000)
+    write_answers(client, {new_push_id(base): {"Exam_ID": 1}})
+    commit(feed, ledger, feed.poll())
+    write_answers(client, {new_push_id(base - 30000): {"Exam_ID": 2}})
+    feed._next_reconcile = 0
+    assert feed.poll() == []
+
+
+def test_sharded_reconcile_skips_other_shards_keys(client, checkpoint, ledger, capsys):
+    """A restarted worker of 4: only its own unprocessed answers count as missed."""
+    def owns(record):
+        return shard_of(record, "Exam_ID", 4) == 0
+
+    base = now_ms() - 600000
+    records = {new_push_id(base + i): {"Exam_ID": i} for i in range(400)}
+    write_answers(client, records)
+    own_keys = sorted(key for key, record in records.items() if owns(record))
+    missed = own_keys[:3]
+    ledger.add_many(own_keys[3:])
+    checkpoint.save(new_push_id())
+
+    feed = AnswerFeed(client, checkpoint, ledger=ledger, reconcile_seconds=600, owns=owns)
+    before = gets(client)
+    assert [key for key, _ in feed.poll()] == missed
+    assert gets(client) - before <= 3  # shallow scan, one range page, the regular poll
+    assert "3 answer(s) below the cursor" in capsys.readouterr().out
+
+    commit(feed, ledger, [(key, None) for key in missed])
+    feed._next_reconcile = 0
+    before = gets(client)
+    assert feed.poll() == []
+    assert gets(client) - before == 2  # the other shards' keys are not read again
+    assert "Reconciliation" not in capsys.readouterr().out
+
+
+def test_foreign_keys_expire_with_the_window(client, checkpoint, ledger):
+    base = now_ms() - 600000
+    write_answers(client, {new_push_id(base + i): {"Exam_ID": i} for i in range(20)})
+    checkpoint.save(new_push_id(base + 20000))
+    feed = AnswerFeed(client, checkpoint, ledger=ledger, reconcile_seconds=600, reconcile_window_ms=60000,
+                      owns=lambda record: False)
+    feed.poll()
+    assert len(feed._foreign) == 20
+
+    later = write_answers(client, {new_push_id(base + 120000): {"Exam_ID": 99}})
+    feed.commit(later)  # the cursor moves two minutes on: the foreign keys leave the window
+    assert feed._foreign == {}
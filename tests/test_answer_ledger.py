@@ -0,0 +1,28 @@
+from answer_ledger import AnswerLedger, BloomFilter
+from firebase_client import new_push_id
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, error_rate=0.01)
+    keys = [new_push_id() for _ in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(new_push_id() in bloom for _ in range(2000))
+    assert false_positives < 100
+
+
+def test_ledger_survives_a_restart(tmp_path):
+    path = str(tmp_path / "ledger.sqlite3")
+    keys = sorted(new_push_id() for _ in range(50))
+    ledger = AnswerLedger(path, expected_keys=100)
+    ledger.add_many(keys[:30])
+    ledger.add_many(keys[20:30])  # re-applied batch: counted once
+    assert len(ledger) == 30 and ledger.last_key() == keys[29]
+    ledger.close()
+
+    reopened = AnswerLedger(path, expected_keys=100)
+    assert len(reopened) == 30
+    assert all(key in reopened for key in keys[:30])
+    assert not any(key in reopened for key in keys[30:])
+    reopened.close()
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from answer_feed import AnswerStream, SyncCheckpoint
+from firebase_client import new_push_id
+
+
+def write_later(action, delay=0.2):
+    """Runs a write from another thread once the stream is waiting for events."""
+    timer = threading.Timer(delay, action)
+    timer.start()
+    return timer
+
+
+def keys_of(items):
+    return [key for key, _ in items]
+
+
+@pytest.fixture
+def stream(client, tmp_path):
+    stream = AnswerStream(client, SyncCheckpoint(str(tmp_path / "checkpoint.json")), read_timeout=5)
+    batches = stream.batches()
+    yield stream, batches
+    batches.close()
+
+
+def test_initial_snapshot_then_patch_and_put_events(client, stream):
+    stream, batches = stream
+    existing = sorted(new_push_id() for _ in range(3))
+    client.patch("", {f"student_answers/{key}": {"Exam_ID": 1} for key in existing})
+
+    first = next(batches)  # the put of the whole location when the stream opens
+    assert keys_of(first) == existing
+    stream.commit(keys_of(first))
+
+    patched = sorted(new_push_id() for _ in range(2))
+    write_later(lambda: client.patch("", {f"student_answers/{key}": {"Exam_ID": 2} for key in patched}))
+    assert next(batches) == [(key, {"Exam_ID": 2}) for key in patched]
+    stream.commit(patched)
+
+    put_key = new_push_id()
+    write_later(lambda: client.put(f"student_answers/{put_key}", {"Exam_ID": 3}))
+    assert next(batches) == [(put_key, {"Exam_ID": 3})]
+
+
+def test_partial_update_reads_the_whole_record(client, stream):
+    stream, batches = stream
+    client.put("student_answers/seed", {"Exam_ID": 0})
+    next(batches)
+    key = new_push_id()
+    # A PATCH below one answer arrives as one change per field; the record is read whole
+    write_later(lambda: client.patch(f"student_answers/{key}", {"Exam_ID": 4, "Student_Answer": "c"}))
+    assert next(batches) == [(key, {"Exam_ID": 4, "Student_Answer": "c"})]
+
+
+@pytest.mark.parametrize("drop_event", [None, "cancel", "auth_revoked"])
+def test_reconnects_and_resumes_from_the_checkpoint(stub, client, stream, drop_event):
+    stream, batches = stream
+    committed = sorted(new_push_id() for _ in range(3))
+    client.patch("", {f"student_answers/{key}": {"Exam_ID": 1} for key in committed})
+    stream.commit(keys_of(next(batches)))
+    in_flight = new_push_id()
+    write_later(lambda: client.put(f"student_answers/{in_flight}", {"Exam_ID": 2}))
+    assert keys_of(next(batches)) == [in_flight]  # handed out, not committed yet
+
+    missed = new_push_id()
+
+    def drop_and_write():
+        stub.drop_streams(drop_event)
+        client.put(f"student_answers/{missed}", {"Exam_ID": 3})  # while the stream is down
+
+    write_later(drop_and_write)
+    started = time.monotonic()
+    # The new subscription starts at the checkpoint: committed and in-flight answers are skipped
+    assert keys_of(next(batches)) == [missed]
+    assert time.monotonic() - started < 5
+    stream.commit([in_flight, missed])
+    assert stream.checkpoint.last_key == missed
@@ -0,0 +1,47 @@
+import time
+
+from exam_portal.refresh import CatalogStore
+
+COURSES = {"1": {"Course_ID": 1, "Course_Name": "Databases"}}
+
+
+def fetcher(client):
+    return lambda path, params=None: client.get(path, params=params)
+
+
+def gets(client):
+    return client.stats.snapshot().get("GET", {}).get("requests", 0)
+
+
+def test_meta_versions_drive_incremental_refresh(client):
+    client.put("courses", COURSES)
+    client.put("meta/versions/courses", 1)
+    store = CatalogStore(client, fetcher(client), refresh_seconds=0)
+    assert store.refresh() == []
+
+    client.patch("courses/2", {"Course_ID": 2, "Course_Name": "Python"})
+    client.put("meta/versions/courses", 2)
+    before = gets(client)
+    assert store.refresh() == ["courses"]
+    assert gets(client) - before == 2  # meta/versions, then only the changed collection
+
+
+def test_without_meta_versions_full_downloads_are_rare_and_announced(client, capsys):
+    client.put("courses", COURSES)
+    store = CatalogStore(client, fetcher(client), refresh_seconds=60, etag_refresh_seconds=0.3)
+    store.stop()
+    assert "WARNING: no meta/versions" in capsys.readouterr().out
+
+    before = gets(client)
+    assert store.refresh() == []
+    assert gets(client) - before == 1  # only the meta/versions check
+    time.sleep(0.35)
+    client.patch("courses/2", {"Course_ID": 2, "Course_Name": "Python"})
+    assert store.refresh() == ["courses"]
+
+
+def test_lazy_store_without_meta_versions_does_not_refresh(client, capsys):
+    store = CatalogStore(client, fetcher(client), lazy=True, refresh_seconds=60)
+    store.stop()
+    assert "it is disabled" in capsys.readouterr().out
+    assert store.refresh() == []
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+import requests
+
+from chunk_uploader import ChunkUploader, serialized_chunks
+from firebase_client import FirebaseClient
+
+
+@pytest.fixture
+def raw_client(stub):
+    """No client-side retries: throttling has to reach the uploader."""
+    fb = FirebaseClient(stub.url, retries=0)
+    yield fb
+    fb.close()
+
+
+def records(n):
+    return [(str(i), {"Question_ID": i, "Question_Description": "x" * (i % 50)}) for i in range(n)]
+
+
+def test_chunks_stay_under_max_bytes_and_keep_every_record():
+    chunks = list(serialized_chunks(records(500), max_bytes=2000))
+    assert len(chunks) > 1
+    assert all(len(body) <= 2000 for body, _ in chunks)
+    merged = {}
+    for body, count in chunks:
+        part = json.loads(body)
+        assert len(part) == count
+        merged.update(part)
+    assert merged == {key: record for key, record in records(500)}
+
+
+def test_a_record_larger_than_max_bytes_goes_alone():
+    big = ("big", {"text": "y" * 5000})
+    chunks = list(serialized_chunks([("a", 1), big, ("b", 2)], max_bytes=1000))
+    assert [count for _, count in chunks] == [1, 1, 1]
+
+
+def test_upload_retries_throttled_chunks(stub, raw_client):
+    stub.fail_next(503, times=2)
+    uploader = ChunkUploader(raw_client, max_bytes=2000, workers=4, backoff=0.01)
+    summary = uploader.upload("questions", iter(records(300)))
+    assert summary["records"] == 300 and summary["retries"] == 2
+    assert len(raw_client.get("questions")) == 300
+
+
+def test_throttling_halves_the_concurrency_and_successes_restore_it():
+    uploader = ChunkUploader(client=None, workers=8, backoff=0.5)
+    uploader._enter()
+    uploader._leave(True, retry_after=3)
+    assert uploader.limit == 4 and uploader.delay == 3  # at least Retry-After
+    for _ in range(4):
+        uploader._enter()
+        uploader._leave(False)
+    assert uploader.limit == 5 and uploader.delay < 3
+    uploader._enter()
+    uploader._leave(None)  # failed for good: neither throttling nor success
+    assert uploader.limit == 5
+
+
+def test_upload_raises_on_a_permanent_error(stub, raw_client):
+    stub.fail_next(400)
+    uploader = ChunkUploader(raw_client, max_bytes=2000, workers=1)
+    with pytest.raises(requests.exceptions.HTTPError):
+        uploader.upload("questions", records(10))
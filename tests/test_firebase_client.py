@@ -0,0 +1,161 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from exam_portal.loader import download_collection
+from firebase_client import client as client_module
+from firebase_client import new_push_id, push_id_floor, push_id_time
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Records the retry waits instead of sleeping."""
+    waits = []
+    monkeypatch.setattr(client_module, "time", SimpleNamespace(sleep=waits.append, perf_counter=time.perf_counter))
+    return waits
+
+
+# --- REST calls ---
+def test_rest_round_trip(client):
+    client.put("courses/1", {"Course_ID": 1, "Course_Name": "Databases"})
+    client.patch("", {"courses/2": {"Course_ID": 2, "Course_Name": "Python"}})
+    key = client.post("student_answers", {"Exam_ID": 1})["name"]
+
+    assert client.get("courses/2") == {"Course_ID": 2, "Course_Name": "Python"}
+    assert client.get("student_answers") == {key: {"Exam_ID": 1}}
+    assert set(client.get("", params={"shallow": "true"})) == {"courses", "student_answers"}
+    client.delete("courses")
+    assert client.get("courses") is None
+
+
+# --- Retries ---
+def test_retries_server_errors_then_succeeds(stub, client, sleeps):
+    client.put("x", 1)
+    stub.fail_next(503, times=2)
+    assert client.get("x") == 1
+    stats = client.stats.snapshot()["GET"]
+    assert (stats["requests"], stats["errors"], stats["retries"]) == (3, 2, 2)
+    assert len(sleeps) == 2
+
+
+def test_gives_up_after_the_retry_budget(stub, client, sleeps):
+    stub.fail_next(503, times=10)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get("x")
+    assert client.stats.snapshot()["GET"]["requests"] == client.retries + 1
+
+
+def test_post_is_not_retried_on_server_errors(stub, client, sleeps):
+    stub.fail_next(500)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.post("student_answers", {"Exam_ID": 1})
+    assert client.stats.snapshot()["POST"]["retries"] == 0
+
+
+def test_post_is_retried_when_throttled(stub, client, sleeps):
+    stub.fail_next(429)
+    key = client.post("student_answers", {"Exam_ID": 1})["name"]
+    assert list(client.get("student_answers")) == [key]  # one record, no duplicate
+
+
+def test_retry_after_is_the_lower_bound(stub, client, sleeps):
+    stub.fail_next(429, headers={"Retry-After": "2"})
+    client.get("x")
+    assert sleeps == [2]
+
+
+def test_jitter_stays_between_retry_after_and_the_backoff_step(client, sleeps, monkeypatch):
+    client.backoff, client.max_backoff = 8, 8
+    response = SimpleNamespace(headers={"Retry-After": "3"})
+    for _ in range(200):
+        client._sleep_before_retry(0, response)
+    assert 3 <= min(sleeps) and max(sleeps) <= 8
+
+
+def test_backoff_is_capped_full_jitter(client, sleeps):
+    client.backoff, client.max_backoff = 1, 4
+    for attempt in range(6):
+        for _ in range(50):
+            client._sleep_before_retry(attempt)
+    assert 0 <= min(sleeps) and max(sleeps) <= 4
+
+
+# --- ETags ---
+def test_etag_follows_the_data(client):
+    client.put("courses", {"1": {"Course_ID": 1, "Course_Name": "Databases"}})
+
+    def etag():
+        return client.request("GET", "courses", headers={"X-Firebase-ETag": "true"}).headers["ETag"]
+
+    first = etag()
+    assert etag() == first
+    client.patch("courses/1", {"Course_Name": "SQL Server"})
+    assert etag() != first
+
+
+def test_download_collection_skips_the_rebuild_for_a_known_etag(client):
+    client.put("courses", {"1": {"Course_ID": 1, "Course_Name": "Databases"}})
+    part, etag, _ = download_collection(client, "courses")
+    assert part is not None
+
+    unchanged, same_etag, timing = download_collection(client, "courses", skip_etag=etag)
+    assert unchanged is None and same_etag == etag
+    assert timing["bytes"] > 0  # the body is still transferred: Firebase ignores If-None-Match
+
+    client.patch("courses/2", {"Course_ID": 2, "Course_Name": "Python"})
+    changed, new_etag, _ = download_collection(client, "courses", skip_etag=etag)
+    assert changed is not None and new_etag != etag
+
+
+# --- Streaming ---
+def test_stream_sends_the_snapshot_then_every_write(stub, client):
+    client.put("student_answers", {"a": {"Exam_ID": 1}})
+    events = []
+
+    def listen():
+        for event, data in client.stream("student_answers"):
+            events.append((event, data))
+
+    listener = threading.Thread(target=listen, daemon=True)
+    listener.start()
+    _wait_for(lambda: events)
+    client.patch("student_answers", {"b": {"Exam_ID": 2}})
+    client.put("student_answers/c", {"Exam_ID": 3})
+    _wait_for(lambda: len([e for e in events if e[0] != "keep-alive"]) >= 3)
+    stub.drop_streams()
+    listener.join(5)
+
+    data_events = [e for e in events if e[0] != "keep-alive"]
+    assert data_events[:3] == [
+        ("put", {"path": "/", "data": {"a": {"Exam_ID": 1}}}),
+        ("patch", {"path": "/", "data": {"b": {"Exam_ID": 2}}}),
+        ("put", {"path": "/c", "data": {"Exam_ID": 3}}),
+    ]
+    assert not listener.is_alive()  # the generator returns when the server closes the stream
+
+
+def test_stream_keep_alives(stub, client):
+    stream = client.stream("anything")
+    assert next(stream)[0] == "put"
+    assert next(stream) == ("keep-alive", None)
+    stream.close()
+
+
+# --- Push keys ---
+def test_push_ids_sort_by_time_and_decode():
+    now = int(time.time() * 1000)
+    keys = [new_push_id(now) for _ in range(100)] + [new_push_id(now + 1)]
+    assert keys == sorted(keys) and len(set(keys)) == len(keys)
+    assert push_id_time(keys[0]) == now
+    assert push_id_floor(now) <= keys[0] < push_id_floor(now + 1)
+    assert push_id_time("not-a-push-key") is None
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
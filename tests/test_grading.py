@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from grading import ModelAnswerTable, parse_normalizations
+
+
+@pytest.fixture
+def model_answers():
+    return pd.DataFrame({
+        "Question_ID": [1, 2, 3],
+        "Question_Model_Answer": ["Primary Key", "True", "SELECT"],
+        "Question_Type": ["MCQ", "True/False", "MCQ"],
+    })
+
+
+def grade(table, answers):
+    batch = pd.DataFrame(answers, columns=["Question_ID", "Student_Answer"])
+    return table.grade(batch).tolist()
+
+
+def test_normalized_answers_match(model_answers):
+    table = ModelAnswerTable(model_answers)
+    assert grade(table, [(1, "  primary   KEY "), (2, "t"), (2, "Yes"), (2, "no"), (3, "select"), (3, "INSERT")]) \
+        == [1, 1, 1, 0, 1, 0]
+
+
+def test_exact_match_without_normalization(model_answers):
+    table = ModelAnswerTable(model_answers, normalizations=set())
+    assert grade(table, [(1, "Primary Key"), (1, "primary key"), (2, "T")]) == [1, 0, 0]
+
+
+def test_synonyms_only_apply_to_true_false_questions():
+    table = ModelAnswerTable(pd.DataFrame({"Question_ID": [1], "Question_Model_Answer": ["yes"],
+                                           "Question_Type": ["MCQ"]}))
+    assert grade(table, [(1, "Yes"), (1, "y")]) == [1, 0]
+
+
+def test_weights_missing_questions_and_missing_answers(model_answers):
+    table = ModelAnswerTable(model_answers, weights=pd.Series({3: 2.5}))
+    assert grade(table, [(3, "SELECT"), (1, "Primary Key"), (9, "anything"), (1, None)]) == [2.5, 1, 0, 0]
+    assert table.missing_questions([1, 9, 9, 12]) == [9, 12]
+
+
+def test_parse_normalizations():
+    assert parse_normalizations("all") == {"trim", "spaces", "casefold", "synonyms"}
+    assert parse_normalizations("none") == set()
+    assert parse_normalizations(" trim, casefold ") == {"trim", "casefold"}
+    with pytest.raises(ValueError):
+        parse_normalizations("stemming")
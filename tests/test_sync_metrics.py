@@ -0,0 +1,39 @@
+import json
+import urllib.request
+
+from sync_metrics import MAX_RATE_CONSUMERS, SyncMetrics
+
+
+def fetch(metrics, n):
+    metrics.fetched([(f"k{metrics.answers['fetch'] + i}", {}) for i in range(n)])
+
+
+def test_consumers_keep_their_own_rate_window():
+    metrics = SyncMetrics()
+    fetch(metrics, 100)
+    assert metrics.snapshot("file")["answers_per_second"]["fetch"] > 0
+    assert metrics.snapshot("http:")["answers_per_second"]["fetch"] > 0  # not reset by the file's snapshot
+    assert metrics.snapshot("file")["answers_per_second"]["fetch"] == 0
+
+
+def test_rate_windows_are_capped():
+    metrics = SyncMetrics()
+    for i in range(MAX_RATE_CONSUMERS * 3):
+        metrics.snapshot(f"http:{i}")
+    assert len(metrics._last_rates) == MAX_RATE_CONSUMERS
+    assert f"http:{MAX_RATE_CONSUMERS * 3 - 1}" in metrics._last_rates
+
+
+def test_metrics_json_consumer_parameter():
+    metrics = SyncMetrics()
+    server = metrics.serve(port=0)
+    url = f"http://127.0.0.1:{server.server_address[1]}/metrics.json"
+    try:
+        fetch(metrics, 10)
+        for query in ("", "?consumer=a"):
+            with urllib.request.urlopen(url + query) as response:
+                assert json.load(response)["answers_total"]["fetch"] == 10
+        assert set(metrics._last_rates) == {"http:", "http:a"}
+    finally:
+        server.shutdown()
+        server.server_close()